@@ -4,13 +4,27 @@
 
 import base64
 import math
-from dataclasses import dataclass
-from typing import Dict, Iterable, List, Tuple
+from dataclasses import dataclass, fields
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import ast
-from pyembroidery import EmbPattern
-
-from test_class_pyembr import PyEmbroideryBuilder
+import numpy as np
+
+from embroidery_cache import ResultCache, cache_key
+from embroidery_fill import (
+    DEFAULT_FILL_SPACING_MM,
+    FillSettings,
+    row_count,
+    satin_column,
+    scanline_spans,
+    tatami_blocks,
+)
+from embroidery_metrics import StageTimings, count, timed
+from embroidery_points import PointBuffer
+from embroidery_optimize import TravelReport, optimize_blocks, travel_distance
+from embroidery_threads import count_color_changes, group_blocks_by_color, optimize_color_runs, parse_color, thread_order
+from embroidery_utils import densified_count
+from test_class_pyembr import EXPORT_FORMATS, PyEmbroideryBuilder
 
 
 @dataclass
@@ -21,37 +35,218 @@ class Command:
     y: float = 0.0
 
 
+@dataclass(frozen=True)
+class PipelineOptions:
+    """Optional stages between interpretation and stitch building."""
+
+    optimize_travel: bool = False
+    allow_reverse: bool = True
+    travel_budget_s: float = 0.5
+    min_stitch_mm: float = 0.0
+    simplify_mm: float = 0.0
+    merge_collinear: bool = False
+    fill_spacing_mm: float = DEFAULT_FILL_SPACING_MM
+    fill_angle: float = 0.0
+    max_density: float = 0.0  # stitches/mm²; thin denser cells (0 disables)
+    group_colors: bool = False  # sew all blocks of a thread together
+
+    def fill_settings(self, scale_mm: float, max_stitch_mm: float) -> FillSettings:
+        return FillSettings.from_mm(scale_mm, max_stitch_mm, self.fill_spacing_mm, self.fill_angle)
+
+    def key(self) -> Dict[str, object]:
+        """Fields that differ from the defaults, for cache keys."""
+
+        defaults = PipelineOptions()
+        return {
+            f.name: getattr(self, f.name)
+            for f in fields(self)
+            if getattr(self, f.name) != getattr(defaults, f.name)
+        }
+
+
+# Execution budgets for a single design. Points are what end up stitched;
+# the op budget guards loops that only turn and never record anything, and
+# the stitch budget long segments that densify into many stitches.
+DEFAULT_POINT_BUDGET = 500_000
+DEFAULT_OP_BUDGET = 5_000_000
+DEFAULT_STITCH_BUDGET = 2_000_000
+
+# Points per chunk yielded by :meth:`VirtualEmbroidery.run`.
+RUN_CHUNK_POINTS = 4096
+
+
 class VirtualEmbroidery:
     """Minimal turtle-like state tracker without a GUI."""
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_points: Optional[int] = DEFAULT_POINT_BUDGET,
+        max_ops: Optional[int] = DEFAULT_OP_BUDGET,
+        fast_loops: bool = True,
+        fill: Optional[FillSettings] = None,
+        max_stitches: Optional[int] = DEFAULT_STITCH_BUDGET,
+    ):
         self.x = 0.0
         self.y = 0.0
         self.heading = 0.0  # degrees, 0 = east
         self.pen_down = False
-        self.points: List[Tuple[float, float]] = []
+        self.points = PointBuffer()
+        # Indices into ``points`` where a pen-down run starts after travel.
+        self.breaks: List[int] = []
+        self.max_points = max_points
+        self.max_ops = max_ops
+        self.max_stitches = max_stitches
+        self.fast_loops = fast_loops
+        self.ops = 0
+        # Stitches the recorded points densify into, at ``fill.stitch`` per step.
+        self.stitches = 0
+        self.fill = fill or FillSettings()
+        self.fill_angle = self.fill.angle
+        # Outline of the shape being filled, between begin_fill and end_fill.
+        self.fill_vertices: Optional[List[Tuple[float, float]]] = None
+        self.satin_width = 0.0
+        self._satin_side = 1
+        # The next recorded point starts a new block (after pen-up travel, a fill or a thread change).
+        self._block_ended = False
+        # Thread of the current block and of every block so far (one more
+        # than ``breaks``); None is the default thread.
+        self.color: Optional[str] = None
+        self.block_colors: List[Optional[str]] = []
+
+    def _check_point_budget(self, extra: int) -> None:
+        if self.max_points is not None and len(self.points) + extra > self.max_points:
+            raise ValueError(f"design exceeds the budget of {self.max_points} stitch points")
+
+    def _count_stitches(self, extra: int) -> None:
+        self.stitches += extra
+        if self.max_stitches is not None and self.stitches > self.max_stitches:
+            raise ValueError(f"design exceeds the budget of {self.max_stitches} stitches")
+
+    def _check_stitch_budget(self, points) -> None:
+        """Charge the stitches densifying ``points`` adds, before they are recorded.
+
+        ``points`` continue the current block from the last recorded point
+        unless the next point starts a new block.
+        """
+
+        if self.max_stitches is None or not len(points):
+            return
+        if self.points and not self._block_ended:
+            self._count_stitches(densified_count(np.vstack(([self.points.last()], points)), self.fill.stitch) - 1)
+        else:
+            self._count_stitches(densified_count(points, self.fill.stitch))
+
+    def _count_ops(self, extra: int) -> None:
+        self.ops += extra
+        if self.max_ops is not None and self.ops > self.max_ops:
+            raise ValueError(f"design exceeds the budget of {self.max_ops} commands")
+
+    def snapshot(self) -> Tuple:
+        """Cheap checkpoint of the turtle state; see :meth:`restore`."""
+
+        vertices = None if self.fill_vertices is None else tuple(self.fill_vertices)
+        return (
+            self.x,
+            self.y,
+            self.heading,
+            self.pen_down,
+            len(self.points),
+            len(self.breaks),
+            self.ops,
+            self.stitches,
+            self.fill_angle,
+            vertices,
+            self.satin_width,
+            self._satin_side,
+            self._block_ended,
+            self.color,
+            len(self.block_colors),
+            self.block_colors[-1:],  # set_color may retag the last block
+        )
+
+    def restore(self, state: Tuple) -> None:
+        """Rewind to a :meth:`snapshot`, dropping points recorded since."""
+
+        (
+            self.x,
+            self.y,
+            self.heading,
+            self.pen_down,
+            n_points,
+            n_breaks,
+            self.ops,
+            self.stitches,
+            self.fill_angle,
+            vertices,
+            self.satin_width,
+            self._satin_side,
+            self._block_ended,
+            self.color,
+            n_colors,
+            last_color,
+        ) = state
+        self.fill_vertices = None if vertices is None else list(vertices)
+        self.points.truncate(n_points)
+        del self.breaks[n_breaks:]
+        del self.block_colors[n_colors:]
+        self.block_colors[n_colors - len(last_color) :] = last_color
+
+    def _start_block(self) -> None:
+        if not self.points:
+            self._block_ended = False
+            self.block_colors[:] = [self.color]
+        elif self._block_ended:
+            self._block_ended = False
+            self.breaks.append(len(self.points))
+            self.block_colors.append(self.color)
 
     def _record(self):
         if self.pen_down:
-            self.points.append((self.x, self.y))
+            self._check_point_budget(1)
+            if self.points and not self._block_ended:
+                x0, y0 = self.points.last()
+                self._count_stitches(max(1, math.ceil(math.hypot(self.x - x0, self.y - y0) / self.fill.stitch)))
+            else:
+                self._count_stitches(1)
+            self._start_block()
+            self.points.append(self.x, self.y)
+
+    def _move_to(self, x: float, y: float) -> None:
+        start = (self.x, self.y)
+        self.x = x
+        self.y = y
+        if self.fill_vertices is not None:
+            self.fill_vertices.append((x, y))
+        if self.pen_down and self.satin_width > 0:
+            self._satin(start)
+        else:
+            self._record()
+
+    def _satin(self, start: Tuple[float, float]) -> None:
+        length = math.hypot(self.x - start[0], self.y - start[1])
+        self._check_point_budget(math.ceil(length / self.fill.spacing))
+        points, self._satin_side = satin_column(
+            start, (self.x, self.y), self.satin_width, self.fill.spacing, self._satin_side
+        )
+        self._check_stitch_budget(points)
+        self._start_block()
+        self.points.extend(points)
 
     def penup(self):
         self.pen_down = False
 
     def pendown(self):
+        if not self.pen_down and self.points:
+            self._block_ended = True
         self.pen_down = True
         self._record()
 
     def goto(self, x: float, y: float):
-        self.x = x
-        self.y = y
-        self._record()
+        self._move_to(x, y)
 
     def forward(self, distance: float):
         radians = math.radians(self.heading)
-        self.x += math.cos(radians) * distance
-        self.y += math.sin(radians) * distance
-        self._record()
+        self._move_to(self.x + math.cos(radians) * distance, self.y + math.sin(radians) * distance)
 
     def backward(self, distance: float):
         self.forward(-distance)
@@ -62,6 +257,200 @@ class VirtualEmbroidery:
     def left(self, angle: float):
         self.heading += angle
 
+    def begin_fill(self):
+        self.fill_vertices = [(self.x, self.y)]
+
+    def end_fill(self):
+        """Close the outline traced since :meth:`begin_fill` and sew a tatami fill.
+
+        Each fill region becomes its own block; the next pen-down point
+        starts a new block too, so nothing is sewn across the shape.
+        """
+
+        vertices, self.fill_vertices = self.fill_vertices, None
+        if vertices is None or len(vertices) < 3:
+            return
+        # Every row, and then every span, holds at least two points; check
+        # each bound before paying for the next stage.
+        self._check_point_budget(2 * row_count(vertices, self.fill.spacing, self.fill_angle))
+        rows, spans = scanline_spans(vertices, self.fill.spacing, self.fill_angle)
+        self._check_point_budget(2 * len(spans))
+        blocks = tatami_blocks(rows, spans, self.fill.stitch, self.fill_angle)
+        self._check_point_budget(sum(len(block) for block in blocks))
+        for block in blocks:
+            self._block_ended = True
+            self._check_stitch_budget(block)
+            self._start_block()
+            self.points.extend(block)
+        self._block_ended = True
+
+    def set_color(self, color: str):
+        """Sew what follows in thread ``color`` (``#rrggbb``).
+
+        A new thread starts a new block; with the pen down it starts at the
+        current position, so the next line is sewn in the new thread. A
+        block holding only its start point has sewn nothing yet and just
+        takes the new thread instead.
+        """
+
+        if color == self.color:
+            return
+        self.color = color
+        if not self.points:
+            return
+        start = self.breaks[-1] if self.breaks else 0
+        if not self._block_ended and len(self.points) - start == 1:
+            self.block_colors[-1] = color
+            return
+        self._block_ended = True
+        self._record()
+
+    def set_fill_angle(self, angle: float):
+        self.fill_angle = angle
+
+    def satin(self, width: float):
+        """Sew following pen-down moves as satin columns ``width`` wide (0 turns it off)."""
+
+        self.satin_width = max(0.0, width)
+
+    def execute(self, raw: Dict) -> None:
+        """Apply a single command dict to the turtle state."""
+
+        if "op" not in raw:
+            raise ValueError("Command missing 'op'")
+
+        op = raw["op"].lower()
+        if op not in SUPPORTED_OPS:
+            raise ValueError(f"Unsupported op: {op}")
+
+        self._count_ops(1)
+
+        if op == "color":
+            self.set_color(parse_color(raw.get("color", raw.get("value"))))
+            return
+
+        value = float(raw.get("value", 0.0))
+
+        if op == "penup":
+            self.penup()
+        elif op == "pendown":
+            self.pendown()
+        elif op == "goto":
+            try:
+                x = float(raw["x"])
+                y = float(raw["y"])
+            except KeyError as exc:
+                raise ValueError("goto requires x and y") from exc
+            self.goto(x, y)
+        elif op == "forward":
+            self.forward(value)
+        elif op == "backward":
+            self.backward(value)
+        elif op == "right":
+            self.right(value)
+        elif op == "left":
+            self.left(value)
+        elif op == "begin_fill":
+            self.begin_fill()
+        elif op == "end_fill":
+            self.end_fill()
+        elif op == "fill_angle":
+            self.set_fill_angle(value)
+        elif op == "satin":
+            self.satin(value)
+
+    def run(self, program: Iterable[Dict], chunk_points: int = RUN_CHUNK_POINTS) -> Iterator[np.ndarray]:
+        """Interpret ``program`` lazily, yielding new points in ``(k, 2)`` chunks.
+
+        ``program`` may be a flat command list or the loop-preserving form
+        produced by :func:`script_to_commands`; loops are never unrolled.
+        Chunks are views into :attr:`points`, not copies.
+        """
+
+        emitted = len(self.points)
+        for _ in self._steps(program):
+            if len(self.points) - emitted >= chunk_points:
+                chunk = self.points.array[emitted:]
+                emitted += len(chunk)
+                yield chunk
+        if len(self.points) > emitted:
+            yield self.points.array[emitted:]
+
+    def _steps(self, program: Iterable[Dict]) -> Iterator[None]:
+        """Execute ``program``, pausing after every command or closed-form loop."""
+
+        for raw in program:
+            if raw.get("op") == "repeat":
+                yield from self._run_repeat(raw)
+            else:
+                self.execute(raw)
+                yield
+
+    def _run_repeat(self, node: Dict) -> Iterator[None]:
+        count = int(node.get("count", 0))
+        body = node.get("body", [])
+        if count <= 0:
+            return
+
+        # Charged up front, so loops whose bodies do nothing cannot spin forever.
+        per_iteration = program_ops(body)
+        if self.max_ops is not None and self.ops + count * max(1, per_iteration) > self.max_ops:
+            raise ValueError(f"design exceeds the budget of {self.max_ops} commands")
+        if not per_iteration:
+            self._count_ops(count)
+            return
+
+        plain = self.fill_vertices is None and not self.satin_width
+        if self.fast_loops and plain and count > 1 and body and _is_relative(body):
+            self._run_repeat_closed_form(body, count)
+            yield
+            return
+
+        for _ in range(count):
+            yield from self._steps(body)
+
+    def _run_repeat_closed_form(self, body: List[Dict], count: int) -> None:
+        """Repeat a moves/turns-only body with array arithmetic instead of stepping.
+
+        Every turn and move of every iteration is laid out in one array.
+        Headings and positions are running sums taken in execution order
+        (``cumsum`` accumulates sequentially) and each move's cosine and
+        sine come from :mod:`math`, so every position is bit-for-bit what
+        stepping through the loop computes and the loop sews the same design.
+        """
+
+        turns, distances = _relative_steps(body)
+        is_move = np.array([d is not None for d in distances], dtype=bool)
+        # Both budgets bound ``count`` before any per-iteration array is allocated.
+        self._count_ops(max(1, program_ops(body)) * count)
+        if self.pen_down:
+            self._check_point_budget(int(is_move.sum()) * count)
+
+        turn = np.tile(np.asarray(turns, dtype=np.float64), count)
+        distance = np.tile(np.asarray([d or 0.0 for d in distances], dtype=np.float64), count)
+        is_move = np.tile(is_move, count)
+
+        # Heading before each step: the start heading plus every turn so far.
+        headings = np.cumsum(np.concatenate(([self.heading], turn)))
+        move_headings = headings[:-1][is_move].tolist()
+        radians = list(map(math.radians, move_headings))
+        dx = np.fromiter(map(math.cos, radians), dtype=np.float64, count=len(radians)) * distance[is_move]
+        dy = np.fromiter(map(math.sin, radians), dtype=np.float64, count=len(radians)) * distance[is_move]
+        xs = np.cumsum(np.concatenate(([self.x], dx)))
+        ys = np.cumsum(np.concatenate(([self.y], dy)))
+
+        self.heading = float(headings[-1])
+        self.x = float(xs[-1])
+        self.y = float(ys[-1])
+
+        if not self.pen_down or not len(dx):
+            return
+
+        placed = np.stack((xs[1:], ys[1:]), axis=1)
+        self._check_stitch_budget(placed)
+        self._start_block()
+        self.points.extend(placed)
+
 
 SUPPORTED_OPS = {
     "penup",
@@ -71,8 +460,75 @@ SUPPORTED_OPS = {
     "backward",
     "right",
     "left",
+    "begin_fill",
+    "end_fill",
+    "fill_angle",
+    "satin",
+    "color",
 }
 
+# Ops without arguments, and ops taking a single number.
+NO_ARG_OPS = {"penup", "pendown", "begin_fill", "end_fill"}
+VALUE_OPS = {"forward", "backward", "left", "right", "fill_angle", "satin"}
+
+
+RELATIVE_OPS = {"forward", "backward", "right", "left"}
+
+
+def program_ops(program: Iterable[Dict]) -> int:
+    """Ops charged for running ``program``: one per command, and at least
+    one per loop iteration even when the body does nothing."""
+
+    total = 0
+    for node in program:
+        if str(node.get("op", "")).lower() == "repeat":
+            count = int(node.get("count", 0))
+            if count > 0:
+                total += count * max(1, program_ops(node.get("body", [])))
+        else:
+            total += 1
+    return total
+
+
+def _relative_steps(program: Iterable[Dict]) -> Tuple[List[float], List[Optional[float]]]:
+    """One iteration of a moves/turns-only program, nested loops expanded.
+
+    Returns parallel lists: the heading change of each step (0.0 for a
+    move) and its signed distance (None for a turn).
+    """
+
+    turns: List[float] = []
+    distances: List[Optional[float]] = []
+    for node in program:
+        op = str(node.get("op", "")).lower()
+        if op == "repeat":
+            inner_turns, inner_distances = _relative_steps(node.get("body", []))
+            count = max(0, int(node.get("count", 0)))
+            turns.extend(inner_turns * count)
+            distances.extend(inner_distances * count)
+            continue
+        value = float(node.get("value", 0.0))
+        if op in ("forward", "backward"):
+            turns.append(0.0)
+            distances.append(value if op == "forward" else -value)
+        else:
+            turns.append(value if op == "left" else -value)
+            distances.append(None)
+    return turns, distances
+
+
+def _is_relative(program: Iterable[Dict]) -> bool:
+    """True when ``program`` only moves and turns relative to the turtle."""
+
+    for node in program:
+        op = str(node.get("op", "")).lower()
+        if op == "repeat":
+            if not _is_relative(node.get("body", [])):
+                return False
+        elif op not in RELATIVE_OPS:
+            return False
+    return True
+
 
 def _num(node: ast.AST) -> float:
     if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
@@ -87,12 +543,12 @@ def _call_to_command(call: ast.Call) -> Dict:
     if name not in SUPPORTED_OPS:
         raise ValueError(f"unsupported op: {name}")
 
-    if name in {"penup", "pendown"}:
+    if name in NO_ARG_OPS:
         if call.args:
             raise ValueError(f"{name} takes no arguments")
         return {"op": name}
 
-    if name in {"forward", "backward", "left", "right"}:
+    if name in VALUE_OPS:
         if len(call.args) != 1:
             raise ValueError(f"{name} takes one argument")
         return {"op": name, "value": _num(call.args[0])}
@@ -102,10 +558,19 @@ def _call_to_command(call: ast.Call) -> Dict:
             raise ValueError("goto takes two arguments")
         return {"op": name, "x": _num(call.args[0]), "y": _num(call.args[1])}
 
+    if name == "color":
+        if len(call.args) == 1 and isinstance(call.args[0], ast.Constant) and isinstance(call.args[0].value, str):
+            return {"op": name, "color": parse_color(call.args[0].value)}
+        if len(call.args) == 3:
+            return {"op": name, "color": parse_color([_num(arg) for arg in call.args])}
+        raise ValueError("color takes a name, a '#rrggbb' string or three numbers")
+
     raise ValueError(f"unsupported op: {name}")
 
 
 def _walk(node: ast.AST) -> List[Dict]:
+    """Translate one statement into program nodes, keeping loops as ``repeat``."""
+
     cmds: List[Dict] = []
 
     if isinstance(node, ast.Expr):
@@ -119,21 +584,47 @@ def _walk(node: ast.AST) -> List[Dict]:
             raise ValueError("for loops must be 'for _ in range(n):'")
         if len(node.iter.args) != 1:
             raise ValueError("range must have one argument")
-        count = int(_num(node.iter.args[0]))
-        if count < 0 or count > 10000:
-            raise ValueError("range must be between 0 and 10000")
+        value = _num(node.iter.args[0])
+        if not math.isfinite(value) or value != int(value):
+            raise ValueError("range needs a whole number")
+        count = int(value)
+        if count < 0:
+            raise ValueError("range must not be negative")
         body_cmds: List[Dict] = []
         for child in node.body:
             body_cmds.extend(_walk(child))
-        for _ in range(count):
-            cmds.extend(body_cmds)
+        cmds.append({"op": "repeat", "count": count, "body": body_cmds})
         return cmds
 
     raise ValueError("only simple calls and for-range loops are allowed")
 
 
+def split_statements(script: str) -> List[str]:
+    """Split a script into top-level statement sources without parsing it.
+
+    Indented, blank and comment lines (and lines inside open brackets)
+    belong to the statement above, so each chunk is a ``for`` loop with its
+    body or a single call. Used to find the first edited statement cheaply.
+    """
+
+    chunks: List[List[str]] = []
+    depth = 0
+    for line in script.splitlines(keepends=True):
+        code = line.split("#", 1)[0]
+        starts_statement = depth == 0 and code.strip() and not line[:1].isspace()
+        if starts_statement or not chunks:
+            chunks.append([])
+        chunks[-1].append(line)
+        depth = max(0, depth + code.count("(") + code.count("[") - code.count(")") - code.count("]"))
+    return ["".join(chunk) for chunk in chunks]
+
+
 def script_to_commands(script: str) -> List[Dict]:
-    """Parse a tiny turtle DSL (Python subset) into commands."""
+    """Parse a tiny turtle DSL (Python subset) into a command program.
+
+    ``for _ in range(n)`` loops are kept as ``{"op": "repeat", "count": n,
+    "body": [...]}`` nodes; use :func:`iter_commands` to expand them.
+    """
     try:
         tree = ast.parse(script)
     except SyntaxError as exc:
@@ -145,76 +636,372 @@ def script_to_commands(script: str) -> List[Dict]:
     return commands
 
 
-def run_commands(commands: Iterable[Dict]) -> List[Tuple[float, float]]:
-    """Run a list of dict commands and return recorded points."""
+def iter_commands(program: Iterable[Dict]) -> Iterator[Dict]:
+    """Lazily expand ``repeat`` nodes, yielding flat command dicts."""
+
+    for node in program:
+        if node.get("op") == "repeat":
+            body = node.get("body", [])
+            for _ in range(int(node.get("count", 0))):
+                yield from iter_commands(body)
+        else:
+            yield node
 
-    vt = VirtualEmbroidery()
 
-    for raw in commands:
+def normalize_program(program: Iterable[Dict]) -> List[Dict]:
+    """Canonical form of a program: lowercase ops and only the used fields.
+
+    Equivalent submissions (e.g. ``/export`` payloads with ``x: null`` on
+    every move) normalize to the same structure, which is what the result
+    cache hashes.
+    """
+
+    normalized: List[Dict] = []
+    for raw in program:
         if "op" not in raw:
             raise ValueError("Command missing 'op'")
+        op = str(raw["op"]).lower()
 
-        op = raw["op"].lower()
-        if op not in SUPPORTED_OPS:
+        if op == "repeat":
+            normalized.append(
+                {"op": op, "count": int(raw.get("count", 0)), "body": normalize_program(raw.get("body", []))}
+            )
+        elif op not in SUPPORTED_OPS:
             raise ValueError(f"Unsupported op: {op}")
+        elif op in NO_ARG_OPS:
+            normalized.append({"op": op})
+        elif op == "color":
+            normalized.append({"op": op, "color": parse_color(raw.get("color") or raw.get("value"))})
+        elif op == "goto":
+            if raw.get("x") is None or raw.get("y") is None:
+                raise ValueError("goto requires x and y")
+            normalized.append({"op": op, "x": float(raw["x"]), "y": float(raw["y"])})
+        else:
+            normalized.append({"op": op, "value": float(raw.get("value") or 0.0)})
+    return normalized
 
-        value = float(raw.get("value", 0.0))
 
-        if op == "penup":
-            vt.penup()
-        elif op == "pendown":
-            vt.pendown()
-        elif op == "goto":
-            try:
-                x = float(raw["x"])
-                y = float(raw["y"])
-            except KeyError as exc:
-                raise ValueError("goto requires x and y") from exc
-            vt.goto(x, y)
-        elif op == "forward":
-            vt.forward(value)
-        elif op == "backward":
-            vt.backward(value)
-        elif op == "right":
-            vt.right(value)
-        elif op == "left":
-            vt.left(value)
+def run_commands(
+    commands: Iterable[Dict],
+    max_points: Optional[int] = DEFAULT_POINT_BUDGET,
+    fast_loops: bool = True,
+    fill: Optional[FillSettings] = None,
+    max_stitches: Optional[int] = DEFAULT_STITCH_BUDGET,
+) -> PointBuffer:
+    """Run a command list or program and return recorded points."""
+
+    return run_path(commands, max_points=max_points, fast_loops=fast_loops, fill=fill, max_stitches=max_stitches)[0]
+
+
+def run_path(
+    commands: Iterable[Dict],
+    max_points: Optional[int] = DEFAULT_POINT_BUDGET,
+    fast_loops: bool = True,
+    fill: Optional[FillSettings] = None,
+    max_stitches: Optional[int] = DEFAULT_STITCH_BUDGET,
+) -> Tuple[PointBuffer, List[int]]:
+    """Run a command list or program; return points and pen-down block starts."""
+
+    vt = trace(commands, max_points=max_points, fast_loops=fast_loops, fill=fill, max_stitches=max_stitches)
+    return vt.points, vt.breaks
 
-    return vt.points
 
+def trace(
+    commands: Iterable[Dict],
+    max_points: Optional[int] = DEFAULT_POINT_BUDGET,
+    fast_loops: bool = True,
+    fill: Optional[FillSettings] = None,
+    max_stitches: Optional[int] = DEFAULT_STITCH_BUDGET,
+) -> VirtualEmbroidery:
+    """Run a command list or program and return the finished turtle (points, breaks, threads)."""
+
+    vt = VirtualEmbroidery(max_points=max_points, fast_loops=fast_loops, fill=fill, max_stitches=max_stitches)
+    for _ in vt.run(commands):
+        pass
+    return vt
 
-def _build_with_builder(points: List[Tuple[float, float]], scale_mm: float, max_stitch_mm: float) -> PyEmbroideryBuilder:
+
+def _build_with_builder(
+    points: Sequence[Tuple[float, float]],
+    scale_mm: float,
+    max_stitch_mm: float,
+    breaks: Iterable[int] = (),
+    options: Optional[PipelineOptions] = None,
+    timings: Optional[StageTimings] = None,
+    colors: Sequence[Optional[str]] = (),
+    densified: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> PyEmbroideryBuilder:
     builder = PyEmbroideryBuilder(scale_mm=scale_mm, max_stitch_mm=max_stitch_mm)
     builder.points = points
-    builder.build_pattern()
+    builder.breaks = list(breaks)
+    builder.colors = list(colors)
+    builder.densified = densified
+    if options is not None:
+        builder.min_stitch_mm = options.min_stitch_mm
+        builder.simplify_mm = options.simplify_mm
+        builder.merge_collinear = options.merge_collinear
+        builder.max_density = options.max_density
+    builder.build_pattern(timings)
+    count(timings, "stitches", len(builder.pattern.stitches))
     return builder
 
 
+# Default outputs; any format in EXPORT_FORMATS can be requested too.
+OUTPUT_KINDS = ("pes", "png", "points")
+
+# Encoded artifacts, as opposed to the always-present stitch metadata.
+_ARTIFACTS = tuple(EXPORT_FORMATS)
+
+
+def check_outputs(outputs: Iterable[str]) -> Tuple[str, ...]:
+    """Validate an output selection such as ``["pes", "dst", "points"]``."""
+
+    selected = tuple(dict.fromkeys(str(kind).lower() for kind in outputs))
+    unknown = [kind for kind in selected if kind not in EXPORT_FORMATS and kind != "points"]
+    if unknown:
+        raise ValueError(f"unsupported output: {', '.join(unknown)}")
+    return selected
+
+
+def _encode_artifacts(
+    builder: PyEmbroideryBuilder,
+    result: Dict[str, object],
+    outputs: Iterable[str],
+    timings: Optional[StageTimings] = None,
+) -> None:
+    for kind in outputs:
+        if kind not in EXPORT_FORMATS or kind in result:
+            continue
+        with timed(timings, kind):
+            result[kind] = builder.encode(kind)
+        count(timings, f"{kind}_bytes", len(result[kind]))
+
+
+def points_to_result(
+    points: Sequence[Tuple[float, float]],
+    scale_mm: float,
+    max_stitch_mm: float,
+    outputs: Iterable[str] = OUTPUT_KINDS,
+    breaks: Iterable[int] = (),
+    options: Optional[PipelineOptions] = None,
+    timings: Optional[StageTimings] = None,
+    colors: Sequence[Optional[str]] = (),
+    densified: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Dict[str, object]:
+    """Convert points to stitch metadata plus the requested encoded formats.
+
+    ``colors`` gives the thread of each block (see :mod:`embroidery_threads`).
+    ``densified`` is the already densified path of ``points`` (see
+    :func:`points_to_stitch_array`); it is ignored when an option
+    reorders the blocks.
+    """
+
+    options = options or PipelineOptions()
+    if options.group_colors or options.optimize_travel:
+        densified = None
+    breaks = list(breaks)
+    colors = list(colors) if any(color is not None for color in colors) else []
+    changes_before = count_color_changes(colors)
+    if colors and options.group_colors:
+        with timed(timings, "colors"):
+            points, breaks, colors = group_blocks_by_color(points, breaks, colors)
+    if options.optimize_travel:
+        with timed(timings, "optimize"):
+            if colors:
+                points, breaks, report = optimize_color_runs(
+                    points, breaks, colors, allow_reverse=options.allow_reverse, time_budget_s=options.travel_budget_s
+                )
+            else:
+                points, breaks, report = optimize_blocks(
+                    points, breaks, allow_reverse=options.allow_reverse, time_budget_s=options.travel_budget_s
+                )
+    else:
+        distance = travel_distance(points, breaks)
+        report = TravelReport(distance, distance, blocks=len(breaks) + 1)
+
+    builder = _build_with_builder(
+        points,
+        scale_mm=scale_mm,
+        max_stitch_mm=max_stitch_mm,
+        breaks=breaks,
+        options=options,
+        timings=timings,
+        colors=colors,
+        densified=densified,
+    )
+    pattern = builder.ensure_pattern()
+
+    result: Dict[str, object] = {
+        "stitch_count": len(getattr(pattern, "stitches", [])),
+        "center_offset": {"x": builder.center_offset[0], "y": builder.center_offset[1]},
+        "centered_points": builder.centered_points,
+        "breaks": builder.centered_breaks,
+        "jump_count": len(builder.jumps),
+        "travel": report.as_dict(scale=scale_mm),
+        "simplification": {"points_removed": builder.points_removed, "stitches_removed": builder.stitches_removed},
+        "density": builder.density.as_dict(),
+        "colors": colors,
+        "threads": thread_order(colors),
+        "color_changes": {"before": changes_before, "after": count_color_changes(colors)},
+        "scale_mm": scale_mm,
+        "max_stitch_mm": max_stitch_mm,
+    }
+    _encode_artifacts(builder, result, check_outputs(outputs), timings)
+    return result
+
+
+def ensure_outputs(
+    result: Dict[str, object],
+    outputs: Iterable[str],
+    timings: Optional[StageTimings] = None,
+) -> bool:
+    """Encode any requested artifact the result does not carry yet.
+
+    The pattern is rebuilt from the stored centered points, so a cached
+    PES-only result can still serve a PNG or DST later; all missing formats
+    share one rebuilt pattern. Returns True when the result was extended.
+    """
+
+    outputs = check_outputs(outputs)
+    if all(kind in result for kind in _ARTIFACTS if kind in outputs):
+        return False
+
+    # The points are already simplified; only stitch thinning has to be redone.
+    density = result.get("density") or {}
+    thinned = density.get("max_per_mm2_before") is not None
+    builder = _build_with_builder(
+        result["centered_points"],
+        scale_mm=result["scale_mm"],
+        max_stitch_mm=result["max_stitch_mm"],
+        breaks=result.get("breaks", ()),
+        options=PipelineOptions(max_density=density["threshold_per_mm2"]) if thinned else None,
+        timings=timings,
+        colors=result.get("colors", ()),
+    )
+    _encode_artifacts(builder, result, outputs, timings)
+    return True
+
+
+def result_to_outputs(
+    result: Dict[str, object],
+    outputs: Iterable[str] = OUTPUT_KINDS,
+    timings: Optional[StageTimings] = None,
+) -> Dict[str, object]:
+    """Shape a raw result for JSON: bytes become base64 strings, point buffers lists."""
+
+    outputs = check_outputs(outputs)
+    shaped: Dict[str, object] = {}
+    with timed(timings, "encode_json"):
+        for kind in _ARTIFACTS:
+            if kind in outputs and kind in result:
+                shaped[f"{kind}_base64"] = base64.b64encode(result[kind]).decode("ascii")
+        skipped = set(_ARTIFACTS)
+        if "points" not in outputs:
+            skipped.add("centered_points")
+        shaped.update((k, v) for k, v in result.items() if k not in skipped)
+        if isinstance(shaped.get("centered_points"), PointBuffer):
+            shaped["centered_points"] = shaped["centered_points"].array.tolist()
+    return shaped
+
+
+def points_to_bytes(points) -> bytes:
+    """Pack ``[x, y]`` pairs (a list or :class:`PointBuffer`) as little-endian float32."""
+
+    return np.asarray(points, dtype="<f4").reshape(-1, 2).tobytes()
+
+
 def points_to_outputs(
-    points: List[Tuple[float, float]],
+    points: Sequence[Tuple[float, float]],
     scale_mm: float,
     max_stitch_mm: float,
+    timings: Optional[StageTimings] = None,
 ) -> Dict[str, object]:
     """Convert points to PES/PNG bytes and stitch metadata."""
 
-    builder = _build_with_builder(points, scale_mm=scale_mm, max_stitch_mm=max_stitch_mm)
-    pes_bytes, png_bytes = builder.export_bytes()
+    result = points_to_result(points, scale_mm=scale_mm, max_stitch_mm=max_stitch_mm, timings=timings)
+    return result_to_outputs(result, timings=timings)
 
-    pattern: EmbPattern = builder.ensure_pattern()
 
-    return {
-        "pes_base64": base64.b64encode(pes_bytes).decode("ascii"),
-        "png_base64": base64.b64encode(png_bytes).decode("ascii"),
-        "stitch_count": len(getattr(pattern, "stitches", [])),
-        "center_offset": {"x": builder.center_offset[0], "y": builder.center_offset[1]},
-        "centered_points": [[x, y] for x, y in builder.centered_points],
-    }
+def export_key(
+    commands: Iterable[Dict],
+    scale_mm: float,
+    max_stitch_mm: float,
+    options: Optional[PipelineOptions] = None,
+) -> Tuple[List[Dict], str]:
+    """Normalize ``commands`` and derive the cache key / design id for them."""
+
+    program = normalize_program(commands)
+    extra = options.key() if options else {}
+    return program, cache_key(program, scale_mm=scale_mm, max_stitch_mm=max_stitch_mm, options=extra)
+
+
+def generate_result(
+    commands: Iterable[Dict],
+    scale_mm: float,
+    max_stitch_mm: float,
+    cache: Optional[ResultCache] = None,
+    outputs: Iterable[str] = OUTPUT_KINDS,
+    options: Optional[PipelineOptions] = None,
+    timings: Optional[StageTimings] = None,
+) -> Dict[str, object]:
+    """Run the full pipeline, consulting ``cache`` when one is given.
+
+    Pass a :class:`StageTimings` to collect per-stage durations and counters.
+    """
+
+    outputs = check_outputs(outputs)
+    if cache is None:
+        return _generate_uncached(commands, scale_mm, max_stitch_mm, outputs, options, timings)
+
+    with timed(timings, "normalize"):
+        program, key = export_key(commands, scale_mm=scale_mm, max_stitch_mm=max_stitch_mm, options=options)
+    with timed(timings, "cache"):
+        result = cache.get(key)
+    count(timings, "cache_hits" if result is not None else "cache_misses")
+    if result is None:
+        result = _generate_uncached(program, scale_mm, max_stitch_mm, outputs, options, timings)
+        result["id"] = key
+        with timed(timings, "cache"):
+            cache.put(key, result)
+    elif ensure_outputs(result, outputs, timings):
+        with timed(timings, "cache"):
+            cache.put(key, result)
+    return result
+
+
+def _generate_uncached(commands, scale_mm, max_stitch_mm, outputs, options, timings) -> Dict[str, object]:
+    with timed(timings, "interpret"):
+        fill = (options or PipelineOptions()).fill_settings(scale_mm, max_stitch_mm)
+        turtle = trace(commands, fill=fill)
+    count(timings, "points", len(turtle.points))
+    return points_to_result(
+        turtle.points,
+        scale_mm=scale_mm,
+        max_stitch_mm=max_stitch_mm,
+        outputs=outputs,
+        breaks=turtle.breaks,
+        options=options,
+        timings=timings,
+        colors=turtle.block_colors,
+    )
 
 
 def generate_from_commands(
     commands: Iterable[Dict],
     scale_mm: float,
     max_stitch_mm: float,
+    cache: Optional[ResultCache] = None,
+    outputs: Iterable[str] = OUTPUT_KINDS,
+    options: Optional[PipelineOptions] = None,
+    timings: Optional[StageTimings] = None,
 ) -> Dict[str, object]:
-    points = run_commands(commands)
-    return points_to_outputs(points, scale_mm=scale_mm, max_stitch_mm=max_stitch_mm)
+    result = generate_result(
+        commands,
+        scale_mm=scale_mm,
+        max_stitch_mm=max_stitch_mm,
+        cache=cache,
+        outputs=outputs,
+        options=options,
+        timings=timings,
+    )
+    return result_to_outputs(result, outputs, timings)
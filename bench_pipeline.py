@@ -0,0 +1,381 @@
+"""Benchmarks for the turtle script -> PES pipeline.
+
+Runs representative workloads through each stage (parse, interpret,
+densify, build, encode) and reports wall time, peak traced memory and
+stitches per second. Results can be saved as a JSON baseline and compared
+on later runs, and ``--http`` also drives the FastAPI app in-process to
+measure ``/export_script`` latency percentiles. ``--startup`` times a cold
+``import server`` in fresh interpreters and flags heavy modules (the full
+pyembroidery writer set, PIL, Tk) that a worker must not load at startup.
+
+    python bench_pipeline.py                       # all workloads
+    python bench_pipeline.py -w octagon -w spiral  # a subset
+    python bench_pipeline.py --save-baseline bench_baseline.json
+    python bench_pipeline.py --baseline bench_baseline.json --fail-on-regression
+    python bench_pipeline.py --http 50 > bench_output.txt
+    python bench_pipeline.py -w octagon --startup 10 --fail-on-regression
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+from api_backend import run_path, script_to_commands
+from embroidery_fill import FillSettings
+from embroidery_utils import densify_array
+from test_class_pyembr import PyEmbroideryBuilder
+
+
+@dataclass
+class Workload:
+    name: str
+    script: str
+    scale_mm: float = 10.0
+    max_stitch_mm: float = 3.0
+    http: bool = True  # small enough for the request-time point budget
+
+
+def _spiral_script(turns: int = 200, steps_per_turn: int = 72) -> str:
+    # The DSL has no variables, so the growing step is written out line by line.
+    lines = ["penup()", "goto(75, 75)", "pendown()"]
+    for i in range(turns * steps_per_turn):
+        lines.append(f"forward({0.05 + i * 0.0004:.4f})")
+        lines.append(f"left({360 / steps_per_turn:g})")
+    return "\n".join(lines) + "\n"
+
+
+def _islands_script(rows: int = 20, cols: int = 20) -> str:
+    lines = []
+    for row in range(rows):
+        for col in range(cols):
+            lines += ["penup()", f"goto({5 + col * 7}, {5 + row * 7})", "pendown()"]
+            lines += ["for _ in range(4):", "    forward(4)", "    left(90)"]
+    return "\n".join(lines) + "\n"
+
+
+def _fill_script(vertices: int = 4000) -> str:
+    # A wavy ring traced in short moves, filled with tatami rows at 30 degrees.
+    lines = ["penup()", "goto(20, 75)", "pendown()", "fill_angle(30)", "begin_fill()"]
+    for i in range(vertices):
+        lines.append(f"forward({0.03 + 0.02 * (i % 40 < 20):.2f})")
+        lines.append(f"left({360 / vertices:g})")
+    lines.append("end_fill()")
+    return "\n".join(lines) + "\n"
+
+
+WORKLOADS: Dict[str, Workload] = {
+    w.name: w
+    for w in (
+        Workload(
+            "octagon",
+            "penup()\ngoto(65, 85)\npendown()\nfor i in range(8):\n    forward(20)\n    right(45)\n",
+        ),
+        Workload(
+            "rosettes",
+            "pendown()\nfor _ in range(36):\n    for _ in range(36):\n        forward(4)\n        right(10)\n"
+            "    right(10)\n    for _ in range(12):\n        forward(1)\n        right(30)\n",
+            scale_mm=1.0,
+        ),
+        Workload("spiral", _spiral_script(), scale_mm=1.0),
+        Workload("islands", _islands_script(), scale_mm=1.0),
+        Workload("fill", _fill_script()),
+        Workload(
+            "stress_1m",
+            "pendown()\nfor _ in range(1000):\n    for _ in range(1000):\n        forward(3)\n"
+            "    right(90)\n    forward(3)\n    right(90)\n",
+            scale_mm=1.0,
+            http=False,
+        ),
+    )
+}
+
+
+@dataclass
+class StageResult:
+    seconds: float  # best of the timed repeats
+    median_s: float
+    peak_mb: float
+
+
+@dataclass
+class WorkloadResult:
+    name: str
+    points: int
+    stitches: int
+    stages: Dict[str, StageResult] = field(default_factory=dict)
+
+    @property
+    def total_s(self) -> float:
+        return sum(stage.seconds for stage in self.stages.values())
+
+    @property
+    def stitches_per_s(self) -> float:
+        return self.stitches / self.total_s if self.total_s else math.inf
+
+
+def _stages(workload: Workload, png: bool) -> List[tuple]:
+    """``(name, fn)`` pairs; each fn takes and returns the shared state dict."""
+
+    def parse(state):
+        state["program"] = script_to_commands(workload.script)
+
+    def interpret(state):
+        fill = FillSettings.from_mm(workload.scale_mm, workload.max_stitch_mm)
+        state["points"], state["breaks"] = run_path(state["program"], max_points=None, fill=fill, max_stitches=None)
+
+    def densify(state):
+        step = workload.max_stitch_mm / workload.scale_mm
+        state["dense"] = densify_array(state["points"], step, breaks=state["breaks"])
+
+    def build(state):
+        builder = PyEmbroideryBuilder(scale_mm=workload.scale_mm, max_stitch_mm=workload.max_stitch_mm)
+        builder.points = state["points"]
+        builder.breaks = state["breaks"]
+        builder.build_pattern()
+        state["builder"] = builder
+
+    def encode_pes(state):
+        state["builder"].write_to(pes_stream=io.BytesIO())
+
+    def encode_png(state):
+        state["builder"].write_to(png_stream=io.BytesIO())
+
+    stages = [("parse", parse), ("interpret", interpret), ("densify", densify), ("build", build), ("encode_pes", encode_pes)]
+    if png:
+        stages.append(("encode_png", encode_png))
+    return stages
+
+
+def run_workload(workload: Workload, repeat: int = 3, png: bool = False) -> WorkloadResult:
+    stages = _stages(workload, png)
+    timings: Dict[str, List[float]] = {name: [] for name, _ in stages}
+    state: Dict[str, object] = {}
+
+    for _ in range(repeat):
+        state = {}
+        for name, fn in stages:
+            start = time.perf_counter()
+            fn(state)
+            timings[name].append(time.perf_counter() - start)
+
+    # Memory is traced in a separate pass: tracemalloc slows everything down.
+    peaks: Dict[str, float] = {}
+    traced: Dict[str, object] = {}
+    tracemalloc.start()
+    try:
+        for name, fn in stages:
+            tracemalloc.reset_peak()
+            fn(traced)
+            peaks[name] = tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+    result = WorkloadResult(
+        name=workload.name,
+        points=len(state["points"]),
+        stitches=len(state["builder"].pattern.stitches),
+    )
+    for name, _ in stages:
+        result.stages[name] = StageResult(min(timings[name]), statistics.median(timings[name]), peaks[name])
+    return result
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_http(workloads: Sequence[Workload], requests: int) -> Dict[str, Dict[str, float]]:
+    """Time ``/export_script`` in-process, both cold (cache cleared) and warm."""
+
+    from fastapi.testclient import TestClient
+
+    import server
+
+    results: Dict[str, Dict[str, float]] = {}
+    with TestClient(server.app) as client:
+        for workload in workloads:
+            if not workload.http:
+                continue
+            body = {"script": workload.script, "scale_mm": workload.scale_mm, "max_stitch_mm": workload.max_stitch_mm}
+            for mode in ("cold", "warm"):
+                latencies = []
+                for _ in range(requests):
+                    if mode == "cold":
+                        server.RESULT_CACHE.clear()
+                    start = time.perf_counter()
+                    response = client.post("/export_script", json=body)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    response.raise_for_status()
+                results[f"{workload.name}/{mode}"] = {
+                    "p50_ms": _percentile(latencies, 50),
+                    "p90_ms": _percentile(latencies, 90),
+                    "p99_ms": _percentile(latencies, 99),
+                    "max_ms": max(latencies),
+                }
+    return results
+
+
+# Loaded on first use only: pyembroidery imports every reader and writer,
+# PIL is only needed for previews, and the server never needs Tk.
+LAZY_MODULES = ("pyembroidery", "PIL", "tkinter", "turtle")
+
+_STARTUP_PROBE = """
+import sys, time
+start = time.perf_counter()
+import server
+elapsed = time.perf_counter() - start
+print(elapsed, *sorted({name.split(".")[0] for name in sys.modules} & set(sys.argv[1:])))
+"""
+
+
+def run_startup(repeat: int) -> Dict[str, object]:
+    """Import ``server`` in ``repeat`` fresh interpreters, as a new worker would.
+
+    ``import_ms`` is the import alone, ``process_ms`` includes interpreter
+    start-up; ``eager_modules`` lists any :data:`LAZY_MODULES` that loaded.
+    """
+
+    imports, processes, eager = [], [], set()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        probe = subprocess.run(
+            [sys.executable, "-c", _STARTUP_PROBE, *LAZY_MODULES],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        processes.append((time.perf_counter() - start) * 1000)
+        seconds, *loaded = probe.stdout.split()
+        imports.append(float(seconds) * 1000)
+        eager.update(loaded)
+    return {
+        "import_ms": min(imports),
+        "import_median_ms": statistics.median(imports),
+        "process_ms": min(processes),
+        "eager_modules": sorted(eager),
+    }
+
+
+def _report(
+    results: Sequence[WorkloadResult],
+    http: Dict[str, Dict[str, float]],
+    out: Callable[[str], None],
+    startup: Optional[Dict[str, object]] = None,
+) -> None:
+    for result in results:
+        out(
+            f"{result.name}: {result.points} points, {result.stitches} stitches, "
+            f"{result.total_s * 1000:.1f} ms total, {result.stitches_per_s:,.0f} stitches/s"
+        )
+        for name, stage in result.stages.items():
+            out(f"  {name:<11} {stage.seconds * 1000:10.2f} ms (median {stage.median_s * 1000:.2f})  peak {stage.peak_mb:8.1f} MB")
+    if http:
+        out("/export_script latency:")
+        for name, stats in http.items():
+            out("  {:<18} p50 {p50_ms:8.2f} ms  p90 {p90_ms:8.2f} ms  p99 {p99_ms:8.2f} ms".format(name, **stats))
+    if startup:
+        out(
+            "startup: import server {import_ms:.1f} ms (median {import_median_ms:.1f}), "
+            "process {process_ms:.1f} ms".format(**startup)
+        )
+        if startup["eager_modules"]:
+            out(f"  loaded at startup: {', '.join(startup['eager_modules'])}  REGRESSION")
+
+
+def to_baseline(
+    results: Sequence[WorkloadResult],
+    http: Dict[str, Dict[str, float]],
+    startup: Optional[Dict[str, object]] = None,
+) -> Dict[str, object]:
+    return {
+        "workloads": {
+            r.name: {"stitches": r.stitches, "stages": {k: asdict(v) for k, v in r.stages.items()}} for r in results
+        },
+        "http": http,
+        "startup": startup or {},
+    }
+
+
+def compare(
+    results: Sequence[WorkloadResult],
+    http: Dict[str, Dict[str, float]],
+    baseline: Dict[str, object],
+    threshold: float,
+    out: Callable[[str], None],
+    startup: Optional[Dict[str, object]] = None,
+) -> int:
+    """Print current/baseline ratios; return how many exceed ``threshold``."""
+
+    regressions = 0
+
+    def check(label: str, now: float, before: Optional[float]) -> None:
+        nonlocal regressions
+        if not before:
+            return
+        ratio = now / before
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        out(f"  {label:<28} {ratio:6.2f}x{flag}")
+
+    out(f"vs baseline (regression above {threshold:.2f}x):")
+    old_workloads = baseline.get("workloads", {})
+    for result in results:
+        old = old_workloads.get(result.name, {}).get("stages", {})
+        for name, stage in result.stages.items():
+            check(f"{result.name}/{name}", stage.seconds, old.get(name, {}).get("seconds"))
+    for name, stats in http.items():
+        check(f"http {name} p90", stats["p90_ms"], baseline.get("http", {}).get(name, {}).get("p90_ms"))
+    if startup:
+        check("startup import", startup["import_ms"], baseline.get("startup", {}).get("import_ms"))
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-w", "--workload", action="append", choices=sorted(WORKLOADS), help="run only these")
+    parser.add_argument("--repeat", type=int, default=3, help="timed repeats per workload (best is reported)")
+    parser.add_argument("--png", action="store_true", help="also time PNG encoding")
+    parser.add_argument("--http", type=int, default=0, metavar="N", help="also send N /export_script requests per workload")
+    parser.add_argument("--startup", type=int, default=0, metavar="N", help="also time a cold 'import server' N times")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 when a regression is found")
+    args = parser.parse_args(argv)
+
+    selected = [WORKLOADS[name] for name in args.workload or WORKLOADS]
+    results = [run_workload(workload, repeat=args.repeat, png=args.png) for workload in selected]
+    http = run_http(selected, args.http) if args.http else {}
+    startup = run_startup(args.startup) if args.startup else None
+    _report(results, http, print, startup)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as handle:
+            json.dump(to_baseline(results, http, startup), handle, indent=2)
+
+    # Heavy modules loaded at startup are a regression with or without a baseline.
+    regressions = len(startup["eager_modules"]) if startup else 0
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions += compare(results, http, json.load(handle), args.threshold, print, startup)
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
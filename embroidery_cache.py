@@ -0,0 +1,223 @@
+"""Content-addressed cache for finished embroidery exports.
+
+Results are keyed by a hash of the normalized command program plus the
+scale settings, so identical submissions skip parsing, densification and
+encoding. A bounded in-process LRU sits in front of an optional on-disk
+tier that is trimmed to a size budget. The disk tier is indexed in memory
+(file sizes in least-recently-used order), built from one directory scan at
+startup, so a write never rescans the directory.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from embroidery_points import PointBuffer
+
+# Point buffers stored as raw float64 files rather than JSON lists. Every
+# ``bytes`` value (PES, PNG, DST, ...) is stored as a file of its own too.
+_ARRAY_FIELDS = ("centered_points",)
+
+
+def cache_key(
+    program: List[Dict],
+    scale_mm: float,
+    max_stitch_mm: float,
+    options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Hash a normalized program, its scale settings and any non-default options."""
+
+    data: Dict[str, Any] = {"program": program, "scale_mm": float(scale_mm), "max_stitch_mm": float(max_stitch_mm)}
+    if options:
+        data["options"] = options
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    disk_hits: int = 0
+    disk_evictions: int = 0
+
+
+class ResultCache:
+    """Two-tier LRU cache of export results (raw bytes plus metadata)."""
+
+    def __init__(
+        self,
+        max_entries: int = 128,
+        disk_dir: Optional[Union[str, Path]] = None,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Disk entries, least recently used first: key -> {file suffix: bytes}.
+        self._disk: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._disk_bytes = 0
+
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._scan_disk()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        """Whether ``get`` would find ``key``; neither loads it nor counts a hit."""
+
+        with self._lock:
+            if key in self._entries:
+                return True
+        return self.disk_dir is not None and self._path(key, "json").exists()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return result
+
+        result = self._read_disk(key)
+        with self._lock:
+            if result is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            self.stats.disk_hits += 1
+            self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: Dict) -> None:
+        with self._lock:
+            self._remember(key, result)
+        self._write_disk(key, result)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters plus current sizes, for sizing the cache."""
+
+        with self._lock:
+            data = asdict(self.stats)
+            data["entries"] = len(self._entries)
+            data["max_entries"] = self.max_entries
+            if self.disk_dir is not None:
+                data["disk_bytes"] = self._disk_bytes
+                data["max_disk_bytes"] = self.max_disk_bytes
+        return data
+
+    def _remember(self, key: str, result: Dict) -> None:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    # -- disk tier -----------------------------------------------------
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self.disk_dir / f"{key}.{suffix}"
+
+    def _read_disk(self, key: str) -> Optional[Dict]:
+        if self.disk_dir is None:
+            return None
+
+        meta_path = self._path(key, "json")
+        try:
+            result = json.loads(meta_path.read_text())
+            for name in result.pop("blobs", []):
+                result[name] = self._path(key, name).read_bytes()
+            for name in result.pop("arrays", []):
+                result[name] = PointBuffer.frombytes(self._path(key, name).read_bytes())
+        except (OSError, ValueError):
+            return None
+
+        os.utime(meta_path)  # mark as recently used across restarts
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return result
+
+    def _write_disk(self, key: str, result: Dict) -> None:
+        if self.disk_dir is None:
+            return
+
+        blobs = [name for name, value in result.items() if isinstance(value, bytes)]
+        meta = {k: v for k, v in result.items() if k not in blobs and k not in _ARRAY_FIELDS}
+        meta["blobs"] = blobs
+        meta["arrays"] = [name for name in _ARRAY_FIELDS if name in result]
+        sizes: Dict[str, int] = {}
+        try:
+            for name in meta["blobs"]:
+                sizes[name] = self._atomic_write(self._path(key, name), result[name])
+            for name in meta["arrays"]:
+                sizes[name] = self._atomic_write(self._path(key, name), PointBuffer.coerce(result[name]).tobytes())
+            # Metadata goes last: its presence marks the entry as complete.
+            sizes["json"] = self._atomic_write(self._path(key, "json"), json.dumps(meta).encode("utf-8"))
+        except OSError:
+            return
+
+        with self._lock:
+            files = self._disk.pop(key, {})
+            self._disk_bytes -= sum(files.values())
+            files.update(sizes)
+            self._disk[key] = files
+            self._disk_bytes += sum(files.values())
+        self._evict_disk()
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes) -> int:
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return len(data)
+
+    def _scan_disk(self) -> None:
+        """Index the complete entries already on disk, oldest first, in one pass."""
+
+        files: Dict[str, Dict[str, int]] = {}
+        used: Dict[str, float] = {}
+        for entry in os.scandir(self.disk_dir):
+            key, _, suffix = entry.name.partition(".")
+            if not suffix or entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.setdefault(key, {})[suffix] = stat.st_size
+            if suffix == "json":
+                used[key] = stat.st_mtime
+        for key in sorted(used, key=used.get):
+            self._disk[key] = files[key]
+            self._disk_bytes += sum(files[key].values())
+
+    def _evict_disk(self) -> None:
+        while True:
+            with self._lock:
+                if self._disk_bytes <= self.max_disk_bytes or not self._disk:
+                    return
+                key, files = self._disk.popitem(last=False)
+                self._disk_bytes -= sum(files.values())
+                self.stats.disk_evictions += 1
+            # Metadata first, so a reader never sees an entry missing its blobs.
+            for suffix in sorted(files, key=lambda name: name != "json"):
+                try:
+                    self._path(key, suffix).unlink()
+                except OSError:
+                    pass
@@ -0,0 +1,173 @@
+"""Stitch density analysis on a spatial hash grid.
+
+Stitches (pattern units, mm) are binned into square cells in one
+vectorized pass and counted with ``bincount``. Compact designs index a
+dense grid directly; designs whose extent would make that grid much
+larger than the stitch count hash their cell keys into a table about
+eight times the stitch count instead, and the few buckets shared by two
+cells are separated exactly. Either way the cost stays linear in the
+number of stitches, so the analysis runs on every export.
+"""
+
+import math
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_CELL_MM = 2.0
+# Stitches per mm² above which a cell is reported as a hotspot.
+HOTSPOT_PER_MM2 = 6.0
+MAX_HOTSPOTS = 10
+# Thinning passes; each removes at most every other stitch of a dense run.
+THIN_PASSES = 4
+
+_GOLDEN = 0.6180339887498949
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+@dataclass
+class Hotspot:
+    x_mm: float  # cell centre, pattern coordinates
+    y_mm: float
+    stitches: int
+    per_mm2: float
+
+
+@dataclass
+class DensityReport:
+    cell_mm: float
+    cells: int  # occupied cells
+    max_per_mm2: float
+    mean_per_mm2: float  # over occupied cells
+    threshold_per_mm2: float
+    dense_cells: int
+    hotspots: List[Hotspot] = field(default_factory=list)
+    stitches_thinned: int = 0
+    max_per_mm2_before: Optional[float] = None  # set when stitches were thinned
+
+    def as_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+def _bin(stitches: np.ndarray, cell_mm: float) -> Tuple[np.ndarray, np.ndarray]:
+    """``(cell, counts)``: a cell id per stitch and stitch counts per cell id."""
+
+    ij = np.floor(stitches / cell_mm).astype(np.int64)
+    ij -= ij.min(axis=0)
+    nx, ny = int(ij[:, 0].max()) + 1, int(ij[:, 1].max()) + 1
+    n = len(ij)
+
+    if nx * ny <= 8 * n + 1024:
+        cell = ij[:, 0] * ny + ij[:, 1]
+        return cell, np.bincount(cell, minlength=nx * ny)
+
+    keys = (ij[:, 0].astype(np.uint64) << np.uint64(32)) | ij[:, 1].astype(np.uint64)
+    bits = max(4, math.ceil(math.log2(8 * n)))
+    size = 1 << bits
+    cell = ((keys * _HASH_MULTIPLIER) >> np.uint64(64 - bits)).astype(np.int64)
+    # A bucket holds one cell when every stitch in it agrees with the key
+    # written there last; stitches in shared buckets get exact ids past the table.
+    owner = np.zeros(size, dtype=np.uint64)
+    owner[cell] = keys
+    shared = np.zeros(size, dtype=bool)
+    shared[cell[keys != owner[cell]]] = True
+    clashing = shared[cell]
+    if clashing.any():
+        _, extra = np.unique(keys[clashing], return_inverse=True)
+        cell[clashing] = size + extra
+        size += int(extra.max()) + 1
+    return cell, np.bincount(cell, minlength=size)
+
+
+def analyze_density(
+    stitches: Sequence[Tuple[float, float]],
+    cell_mm: float = DEFAULT_CELL_MM,
+    threshold_per_mm2: float = HOTSPOT_PER_MM2,
+    max_hotspots: int = MAX_HOTSPOTS,
+) -> DensityReport:
+    """Stitches per mm² over a grid of ``cell_mm`` cells, with the densest cells as hotspots."""
+
+    pts = np.asarray(stitches, dtype=np.float64).reshape(-1, 2)
+    area = cell_mm * cell_mm
+    if not len(pts):
+        return DensityReport(cell_mm, 0, 0.0, 0.0, threshold_per_mm2, 0)
+
+    cell, counts = _bin(pts, cell_mm)
+    occupied = int(np.count_nonzero(counts))
+    dense = np.flatnonzero(counts > threshold_per_mm2 * area)
+
+    hotspots: List[Hotspot] = []
+    if len(dense) and max_hotspots > 0:
+        top = dense[np.argsort(-counts[dense], kind="stable")[:max_hotspots]]
+        some_stitch = np.empty(len(counts), dtype=np.int64)
+        some_stitch[cell] = np.arange(len(cell))
+        corners = (np.floor(pts[some_stitch[top]] / cell_mm) + 0.5) * cell_mm
+        for (x, y), index in zip(corners.tolist(), top.tolist()):
+            hotspots.append(Hotspot(x, y, int(counts[index]), round(float(counts[index]) / area, 3)))
+
+    return DensityReport(
+        cell_mm=cell_mm,
+        cells=occupied,
+        max_per_mm2=round(float(counts.max()) / area, 3),
+        mean_per_mm2=round(len(pts) / (occupied * area), 3),
+        threshold_per_mm2=threshold_per_mm2,
+        dense_cells=len(dense),
+        hotspots=hotspots,
+    )
+
+
+def thin_stitches(
+    stitches: Sequence[Tuple[int, int]],
+    jumps: Sequence[int],
+    cell_mm: float,
+    max_per_mm2: float,
+    max_stitch: float,
+) -> Tuple[np.ndarray, List[int], int]:
+    """Drop stitches in cells denser than ``max_per_mm2``.
+
+    Each pass thins cells towards the cap, spreading the removals along
+    the path. Block ends and stitches next to a removed one are always
+    kept, and a stitch is only removed when its neighbours are at most
+    ``max_stitch`` apart, so no stitch gets longer than the maximum.
+    Returns ``(stitches, jumps, removed)`` with ``jumps`` re-indexed.
+    """
+
+    pts = np.asarray(stitches).reshape(-1, 2)
+    jumps = list(jumps)
+    removed = 0
+    for _ in range(THIN_PASSES):
+        pts, jumps, dropped = _thin_once(pts, jumps, cell_mm, max_per_mm2, max_stitch)
+        removed += dropped
+        if not dropped:
+            break
+    return pts, jumps, removed
+
+
+def _thin_once(pts: np.ndarray, jumps: List[int], cell_mm: float, max_per_mm2: float, max_stitch: float):
+    n = len(pts)
+    if n < 3:
+        return pts, jumps, 0
+
+    cell, counts = _bin(pts.astype(np.float64), cell_mm)
+    keep_ratio = np.minimum(1.0, max_per_mm2 * cell_mm * cell_mm / counts[cell])
+    index = np.arange(n)
+    candidate = (index * _GOLDEN) % 1.0 >= keep_ratio
+
+    ends = np.asarray(jumps, dtype=np.intp)
+    candidate[[0, n - 1]] = False
+    candidate[ends] = False
+    candidate[ends - 1] = False
+
+    # Alternate within runs of candidates so both neighbours of a removed stitch stay.
+    previous = np.concatenate(([False], candidate[:-1]))
+    run_start = np.maximum.accumulate(np.where(candidate & ~previous, index, 0))
+    drop = candidate & ((index - run_start) % 2 == 0)
+
+    inner = np.flatnonzero(drop)
+    gap = np.hypot(*(pts[inner + 1] - pts[inner - 1]).T)
+    drop[inner[gap > max_stitch]] = False
+
+    keep = ~drop
+    kept_before = np.cumsum(keep) - 1
+    return pts[keep], kept_before[ends].tolist(), int(drop.sum())
@@ -0,0 +1,438 @@
+"""Static cost estimates for turtle programs, computed before running them.
+
+:func:`estimate_cost` walks a normalized program once, multiplying loop
+bodies by their counts instead of unrolling them, and bounds the commands
+executed, the points recorded and the stitches densification will produce,
+plus the area the turtle covers. Commands are counted as the interpreter
+charges them, every loop iteration at least one. Turns are constants, so
+headings are always known exactly; loops of relative moves are bounded by
+the circle their iterations travel on, which keeps the extent of closed
+shapes tight. Each fill is bounded by the size of its own outline. Without
+fills, satin gotos or loops that toggle the pen, the point count is exact.
+:class:`AdmissionPolicy` turns an estimate into a routing decision.
+"""
+
+import cmath
+import math
+from dataclasses import dataclass, field, fields
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from api_backend import DEFAULT_OP_BUDGET, DEFAULT_POINT_BUDGET, DEFAULT_STITCH_BUDGET
+from embroidery_fill import FillSettings
+
+Box = Tuple[float, float, float, float]  # min_x, min_y, max_x, max_y
+
+ORIGIN: Box = (0.0, 0.0, 0.0, 0.0)
+
+REJECT = "reject"
+INLINE = "inline"
+POOL = "pool"
+
+
+def _union(a: Optional[Box], b: Optional[Box]) -> Optional[Box]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _shift(box: Box, dx: float, dy: float) -> Box:
+    return (box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy)
+
+
+def _grow(box: Box, r: float) -> Box:
+    return (box[0] - r, box[1] - r, box[2] + r, box[3] + r)
+
+
+def _sum(a: Box, b: Box) -> Box:
+    """Minkowski sum: every position in ``a`` offset by every offset in ``b``."""
+
+    return (a[0] + b[0], a[1] + b[1], a[2] + b[2], a[3] + b[3])
+
+
+def _diagonal(box: Box) -> float:
+    return math.hypot(box[2] - box[0], box[3] - box[1])
+
+
+def _reach(box: Optional[Box]) -> float:
+    if box is None:
+        return 0.0
+    return max(math.hypot(x, y) for x in (box[0], box[2]) for y in (box[1], box[3]))
+
+
+@dataclass
+class _Totals:
+    commands: int = 0
+    points: int = 0
+    blocks: int = 0
+    # Pen-down moves only; pen-up travel is one jump per block.
+    length: float = 0.0  # distance sewn
+    gotos: int = 0  # sewn gotos from an inexact position; each spans at most the extent
+    satin_points: int = 0  # included in points; each zig-zag is up to width + spacing long
+    satin_gotos: int = 0
+    fills: int = 0
+    fill_vertices: int = 0
+    fill_length: float = 0.0
+    fill_gotos: int = 0
+    # Fills traced within one walk are bounded by their outline's diagonal;
+    # the others (open_fills) by the whole design's.
+    fill_points: int = 0
+    fill_sewn: float = 0.0
+    fill_closing: float = 0.0
+    open_fills: int = 0
+    exact: bool = True
+
+    def add(self, other: "_Totals", times: int = 1) -> None:
+        for f in fields(self):
+            if f.name == "exact":
+                self.exact = self.exact and other.exact
+            else:
+                setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name) * times)
+
+
+@dataclass
+class _Run:
+    box: Box  # where the turtle may be now
+    heading: float
+    mode: Dict[str, object]  # pen / fill / satin on or off, current thread; None when unknown
+    totals: _Totals = field(default_factory=_Totals)
+    visited: Optional[Box] = None  # every position reached
+    inner: Optional[Box] = None  # positions reached before the last move
+    last: Optional[Box] = None
+    outline: Optional[Box] = None  # positions reached since begin_fill in this walk
+
+    def visit(self, region: Optional[Box], end: Box) -> None:
+        self.inner = _union(_union(self.inner, self.last), region)
+        self.visited = _union(_union(self.visited, region), end)
+        if self.outline is not None:
+            self.outline = _union(_union(self.outline, region), end)
+        self.last = end
+        self.box = end
+
+
+def _executed(body: Iterable[Dict]) -> Iterable[Dict]:
+    """Non-repeat nodes of ``body`` that run at least once, in order."""
+
+    for node in body:
+        if node["op"] == "repeat":
+            if int(node.get("count", 0)) > 0:
+                yield from _executed(node.get("body", []))
+        else:
+            yield node
+
+
+def _mode_effects(body: List[Dict]) -> Dict[str, bool]:
+    effects: Dict[str, bool] = {}
+    for node in _executed(body):
+        op = node["op"]
+        if op in ("penup", "pendown"):
+            effects["pen"] = op == "pendown"
+        elif op in ("begin_fill", "end_fill"):
+            effects["fill"] = op == "begin_fill"
+        elif op == "satin":
+            effects["satin"] = float(node.get("value") or 0.0) > 0
+        elif op == "color":
+            effects["color"] = node["color"]
+    return effects
+
+
+def _relative_length(body: List[Dict]) -> float:
+    total = 0.0
+    for node in body:
+        if node["op"] == "repeat":
+            total += max(0, int(node.get("count", 0))) * _relative_length(node.get("body", []))
+        elif node["op"] in ("forward", "backward"):
+            total += abs(float(node.get("value") or 0.0))
+    return total
+
+
+class _Walker:
+    def __init__(self, fill: FillSettings):
+        self.spacing = fill.spacing
+        self.stitch = fill.stitch
+        self.satin_width = 0.0  # widest satin requested anywhere
+
+    def walk(
+        self,
+        program: List[Dict],
+        box: Box,
+        heading: float,
+        mode: Dict[str, object],
+        outline: Optional[Box] = None,
+    ) -> _Run:
+        run = _Run(box=box, heading=heading, mode=dict(mode), outline=outline)
+        for node in program:
+            op = node["op"]
+            if op == "repeat":
+                self._repeat(run, node)
+                continue
+            run.totals.commands += 1
+            value = float(node.get("value") or 0.0)
+            if op in ("forward", "backward"):
+                distance = value if op == "forward" else -value
+                radians = math.radians(run.heading)
+                self._move(run, _shift(run.box, math.cos(radians) * distance, math.sin(radians) * distance), abs(distance))
+            elif op == "goto":
+                x, y = float(node["x"]), float(node["y"])
+                exact = run.box[0] == run.box[2] and run.box[1] == run.box[3]
+                distance = math.hypot(x - run.box[0], y - run.box[1]) if exact else None
+                self._move(run, (x, y, x, y), distance)
+            elif op == "left":
+                run.heading += value
+            elif op == "right":
+                run.heading -= value
+            elif op == "penup":
+                run.mode["pen"] = False
+            elif op == "pendown":
+                if run.mode["pen"] is not True:
+                    run.totals.blocks += 1
+                run.mode["pen"] = True
+                run.totals.points += 1
+            elif op == "begin_fill":
+                run.mode["fill"] = True
+                run.totals.fill_vertices += 1
+                run.outline = run.box
+            elif op == "end_fill":
+                if run.mode["fill"] is not False:
+                    self._end_fill(run)
+                run.mode["fill"] = False
+                run.outline = None
+            elif op == "satin":
+                run.mode["satin"] = value > 0
+                self.satin_width = max(self.satin_width, value)
+            elif op == "color":
+                if run.mode["color"] != node["color"]:
+                    # A new thread starts a block, at the current position when the pen is down.
+                    run.totals.blocks += 1
+                    if run.mode["pen"] is not False:
+                        run.totals.points += 1
+                        run.totals.exact = False
+                run.mode["color"] = node["color"]
+        return run
+
+    def _end_fill(self, run: _Run) -> None:
+        totals = run.totals
+        totals.fills += 1
+        totals.exact = False
+        if run.outline is None:
+            totals.open_fills += 1
+            return
+        # Rows and row lengths are bounded by the outline's diameter, which
+        # its bounding box's diagonal bounds whatever the fill angle.
+        diagonal = _diagonal(run.outline)
+        rows = math.floor(diagonal / self.spacing) + 1
+        totals.fill_points += rows * (math.ceil(diagonal / self.stitch) + 1)
+        totals.fill_sewn += rows * diagonal
+        totals.fill_closing += diagonal
+
+    def _move(self, run: _Run, end: Box, distance: Optional[float]) -> None:
+        """Move to ``end``; ``distance`` is None when only the extent bounds it."""
+
+        totals, mode = run.totals, run.mode
+        if mode["pen"] is not False:
+            if distance is None:
+                totals.gotos += 1
+            else:
+                totals.length += distance
+        if mode["fill"] is not False:
+            totals.fill_vertices += 1
+            if distance is None:
+                totals.fill_gotos += 1
+            else:
+                totals.fill_length += distance
+        if mode["pen"] is not False:
+            if mode["satin"] is False:
+                totals.points += 1
+            elif distance is None:
+                totals.satin_gotos += 1
+            else:
+                ratio = distance / self.spacing
+                zigzags = math.ceil(ratio)
+                if ratio > 0 and abs(ratio - round(ratio)) <= 1e-9 * ratio:
+                    # The turtle's float position can tip the column either way.
+                    zigzags = round(ratio) + 1
+                    totals.exact = False
+                if mode["satin"] is None:
+                    zigzags = max(1, zigzags)
+                totals.points += zigzags
+                totals.satin_points += zigzags
+        if None in (mode["pen"], mode["fill"], mode["satin"]):
+            totals.exact = False
+        run.visit(None, end)
+
+    def _repeat(self, run: _Run, node: Dict) -> None:
+        count = int(node.get("count", 0))
+        body = node.get("body", [])
+        if count <= 0:
+            return
+
+        effects = _mode_effects(body)
+        mode = dict(run.mode)
+        if count > 1:
+            # A body that leaves a mode changed starts later iterations differently.
+            for name, value in effects.items():
+                if mode[name] != value:
+                    mode[name] = None
+        after = {**run.mode, **effects}
+
+        goto_targets = [(float(n["x"]), float(n["y"])) for n in _executed(body) if n["op"] == "goto"]
+        if goto_targets:
+            xs, ys = zip(*goto_targets)
+            anchors = (min(xs), min(ys), max(xs), max(ys))
+            reach = _relative_length(body)
+        if count == 1 or not goto_targets:
+            start = run.box if count == 1 else ORIGIN
+        else:
+            # Later iterations start within reach of a goto target, so one
+            # walk from anywhere in there (or the loop start) bounds them all.
+            start = _union(run.box, _grow(anchors, reach))
+        outline = None
+        if run.outline is not None and (count == 1 or effects.get("fill") is not True):
+            # Only the first iteration can close a fill begun before the
+            # loop, unless iterations leave fills open for the next one.
+            outline = run.outline
+            if count > 1 and not goto_targets:
+                # Measured from the loop's start, like the body.
+                low, high = run.box[:2], run.box[2:]
+                outline = (outline[0] - high[0], outline[1] - high[1], outline[2] - low[0], outline[3] - low[1])
+        sub = self.walk(body, start, run.heading, mode, outline)
+        run.totals.add(sub.totals, count)
+        if not sub.totals.commands:
+            run.totals.commands += count  # every iteration costs an op, even an empty one
+        turn = sub.heading - run.heading
+        run.heading += turn * count
+        run.mode = after
+        if after["fill"] is False:
+            run.outline = None
+
+        if sub.visited is None:
+            return
+        if count == 1:
+            run.visit(sub.inner, sub.box)
+        elif not goto_targets:
+            self._relative_loop(run, sub, count, math.radians(turn))
+        else:
+            # Every iteration passes a goto target, then moves at most the
+            # body's relative length before (and after) the next one.
+            run.visit(_union(sub.visited, _grow(anchors, 2 * reach)), _grow(anchors, reach))
+
+    def _relative_loop(self, run: _Run, sub: _Run, count: int, turn: float) -> None:
+        """Bound ``count`` iterations of a body measured from the origin."""
+
+        step = complex(sub.box[0], sub.box[1])  # net move of the first iteration
+        spin = cmath.exp(1j * turn)
+        line = _grow(ORIGIN, (count - 1) * abs(step))
+        if abs(spin - 1) < 1e-12:
+            far = step * (count - 1)
+            starts = (min(0.0, far.real), min(0.0, far.imag), max(0.0, far.real), max(0.0, far.imag))
+            end = step * count
+        else:
+            # Iteration starts lie on a circle through the origin.
+            center = step / (1 - spin)
+            circle = _grow((center.real, center.imag, center.real, center.imag), abs(center))
+            starts = (
+                max(circle[0], line[0]),
+                max(circle[1], line[1]),
+                min(circle[2], line[2]),
+                min(circle[3], line[3]),
+            )
+            end = step * (1 - spin**count) / (1 - spin)
+        region = _sum(run.box, _grow(starts, _reach(sub.inner)))
+        run.visit(region, _shift(run.box, end.real, end.imag))
+
+
+@dataclass
+class CostEstimate:
+    commands: int  # ops charged by the interpreter, exact
+    points: int  # recorded points (upper bound; exact when ``exact``)
+    stitches: int  # stitches in the pattern, upper bound
+    extent: Box  # turtle units, covers every position including travel
+    exact: bool
+    scale_mm: float
+
+    def as_dict(self) -> Dict[str, object]:
+        min_x, min_y, max_x, max_y = self.extent
+        return {
+            "commands": self.commands,
+            "points": self.points,
+            "stitches": self.stitches,
+            "exact": self.exact,
+            "extent": {
+                "min_x": round(min_x, 3),
+                "min_y": round(min_y, 3),
+                "max_x": round(max_x, 3),
+                "max_y": round(max_y, 3),
+                "width_mm": round((max_x - min_x) * self.scale_mm, 1),
+                "height_mm": round((max_y - min_y) * self.scale_mm, 1),
+            },
+        }
+
+
+def estimate_cost(
+    program: List[Dict],
+    scale_mm: float,
+    max_stitch_mm: float,
+    fill: Optional[FillSettings] = None,
+) -> CostEstimate:
+    """Bound the cost of a normalized ``program`` without running it."""
+
+    fill = fill or FillSettings.from_mm(scale_mm, max_stitch_mm)
+    walker = _Walker(fill)
+    run = walker.walk(program, ORIGIN, 0.0, {"pen": False, "fill": False, "satin": False, "color": ""})
+    t = run.totals
+    extent = _union(run.visited, ORIGIN)  # the turtle starts at the origin
+    diagonal = math.hypot(extent[2] - extent[0], extent[3] - extent[1])
+    spacing = fill.spacing
+
+    satin_points = t.satin_points + t.satin_gotos * (math.ceil(diagonal / spacing) + 1)
+    points = t.points + t.satin_gotos * (math.ceil(diagonal / spacing) + 1)
+
+    # Tatami fills: every row crossing of the outline is a span end, plus
+    # the staggered stitches along each row.
+    rows = math.floor(diagonal / spacing) + 1
+    perimeter = t.fill_length + (t.fill_gotos + t.open_fills) * diagonal + t.fill_closing
+    crossings = math.ceil(perimeter / spacing) + t.fill_vertices if t.fills else 0
+    points += 2 * crossings + t.fill_points + t.open_fills * rows * (math.ceil(diagonal / fill.stitch) + 1)
+
+    sewn = (
+        t.length
+        + t.gotos * diagonal
+        + satin_points * (walker.satin_width + spacing)
+        + t.fill_sewn  # row-to-row connections
+        + t.open_fills * rows * diagonal
+    )
+    blocks = t.blocks + crossings // 2 + t.fills
+    stitches = points + math.ceil(sewn / (max_stitch_mm / scale_mm)) + 2 * blocks + 1
+    exact = t.exact and not t.satin_gotos
+    return CostEstimate(t.commands, points, stitches, extent, exact, scale_mm)
+
+
+@dataclass(frozen=True)
+class AdmissionPolicy:
+    """Reject designs whose bounds exceed a budget; send large ones to the process pool.
+
+    The point bound is exact for most designs; for fills and other inexact
+    estimates it can reject a design that would have fitted, which is
+    preferred to running it for long before the interpreter's own check.
+    The stitch bound is always an upper bound and is checked the same way.
+    """
+
+    max_points: Optional[int] = DEFAULT_POINT_BUDGET
+    max_ops: Optional[int] = DEFAULT_OP_BUDGET
+    max_stitches: Optional[int] = DEFAULT_STITCH_BUDGET
+    inline_stitches: int = 100_000
+
+    def route(self, estimate: CostEstimate) -> Tuple[str, Optional[str]]:
+        """``(route, reason)`` with route one of ``reject``, ``inline`` or ``pool``."""
+
+        if self.max_ops is not None and estimate.commands > self.max_ops:
+            return REJECT, f"design runs {estimate.commands} commands, over the budget of {self.max_ops}"
+        if self.max_points is not None and estimate.points > self.max_points:
+            records = "records" if estimate.exact else "may record up to"
+            return REJECT, f"design {records} {estimate.points} stitch points, over the budget of {self.max_points}"
+        if self.max_stitches is not None and estimate.stitches > self.max_stitches:
+            return REJECT, f"design may sew up to {estimate.stitches} stitches, over the budget of {self.max_stitches}"
+        if estimate.stitches <= self.inline_stitches:
+            return INLINE, None
+        return POOL, None
@@ -0,0 +1,177 @@
+"""HTTP caching helpers: entity tags, conditional requests and compression.
+
+Export responses are deterministic for a given request body, so their
+ETag is a digest of it and ``If-None-Match`` can be answered with 304
+before any work is done. :class:`CompressionMiddleware` compresses
+complete responses with brotli (when the ``brotli`` package is installed)
+or gzip; streamed responses and already-compressed media pass through.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Media types worth compressing; PNG and ZIP payloads are deflated already.
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/octet-stream",
+    "image/svg+xml",
+    "text/",
+)
+DEFAULT_MIN_SIZE = 1024
+
+
+def request_tag(*parts) -> str:
+    """Deterministic digest of JSON-serializable ``parts`` (key order does not matter)."""
+
+    data = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+
+def parse_if_none_match(value: Optional[str]) -> List[str]:
+    """Entity tags listed in an ``If-None-Match`` header, unquoted and without ``W/``."""
+
+    tags = []
+    for part in (value or "").split(","):
+        part = part.strip()
+        if part.startswith("W/"):
+            part = part[2:]
+        if part:
+            tags.append(part.strip('"'))
+    return tags
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as RFC 9110 requires for ``If-None-Match``."""
+
+    tags = parse_if_none_match(if_none_match)
+    return "*" in tags or parse_if_none_match(etag)[0] in tags
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def cached_file(path: os.PathLike, headers: Headers, cache_control: str) -> Response:
+    """A file with ``Cache-Control``, or 304 when the client's copy is current."""
+
+    response = FileResponse(path, stat_result=os.stat(path))
+    etag = response.headers["etag"]
+    if etag_matches(headers.get("if-none-match"), etag):
+        return not_modified(etag, cache_control)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles plus ``Cache-Control``; Starlette already revalidates with ETag/Last-Modified."""
+
+    def __init__(self, *args, cache_control: str = "no-cache", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = self.cache_control
+        return response
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def choose_encoding(accept_encoding: str, brotli_available: bool) -> Optional[str]:
+    """``br``, ``gzip`` or None for an ``Accept-Encoding`` header."""
+
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    if brotli_available and weights.get("br", wildcard) > 0:
+        return "br"
+    if weights.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """Compress complete responses of at least ``minimum_size`` bytes.
+
+    Responses sent in several body chunks (NDJSON streams, large files)
+    are passed through so they keep streaming. A strong ETag becomes weak
+    on the compressed representation.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = DEFAULT_MIN_SIZE, gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.brotli = _brotli()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.brotli is not None)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # held until the body shows whether to compress
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if not message.get("more_body", False) and self._compressible(start["status"], headers, body):
+                body = self._compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                message = {**message, "body": body}
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, status: int, headers: MutableHeaders, body: bytes) -> bool:
+        if status != 200 or "content-encoding" in headers or len(body) < self.minimum_size:
+            return False
+        media_type = headers.get("content-type", "")
+        return media_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return self.brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
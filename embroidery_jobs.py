@@ -0,0 +1,241 @@
+"""Asynchronous export jobs backed by a process pool.
+
+Heavy designs are CPU-bound end to end (interpretation, densification,
+PES/PNG encoding), so running them on the request thread both blocks a
+server worker and serializes on the GIL. :class:`JobQueue` hands them to
+a :class:`ProcessPoolExecutor` instead and tracks each submission as a
+:class:`Job` that clients can poll, await or cancel.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, Future
+from dataclasses import dataclass, field
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Set
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMEOUT = "timeout"
+
+FINISHED = {DONE, FAILED, CANCELLED, TIMEOUT}
+
+
+class QueueFull(RuntimeError):
+    """Raised when the number of unfinished jobs reaches the queue bound."""
+
+
+class WorkerLost(RuntimeError):
+    """Raised when the process pool broke, e.g. a worker was killed; the next submission starts a new pool."""
+
+
+@dataclass
+class Job:
+    id: str
+    status: str = QUEUED
+    result: Any = None
+    error: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    future: Optional[Future] = field(default=None, repr=False)
+    task: Optional["asyncio.Task"] = field(default=None, repr=False)
+
+    @property
+    def state(self) -> str:
+        if self.status == QUEUED and self.future is not None and self.future.running():
+            return RUNNING
+        return self.status
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.state,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+    async def wait(self, timeout: Optional[float] = None) -> None:
+        """Wait up to ``timeout`` seconds for the job to finish."""
+
+        if self.task is None or self.status in FINISHED:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self.task), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class JobQueue:
+    """Bounded queue of jobs executed in a lazily started process pool.
+
+    ``timeout_s`` bounds how long a job may take before it is reported as
+    ``timeout``. A job already running in a worker cannot be interrupted;
+    its result is discarded and the pipeline's own budgets bound its cost.
+    It keeps counting towards ``max_pending`` until the worker is free.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_pending: int = 32,
+        timeout_s: float = 120.0,
+        max_finished: int = 256,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout_s = timeout_s
+        self.max_finished = max_finished
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pool: Optional["ProcessPoolExecutor"] = None
+        # Submitted futures not yet finished, whether or not anyone still awaits them.
+        self._in_flight: Set[Future] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def _executor(self) -> "ProcessPoolExecutor":
+        if self._pool is None:
+            # Imported here so workers that never queue a job skip multiprocessing.
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn keeps workers independent of the server's threads.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def _start(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Submit to the pool, subject to ``max_pending``."""
+
+        if self.pending >= self.max_pending:
+            raise QueueFull(f"job queue is full ({self.max_pending} pending)")
+        pool = self._executor()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenExecutor as exc:
+            self._reset(pool)
+            raise WorkerLost(f"worker pool failed: {exc}") from None
+        with self._lock:
+            self._in_flight.add(future)
+        future.add_done_callback(partial(self._settled, pool))
+        return future
+
+    def _settled(self, pool: "ProcessPoolExecutor", future: Future) -> None:
+        with self._lock:
+            self._in_flight.discard(future)
+        if not future.cancelled() and isinstance(future.exception(), BrokenExecutor):
+            self._reset(pool)
+
+    def _reset(self, pool: "ProcessPoolExecutor") -> None:
+        """Drop a broken pool so the next submission starts a fresh one."""
+
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def completed(self, result: Any) -> Job:
+        """Register an already finished job, e.g. for a cache hit."""
+
+        job = Job(id=uuid.uuid4().hex, status=DONE, result=result, finished=time.time())
+        self._remember(job)
+        return job
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        on_success: Optional[Callable[[Any], Any]] = None,
+    ) -> Job:
+        """Queue ``fn(*args)`` for a worker process; must be called on the event loop."""
+
+        job = Job(id=uuid.uuid4().hex)
+        job.future = self._start(fn, *args)
+        job.task = asyncio.get_running_loop().create_task(self._track(job, on_success))
+        self._remember(job)
+        return job
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` in the pool and await it without tracking a job.
+
+        Used for pool-routed exports and batch items; subject to both
+        ``timeout_s`` and the pending-job bound.
+        """
+
+        future = self._start(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout_s)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"export exceeded {self.timeout_s:g}s") from None
+        except BrokenExecutor as exc:
+            raise WorkerLost(f"worker process died: {exc}") from None
+        finally:
+            future.cancel()  # no-op once finished or running
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+
+        job.future.cancel()
+        if job.task is not None:
+            job.task.cancel()
+        self._finish(job, CANCELLED, error="cancelled by client")
+        return job
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _track(self, job: Job, on_success: Optional[Callable[[Any], Any]]) -> None:
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(job.future), self.timeout_s)
+        except asyncio.TimeoutError:
+            self._finish(job, TIMEOUT, error=f"job exceeded {self.timeout_s:g}s")
+            return
+        except asyncio.CancelledError:
+            self._finish(job, CANCELLED, error="cancelled by client")
+            return
+        except BrokenExecutor as exc:
+            self._finish(job, FAILED, error=f"worker process died: {exc}")
+            return
+        except Exception as exc:
+            self._finish(job, FAILED, error=str(exc))
+            return
+
+        if on_success is not None:
+            on_success(result)
+        job.result = result
+        self._finish(job, DONE)
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        if job.status in FINISHED:
+            return
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+
+    def _remember(self, job: Job) -> None:
+        self.jobs[job.id] = job
+        finished = [key for key, item in self.jobs.items() if item.status in FINISHED]
+        for key in finished[: max(0, len(finished) - self.max_finished)]:
+            del self.jobs[key]
@@ -0,0 +1,132 @@
+"""Per-stage export timings and a small Prometheus-style metrics registry.
+
+A :class:`StageTimings` is threaded through one export and collects the
+wall time of each pipeline stage plus counters (points, stitches, bytes).
+It renders as a ``Server-Timing`` header and is folded into the
+process-wide :class:`MetricsRegistry`, which ``/metrics`` exposes in the
+Prometheus text format.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, List, Mapping, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageTimings:
+    """Stage durations (seconds, in execution order) and counters for one export."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value, durations in milliseconds."""
+
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items())
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {
+            "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+
+def timed(timings: Optional[StageTimings], name: str) -> ContextManager[None]:
+    """``timings.stage(name)``, or a no-op when no timings are being collected."""
+
+    return nullcontext() if timings is None else timings.stage(name)
+
+
+def count(timings: Optional[StageTimings], name: str, value: int = 1) -> None:
+    if timings is not None:
+        timings.count(name, value)
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+def _labels(**labels: str) -> str:
+    inner = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe stage histograms, request outcomes and pipeline counters."""
+
+    def __init__(self, namespace: str = "embroidery", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self._stages: Dict[str, _Histogram] = {}
+        self._requests: Dict[Tuple[str, str], int] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, timings: StageTimings) -> None:
+        with self._lock:
+            for name, seconds in timings.stages.items():
+                histogram = self._stages.get(name)
+                if histogram is None:
+                    histogram = self._stages[name] = _Histogram(self.buckets)
+                histogram.observe(seconds)
+            for name, value in timings.counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    def count_request(self, route: str, outcome: str) -> None:
+        with self._lock:
+            self._requests[(route, outcome)] = self._requests.get((route, outcome), 0) + 1
+
+    def render(self, gauges: Optional[Mapping[str, float]] = None) -> str:
+        """Prometheus text exposition; ``gauges`` adds point-in-time values."""
+
+        ns = self.namespace
+        lines: List[str] = []
+        with self._lock:
+            lines += [
+                f"# HELP {ns}_stage_duration_seconds Wall time per export pipeline stage.",
+                f"# TYPE {ns}_stage_duration_seconds histogram",
+            ]
+            for stage, histogram in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, hits in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                    cumulative += hits
+                    le = bound if isinstance(bound, str) else repr(float(bound))
+                    lines.append(f"{ns}_stage_duration_seconds_bucket{_labels(stage=stage, le=le)} {cumulative}")
+                lines.append(f"{ns}_stage_duration_seconds_sum{_labels(stage=stage)} {histogram.sum!r}")
+                lines.append(f"{ns}_stage_duration_seconds_count{_labels(stage=stage)} {cumulative}")
+
+            lines += [
+                f"# HELP {ns}_requests_total Requests by route and outcome.",
+                f"# TYPE {ns}_requests_total counter",
+            ]
+            for (route, outcome), total in sorted(self._requests.items()):
+                lines.append(f"{ns}_requests_total{_labels(route=route, outcome=outcome)} {total}")
+
+            for name, total in sorted(self._counters.items()):
+                lines += [f"# TYPE {ns}_{name}_total counter", f"{ns}_{name}_total {total}"]
+
+        for name, value in sorted((gauges or {}).items()):
+            lines += [f"# TYPE {ns}_{name} gauge", f"{ns}_{name} {value}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,248 @@
+"""Travel-path optimization for multi-block designs.
+
+The order in which a script draws its pen-down runs decides how far the
+machine jumps between them (and how often it trims). :func:`optimize_blocks`
+reorders, and optionally reverses, the blocks to shorten that travel: a
+greedy nearest-neighbour tour over a grid index of block endpoints, then
+2-opt passes until no improvement is left or the time budget runs out.
+"""
+
+import math
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from embroidery_points import PointBuffer, point_array
+
+Point = Tuple[float, float]
+
+
+@dataclass
+class TravelReport:
+    before: float
+    after: float
+    blocks: int
+    reversed: int = 0
+    timed_out: bool = False
+
+    def as_dict(self, scale: float = 1.0) -> Dict[str, object]:
+        return {
+            "before_mm": self.before * scale,
+            "after_mm": self.after * scale,
+            "blocks": self.blocks,
+            "reversed": self.reversed,
+            "timed_out": self.timed_out,
+        }
+
+
+def travel_distance(points: Sequence[Point], breaks: Sequence[int]) -> float:
+    """Total straight-line travel between consecutive pen-down blocks."""
+
+    if not len(breaks):
+        return 0.0
+    pts = point_array(points)
+    index = np.asarray(breaks, dtype=np.intp)
+    delta = pts[index] - pts[index - 1]
+    return float(np.hypot(delta[:, 0], delta[:, 1]).sum())
+
+
+class _EndpointGrid:
+    """Uniform grid over block endpoints for nearest-unvisited queries.
+
+    Removed endpoints leave their cell, and emptied cells are dropped, so
+    queries late in a tour never walk empty space: once a ring search
+    would visit more cells than remain, the remaining endpoints are
+    scanned directly.
+    """
+
+    def __init__(self, coords: np.ndarray):
+        self.coords = coords
+        mins = coords.min(axis=0)
+        extent = float((coords.max(axis=0) - mins).max()) or 1.0
+        self.origin = mins
+        self.cell = extent / max(1.0, math.sqrt(len(coords)))
+        self.span = int(extent / self.cell) + 1
+        # Cell (gx, gy) of the grid is key gx * (span + 1) + gy.
+        cells = self._cell_of(coords)
+        self.keys = cells[:, 0] * (self.span + 1) + cells[:, 1]
+        by_cell = np.argsort(self.keys, kind="stable")
+        keys, first = np.unique(self.keys[by_cell], return_index=True)
+        members = by_cell.tolist()
+        bounds = [*first.tolist(), len(members)]
+        self.cells: Dict[int, List[int]] = {
+            key: members[a:b] for key, a, b in zip(keys.tolist(), bounds, bounds[1:])
+        }
+
+    def _cell_of(self, xy: np.ndarray) -> np.ndarray:
+        return np.floor((xy - self.origin) / self.cell).astype(np.int64)
+
+    def remove(self, index: int) -> None:
+        key = int(self.keys[index])
+        members = self.cells[key]
+        members.remove(index)
+        if not members:
+            del self.cells[key]
+
+    def _scan(self, x: float, y: float) -> int:
+        live = np.fromiter((i for members in self.cells.values() for i in members), dtype=np.intp)
+        dists = np.hypot(*(self.coords[live] - (x, y)).T)
+        return int(live[np.argmin(dists)])
+
+    def nearest(self, x: float, y: float) -> int:
+        """Index of the closest live endpoint, searching outward ring by ring."""
+
+        cx, cy = self._cell_of(np.array([x, y])).tolist()
+        best, best_d = -1, math.inf
+        for ring in range(self.span + 1):
+            # Anything in this ring is at least (ring - 1) cells away.
+            if best >= 0 and (ring - 1) * self.cell > best_d:
+                break
+            if (2 * ring + 1) ** 2 > len(self.cells):
+                return self._scan(x, y)
+            for gx in range(max(0, cx - ring), min(self.span, cx + ring) + 1):
+                for gy in (cy - ring, cy + ring) if abs(gx - cx) != ring else range(cy - ring, cy + ring + 1):
+                    if not 0 <= gy <= self.span:
+                        continue
+                    for i in self.cells.get(gx * (self.span + 1) + gy, ()):
+                        px, py = self.coords[i]
+                        d = math.hypot(px - x, py - y)
+                        if d < best_d:
+                            best, best_d = i, d
+        if best < 0:  # query far outside the grid
+            best = self._scan(x, y)
+        return best
+
+
+def _nearest_neighbour(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    allow_reverse: bool,
+    deadline: float = math.inf,
+) -> Tuple[List[int], List[bool], bool]:
+    """Greedy tour from block 0; returns ``(order, flipped, finished)``.
+
+    When the deadline passes, the blocks not yet visited follow in their
+    original order and direction.
+    """
+
+    n = len(starts)
+    # Endpoint i < n is block i entered at its start; i >= n enters at its end.
+    coords = np.concatenate([starts, ends]) if allow_reverse else starts
+    grid = _EndpointGrid(coords)
+
+    order, flipped = [0], [False]
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    grid.remove(0)
+    if allow_reverse:
+        grid.remove(n)
+    x, y = ends[0]
+    for step in range(n - 1):
+        if step % 64 == 0 and time.perf_counter() > deadline:
+            rest = np.flatnonzero(~visited).tolist()
+            return order + rest, flipped + [False] * len(rest), False
+        hit = grid.nearest(x, y)
+        block, flip = hit % n, hit >= n
+        grid.remove(block)
+        if allow_reverse:
+            grid.remove(block + n)
+        visited[block] = True
+        order.append(block)
+        flipped.append(flip)
+        x, y = starts[block] if flip else ends[block]
+    return order, flipped, True
+
+
+def _two_opt(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    order: List[int],
+    flipped: List[bool],
+    deadline: float,
+) -> bool:
+    """Improve the tour in place; returns False if the deadline cut it short."""
+
+    n = len(order)
+    order_arr = np.asarray(order)
+    flip_arr = np.asarray(flipped)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            if time.perf_counter() > deadline:
+                order[:], flipped[:] = order_arr.tolist(), flip_arr.tolist()
+                return False
+            entry = np.where(flip_arr[:, None], ends[order_arr], starts[order_arr])
+            exit_ = np.where(flip_arr[:, None], starts[order_arr], ends[order_arr])
+
+            # Reverse blocks i..j: edges (i-1 -> i) and (j -> j+1) change,
+            # and every reversed block is traversed the other way round.
+            j = np.arange(i, n)
+            prev_exit = exit_[i - 1]
+            old = np.hypot(*(entry[i] - prev_exit)) + np.zeros(len(j))
+            new = np.hypot(*(exit_[j] - prev_exit).T)
+            has_next = j + 1 < n
+            nxt = np.minimum(j + 1, n - 1)
+            old += np.where(has_next, np.hypot(*(entry[nxt] - exit_[j]).T), 0.0)
+            new += np.where(has_next, np.hypot(*(entry[nxt] - entry[i]).T), 0.0)
+
+            gain = old - new
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-9:
+                k = i + best
+                order_arr[i : k + 1] = order_arr[i : k + 1][::-1]
+                flip_arr[i : k + 1] = ~flip_arr[i : k + 1][::-1]
+                improved = True
+
+    order[:], flipped[:] = order_arr.tolist(), flip_arr.tolist()
+    return True
+
+
+def optimize_blocks(
+    points: Sequence[Point],
+    breaks: Sequence[int],
+    allow_reverse: bool = True,
+    time_budget_s: float = 0.5,
+) -> Tuple[PointBuffer, List[int], TravelReport]:
+    """Reorder pen-down blocks to shorten travel between them.
+
+    Returns the new ``(points, breaks)`` plus a :class:`TravelReport` in
+    the same units as ``points``. The first block stays first and keeps
+    its direction. 2-opt needs reversible blocks, so with
+    ``allow_reverse=False`` only the greedy pass runs.
+    """
+
+    pts = point_array(points)
+    before = travel_distance(pts, breaks)
+    bounds = np.array([0, *breaks, len(pts)], dtype=np.intp)
+    if len(bounds) < 4:
+        return PointBuffer.coerce(points), list(breaks), TravelReport(before, before, len(bounds) - 1)
+
+    deadline = time.perf_counter() + time_budget_s
+    starts = pts[bounds[:-1]]
+    ends = pts[bounds[1:] - 1]
+
+    order, flipped, finished = _nearest_neighbour(starts, ends, allow_reverse, deadline)
+    if allow_reverse and finished:
+        finished = _two_opt(starts, ends, order, flipped, deadline)
+
+    # Gather every block (reversed where flipped) with a single index array.
+    order_arr = np.asarray(order, dtype=np.intp)
+    flip_arr = np.asarray(flipped, dtype=bool)
+    lengths = np.diff(bounds)[order_arr]
+    offsets = np.cumsum(lengths) - lengths
+    first = np.where(flip_arr, bounds[order_arr + 1] - 1, bounds[order_arr])
+    steps = np.where(flip_arr, -1, 1)
+    position = np.arange(len(pts)) - np.repeat(offsets, lengths)
+    new_points = pts[np.repeat(first, lengths) + np.repeat(steps, lengths) * position]
+    new_breaks = offsets[1:].tolist()
+
+    after = travel_distance(new_points, new_breaks)
+    blocks = len(bounds) - 1
+    if after > before:  # greedy tours can lose on already tidy designs
+        return PointBuffer.coerce(points), list(breaks), TravelReport(before, before, blocks, timed_out=not finished)
+
+    report = TravelReport(before, after, blocks, reversed=sum(flipped), timed_out=not finished)
+    return PointBuffer.from_array(new_points), new_breaks, report
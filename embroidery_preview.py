@@ -0,0 +1,76 @@
+"""Cheap raster previews of a stitch path.
+
+pyembroidery's ``write_png`` draws every stitch at full design size, which
+is far more than a gallery thumbnail needs. :func:`render_preview` instead
+rasterizes the polyline straight into a small NumPy canvas.
+"""
+
+import io
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from embroidery_utils import densify_array
+
+MAX_PREVIEW_SIZE = 2048
+
+
+def rasterize_polyline(
+    points: Sequence[Tuple[float, float]],
+    size: int = 256,
+    padding: int = 4,
+    line_width: int = 1,
+    breaks: Sequence[int] = (),
+) -> np.ndarray:
+    """Return a ``size`` x ``size`` boolean mask of the path (Y up, fit to box).
+
+    Travel into each ``breaks`` index (a new pen-down block) is not drawn.
+    """
+
+    if not 8 <= size <= MAX_PREVIEW_SIZE:
+        raise ValueError(f"size must be between 8 and {MAX_PREVIEW_SIZE}")
+
+    mask = np.zeros((size, size), dtype=bool)
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(pts):
+        return mask
+
+    mins = pts.min(axis=0)
+    extent = pts.max(axis=0) - mins
+    scale = (size - 1 - 2 * padding) / (float(extent.max()) or 1.0)
+    pixels = (pts - mins) * scale + (size - 1 - extent * scale) / 2.0  # centered
+    pixels[:, 1] = size - 1 - pixels[:, 1]  # image rows grow downwards
+
+    # Half-pixel steps leave no gaps between consecutive samples.
+    samples = np.rint(densify_array(pixels, 0.5, breaks=breaks)).astype(np.intp)
+    np.clip(samples, 0, size - 1, out=samples)
+    mask[samples[:, 1], samples[:, 0]] = True
+
+    for _ in range(max(0, line_width - 1)):
+        grown = mask.copy()
+        grown[1:, :] |= mask[:-1, :]
+        grown[:-1, :] |= mask[1:, :]
+        grown[:, 1:] |= mask[:, :-1]
+        grown[:, :-1] |= mask[:, 1:]
+        mask = grown
+    return mask
+
+
+def render_preview(
+    points: Sequence[Tuple[float, float]],
+    size: int = 256,
+    line_width: int = 1,
+    color: Tuple[int, int, int] = (34, 197, 94),
+    breaks: Sequence[int] = (),
+) -> bytes:
+    """Render the path as a PNG thumbnail on a transparent background."""
+
+    from PIL import Image
+
+    mask = rasterize_polyline(points, size=size, line_width=line_width, breaks=breaks)
+    rgba = np.zeros((size, size, 4), dtype=np.uint8)
+    rgba[mask] = (*color, 255)
+
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, "RGBA").save(buffer, format="PNG")
+    return buffer.getvalue()
@@ -0,0 +1,187 @@
+"""Incremental re-export for live editing sessions.
+
+An :class:`EditSession` keeps the parsed program of a script split into
+top-level statements, a turtle checkpoint after each statement and the
+densified stitch path. When the script changes, only statements from the
+first edited one onwards are parsed and re-run, and only the segments from
+the first changed point onwards are densified again, so the cost of an
+update follows the size of the edit rather than the size of the design.
+
+The path is densified in turtle coordinates, so an edit that grows the
+bounding box does not invalidate it; a session export shifts it by the
+design's center once. That matches a fresh export, which densifies the
+centered points, except that a segment within rounding of a whole number
+of stitch lengths can get one stitch more or fewer.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api_backend import (
+    DEFAULT_POINT_BUDGET,
+    VirtualEmbroidery,
+    script_to_commands,
+    split_statements,
+)
+from embroidery_fill import FillSettings
+from embroidery_points import PointBuffer
+from embroidery_utils import bbox_center, densify_indexed
+
+
+@dataclass
+class SessionUpdate:
+    changed_from: int  # first re-run top-level statement
+    statements: int
+    points_from: int  # points before this index were reused unchanged
+    stitch_points: int  # densified points, before JUMP/TRIM/END are added
+
+
+class EditSession:
+    """Parsed statements, turtle checkpoints and stitch path for one script."""
+
+    def __init__(
+        self,
+        scale_mm: float,
+        max_stitch_mm: float,
+        max_points: Optional[int] = DEFAULT_POINT_BUDGET,
+    ):
+        self.id = uuid.uuid4().hex
+        self.scale_mm = scale_mm
+        self.max_stitch_mm = max_stitch_mm
+        self.turtle = VirtualEmbroidery(max_points=max_points, fill=FillSettings.from_mm(scale_mm, max_stitch_mm))
+        self.sources: List[str] = []
+        self.statements: List[List[Dict]] = []
+        # checkpoints[i] is the turtle state before statement i.
+        self.checkpoints = [self.turtle.snapshot()]
+        # Densified path in turtle units, plus where each point landed in it.
+        self.dense = PointBuffer()
+        self.landed = np.empty(0, dtype=np.int64)
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def points(self) -> PointBuffer:
+        return self.turtle.points
+
+    @property
+    def breaks(self) -> List[int]:
+        return self.turtle.breaks
+
+    @property
+    def program(self) -> List[Dict]:
+        return [node for nodes in self.statements for node in nodes]
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        """Bounding-box center of the points, the offset an export removes."""
+
+        return bbox_center(self.points.array)
+
+    @property
+    def densified(self) -> Tuple[np.ndarray, np.ndarray]:
+        """``(dense, landed)`` for :func:`embroidery_utils.points_to_stitch_array`."""
+
+        return self.dense.array, self.landed
+
+    def update(self, script: str) -> SessionUpdate:
+        """Bring the session up to date with ``script``, re-running only what changed.
+
+        Raises ValueError for a script that does not parse or exceeds the
+        budget; the session then keeps its last good prefix.
+        """
+
+        self.last_used = time.monotonic()
+        sources = split_statements(script)
+        first = 0
+        for old, new in zip(self.sources, sources):
+            if old != new:
+                break
+            first += 1
+        if first == len(self.sources) == len(sources):
+            return SessionUpdate(first, len(sources), len(self.points), len(self.dense))
+
+        # Parse before touching any state so a syntax error leaves it intact.
+        parsed = [script_to_commands(source) for source in sources[first:]]
+
+        self.turtle.restore(self.checkpoints[first])
+        del self.checkpoints[first + 1 :]
+        del self.sources[first:]
+        del self.statements[first:]
+        reused = len(self.points)
+        try:
+            for source, nodes in zip(sources[first:], parsed):
+                for _ in self.turtle.run(nodes):
+                    pass
+                self.sources.append(source)
+                self.statements.append(nodes)
+                self.checkpoints.append(self.turtle.snapshot())
+        except ValueError:
+            self.turtle.restore(self.checkpoints[-1])
+            self._densify_from(reused)
+            raise
+        self._densify_from(reused)
+        return SessionUpdate(first, len(sources), reused, len(self.dense))
+
+    def _densify_from(self, reused: int) -> None:
+        """Re-densify only the segments after the last reused point."""
+
+        points = self.points.array
+        max_step_units = self.max_stitch_mm / self.scale_mm
+        # Keep the reused prefix up to (and including) the last reused point.
+        start = max(0, reused - 1)
+        keep = int(self.landed[start]) if reused else 0
+        self.dense.truncate(keep)
+        self.landed = self.landed[:start]
+
+        tail = points[start:]
+        if not len(tail):
+            return
+        breaks = [b - start for b in self.breaks if b > start]
+        dense, landed = densify_indexed(tail, max_step_units, breaks)
+        self.dense.extend(dense)
+        self.landed = np.concatenate((self.landed, landed + keep))
+
+
+class SessionStore:
+    """Bounded, expiring map of live :class:`EditSession` objects."""
+
+    def __init__(self, max_sessions: int = 64, ttl_s: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self._sessions: "OrderedDict[str, EditSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, scale_mm: float, max_stitch_mm: float) -> EditSession:
+        session = EditSession(scale_mm, max_stitch_mm)
+        with self._lock:
+            self._expire()
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[EditSession]:
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_s
+        for session_id in [key for key, s in self._sessions.items() if s.last_used < cutoff]:
+            del self._sessions[session_id]
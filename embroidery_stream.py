@@ -0,0 +1,69 @@
+"""Progressive stitch generation for streaming previews.
+
+:class:`StitchStream` runs a program and densifies the recorded points
+chunk by chunk as the interpreter produces them, so the first stitches are
+available after a few thousand points no matter how large the design is.
+The finished ``turtle`` (points and breaks) then feeds the normal export.
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from api_backend import DEFAULT_POINT_BUDGET, VirtualEmbroidery
+from embroidery_fill import FillSettings
+from embroidery_utils import densify_indexed
+
+STREAM_CHUNK_POINTS = 2048
+
+
+@dataclass
+class StitchChunk:
+    start: int  # index of the first stitch in the whole densified path
+    points: np.ndarray  # (k, 2) densified stitches in turtle units
+    jumps: List[int]  # absolute stitch indices that start a new block (reached by a jump)
+
+
+class StitchStream:
+    """Iterate densified stitch chunks while interpreting ``program``."""
+
+    def __init__(
+        self,
+        program: List[Dict],
+        scale_mm: float,
+        max_stitch_mm: float,
+        chunk_points: int = STREAM_CHUNK_POINTS,
+        max_points: Optional[int] = DEFAULT_POINT_BUDGET,
+    ):
+        self.program = program
+        self.max_step_units = max_stitch_mm / scale_mm
+        self.chunk_points = chunk_points
+        self.turtle = VirtualEmbroidery(max_points=max_points, fill=FillSettings.from_mm(scale_mm, max_stitch_mm))
+        self.stitches = 0
+
+    def __iter__(self) -> Iterator[StitchChunk]:
+        done = 0  # points already densified
+        previous: Optional[np.ndarray] = None
+        for produced in self.turtle.run(self.program, chunk_points=self.chunk_points):
+            for offset in range(0, len(produced), self.chunk_points):
+                points = produced[offset : offset + self.chunk_points]
+                yield self._densify(points, done, previous)
+                done += len(points)
+                previous = points[-1:]
+
+    def _densify(self, points: np.ndarray, first: int, previous: Optional[np.ndarray]) -> StitchChunk:
+        # Prepend the last point already sent so the joining segment is densified too.
+        lead = 0 if previous is None else 1
+        path = points if previous is None else np.concatenate((previous, points))
+        breaks = self.turtle.breaks
+        lo, hi = bisect_left(breaks, first), bisect_left(breaks, first + len(points))
+        local_breaks = [b - first + lead for b in breaks[lo:hi]]
+
+        dense, landed = densify_indexed(path, self.max_step_units, local_breaks)
+        dense = dense[lead:]
+        start = self.stitches
+        jumps = [start + int(landed[b]) - lead for b in local_breaks]
+        self.stitches += len(dense)
+        return StitchChunk(start, dense, jumps)
@@ -0,0 +1,176 @@
+"""Thread colours: parsing, colour-change counting and colour grouping.
+
+A design's colours travel through the pipeline as one entry per pen-down
+block (``len(breaks) + 1``), ``None`` meaning the default thread; an empty
+list is a single-colour design. Every change of thread between
+consecutive blocks is a colour change on the machine, which costs the
+operator a stop. :func:`group_blocks_by_color` reorders blocks so each
+thread is sewn in one go.
+"""
+
+import re
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embroidery_optimize import Point, TravelReport, optimize_blocks, travel_distance
+from embroidery_points import PointBuffer, point_array
+
+DEFAULT_THREAD = "#000000"
+
+# Names accepted by color(); anything else must be #rgb / #rrggbb or numbers.
+THREAD_COLORS = {
+    "black": "#000000",
+    "white": "#ffffff",
+    "red": "#ff0000",
+    "green": "#008000",
+    "lime": "#00ff00",
+    "blue": "#0000ff",
+    "navy": "#000080",
+    "yellow": "#ffff00",
+    "gold": "#ffd700",
+    "orange": "#ffa500",
+    "purple": "#800080",
+    "violet": "#ee82ee",
+    "magenta": "#ff00ff",
+    "pink": "#ffc0cb",
+    "cyan": "#00ffff",
+    "teal": "#008080",
+    "brown": "#a52a2a",
+    "gray": "#808080",
+    "grey": "#808080",
+    "silver": "#c0c0c0",
+}
+
+_HEX_RE = re.compile(r"^#?([0-9a-f]{3}|[0-9a-f]{6})$")
+
+
+def parse_color(value) -> str:
+    """Normalize a thread colour to ``#rrggbb``.
+
+    Accepts a name from :data:`THREAD_COLORS`, ``#rgb``/``#rrggbb`` hex, or
+    three numbers: all within 0-1 as in turtle's default colormode,
+    0-255 otherwise.
+    """
+
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in THREAD_COLORS:
+            return THREAD_COLORS[text]
+        match = _HEX_RE.match(text)
+        if not match:
+            raise ValueError(f"unknown colour: {value!r}")
+        digits = match.group(1)
+        if len(digits) == 3:
+            digits = "".join(d * 2 for d in digits)
+        return f"#{digits}"
+
+    try:
+        channels = [float(c) for c in value]
+    except (TypeError, ValueError):
+        raise ValueError(f"unknown colour: {value!r}") from None
+    if len(channels) != 3:
+        raise ValueError("colour needs three channels")
+    if all(0.0 <= c <= 1.0 for c in channels):
+        channels = [c * 255.0 for c in channels]
+    if not all(0.0 <= c <= 255.0 for c in channels):
+        raise ValueError("colour channels must be in 0-1 or 0-255")
+    return "#" + "".join(f"{round(c):02x}" for c in channels)
+
+
+def count_color_changes(colors: Sequence[Optional[str]]) -> int:
+    """Thread changes when blocks are sewn in this order."""
+
+    threads = [color or DEFAULT_THREAD for color in colors]
+    return sum(a != b for a, b in zip(threads, threads[1:]))
+
+
+def thread_order(colors: Sequence[Optional[str]]) -> List[str]:
+    """Threads in the order they are loaded, one entry per colour change plus one."""
+
+    threads: List[str] = []
+    for color in colors:
+        color = color or DEFAULT_THREAD
+        if not threads or threads[-1] != color:
+            threads.append(color)
+    return threads
+
+
+def _gather(pts: np.ndarray, bounds: np.ndarray, order: Sequence[int]) -> Tuple[np.ndarray, List[int]]:
+    parts = [np.arange(bounds[block], bounds[block + 1]) for block in order]
+    new_breaks = np.cumsum([len(part) for part in parts[:-1]]).tolist()
+    return pts[np.concatenate(parts)], new_breaks
+
+
+def group_blocks_by_color(
+    points: Sequence[Point],
+    breaks: Sequence[int],
+    colors: Sequence[Optional[str]],
+) -> Tuple[PointBuffer, List[int], List[Optional[str]]]:
+    """Reorder blocks so all blocks of a thread are sewn together.
+
+    Threads keep the order of their first use and blocks keep their order
+    within a thread, so the result has one colour change per thread after
+    the first. Blocks of later threads still sew on top of earlier ones,
+    but a block may now be sewn before a block of another colour that the
+    script drew first.
+    """
+
+    pts = point_array(points)
+    threads = thread_order(colors)
+    if len(threads) == len(set(threads)):
+        return PointBuffer.coerce(points), list(breaks), list(colors)
+
+    rank = {color: index for index, color in enumerate(dict.fromkeys(threads))}
+    order = sorted(range(len(colors)), key=lambda block: rank[colors[block] or DEFAULT_THREAD])
+    bounds = np.array([0, *breaks, len(pts)], dtype=np.intp)
+    new_points, new_breaks = _gather(pts, bounds, order)
+    return PointBuffer.from_array(new_points), new_breaks, [colors[block] for block in order]
+
+
+def optimize_color_runs(
+    points: Sequence[Point],
+    breaks: Sequence[int],
+    colors: Sequence[Optional[str]],
+    allow_reverse: bool = True,
+    time_budget_s: float = 0.5,
+) -> Tuple[PointBuffer, List[int], TravelReport]:
+    """:func:`optimize_blocks` within each run of same-thread blocks.
+
+    Blocks never move across a colour change, so the thread sequence (and
+    the colour-change count) is unchanged. The time budget is shared
+    between runs in proportion to their block counts.
+    """
+
+    pts = point_array(points)
+    before = travel_distance(pts, breaks)
+    bounds = [0, *breaks, len(pts)]
+    blocks = len(bounds) - 1
+
+    pieces: List[np.ndarray] = []
+    new_breaks: List[int] = []
+    reversed_blocks = 0
+    timed_out = False
+    first = offset = 0
+    while first < blocks:
+        last = first
+        while last + 1 < blocks and (colors[last + 1] or DEFAULT_THREAD) == (colors[first] or DEFAULT_THREAD):
+            last += 1
+        start, end = bounds[first], bounds[last + 1]
+        run_breaks = [b - start for b in bounds[first + 1 : last + 1]]
+        run_points, run_breaks, report = optimize_blocks(
+            pts[start:end], run_breaks, allow_reverse, time_budget_s * (last - first + 1) / blocks
+        )
+        if pieces:
+            new_breaks.append(offset)
+        new_breaks.extend(offset + b for b in run_breaks)
+        pieces.append(run_points.array)
+        offset += len(run_points)
+        reversed_blocks += report.reversed
+        timed_out = timed_out or report.timed_out
+        first = last + 1
+
+    new_points = np.concatenate(pieces) if pieces else pts
+    after = travel_distance(new_points, new_breaks)
+    report = TravelReport(before, after, blocks, reversed=reversed_blocks, timed_out=timed_out)
+    return PointBuffer.from_array(new_points), new_breaks, report
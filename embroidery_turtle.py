@@ -1,53 +1,261 @@
 # embroidery_turtle.py
 
+"""Desktop turtles that record stitch points while a design is drawn.
+
+:class:`EmbroideryTurtle` animates on a Tk canvas as it goes.
+:class:`RecordingTurtle` has the same drawing API but never touches the
+screen: it tracks position and heading itself, like ``VirtualEmbroidery``,
+so large designs record in milliseconds and run on headless machines.
+:meth:`RecordingTurtle.replay` draws the recorded path afterwards.
+``turtle``/Tk is only imported once a screen is actually used.
+"""
+
+import math
 import os
-import turtle
+from typing import List, Optional, Tuple
 
 from pyembroidery import END, EmbPattern, write_pes, write_png
 
+from embroidery_points import PointBuffer
 from embroidery_utils import finish_pattern, remove_trailing_jumps
 from test_class_pyembr import PyEmbroideryBuilder
 
 
-class EmbroideryTurtle(turtle.Turtle):
-    """
-    A Turtle that records stitch points only when the pen is DOWN.
-    Coordinates are in 'turtle units'. A scale factor will convert
-    them to millimetres during export.
+def _circle(t, radius: float, extent: Optional[float] = None, steps: Optional[int] = None) -> None:
+    """turtle's circle as a polygon of recorded ``forward`` chords."""
+
+    if extent is None:
+        extent = 360.0
+    if steps is None:
+        steps = 1 + int(min(11 + abs(radius) / 6.0, 59.0) * abs(extent) / 360.0)
+    w = extent / steps
+    w2 = 0.5 * w
+    length = 2.0 * radius * math.sin(math.radians(w / 2.0))
+    if radius < 0:
+        length, w, w2 = -length, -w, -w2
+    t.left(w2)
+    for _ in range(steps):
+        t.forward(length)
+        t.left(w)
+    t.left(-w2)
+
+
+class RecordingTurtle:
+    """A screen-less turtle with :class:`EmbroideryTurtle`'s API and recording rules.
+
+    Points are recorded only while the pen is down (after ``pendown()``);
+    each pen-down run after travel starts a new block in ``breaks``.
     """
 
     def __init__(self):
-        super().__init__()
+        self.x = 0.0
+        self.y = 0.0
+        self._heading = 0.0  # degrees, 0 = east, counterclockwise
         self.record = False
-        self.stitch_points = []
+        self.stitch_points = PointBuffer()
+        self.breaks: List[int] = []  # indices where a pen-down run starts after travel
 
     def _record_point(self):
         if self.record:
-            x, y = self.position()
-            self.stitch_points.append((x, y))
+            self.stitch_points.append(self.x, self.y)
+
+    def position(self) -> Tuple[float, float]:
+        return (self.x, self.y)
+
+    pos = position
+
+    def xcor(self) -> float:
+        return self.x
+
+    def ycor(self) -> float:
+        return self.y
+
+    def heading(self) -> float:
+        return self._heading % 360.0
+
+    def isdown(self) -> bool:
+        return self.record
 
     def pendown(self):
-        super().pendown()
+        if not self.record and self.stitch_points:
+            self.breaks.append(len(self.stitch_points))
         self.record = True
         self._record_point()
 
+    pd = down = pendown
+
     def penup(self):
-        super().penup()
         self.record = False
 
+    pu = up = penup
+
     def goto(self, x, y=None):
         if y is None:
             x, y = x
-        super().goto(x, y)
+        self.x = float(x)
+        self.y = float(y)
         self._record_point()
 
+    setpos = setposition = goto
+
+    def setx(self, x):
+        self.goto(x, self.y)
+
+    def sety(self, y):
+        self.goto(self.x, y)
+
     def forward(self, distance):
-        super().forward(distance)
+        radians = math.radians(self._heading)
+        self.x += math.cos(radians) * distance
+        self.y += math.sin(radians) * distance
         self._record_point()
 
+    fd = forward
+
     def backward(self, distance):
-        super().backward(distance)
-        self._record_point()
+        self.forward(-distance)
+
+    bk = back = backward
+
+    def left(self, angle):
+        self._heading += angle
+
+    lt = left
+
+    def right(self, angle):
+        self._heading -= angle
+
+    rt = right
+
+    def setheading(self, angle):
+        self._heading = float(angle)
+
+    seth = setheading
+
+    def home(self):
+        self.goto(0.0, 0.0)
+        self.setheading(0.0)
+
+    circle = _circle
+
+    def _ignore(self, *args, **kwargs):
+        """Appearance-only call: nothing to draw, nothing to record."""
+
+    speed = hideturtle = ht = showturtle = st = pensize = width = _ignore
+    pencolor = fillcolor = color = shape = begin_fill = end_fill = _ignore
+
+    def replay(self, batch: int = 1000, screen_turtle=None):
+        """Draw the recorded stitch path on a turtle screen and return the drawing turtle.
+
+        Animation is turned off and the screen is refreshed every ``batch``
+        points, so even large designs draw in seconds. Only pen-down runs
+        are drawn, each starting with a pen-up move.
+        """
+
+        import turtle
+
+        pen = screen_turtle or turtle.Turtle(visible=False)
+        screen = pen.getscreen()
+        tracer = screen.tracer()
+        screen.tracer(0)
+        try:
+            points = self.stitch_points.tolist()
+            bounds = [0, *self.breaks, len(points)]
+            drawn = 0
+            for start, end in zip(bounds, bounds[1:]):
+                pen.penup()
+                for x, y in points[start:end]:
+                    pen.goto(x, y)
+                    pen.pendown()
+                    drawn += 1
+                    if drawn % batch == 0:
+                        screen.update()
+            screen.update()
+        finally:
+            screen.tracer(tracer)
+        return pen
+
+
+def _screen_turtle_class():
+    import turtle
+
+    class EmbroideryTurtle(turtle.Turtle):
+        """
+        A Turtle that records stitch points only when the pen is DOWN.
+        Coordinates are in 'turtle units'. A scale factor will convert
+        them to millimetres during export.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.record = False
+            self.stitch_points = PointBuffer()
+            self.breaks = []  # indices where a pen-down run starts after travel
+
+        def _record_point(self):
+            if self.record:
+                x, y = self.position()
+                self.stitch_points.append(x, y)
+
+        def pendown(self):
+            super().pendown()
+            if not self.record and self.stitch_points:
+                self.breaks.append(len(self.stitch_points))
+            self.record = True
+            self._record_point()
+
+        def penup(self):
+            super().penup()
+            self.record = False
+
+        def goto(self, x, y=None):
+            if y is None:
+                x, y = x
+            super().goto(x, y)
+            self._record_point()
+
+        def setx(self, x):
+            self.goto(x, self.ycor())
+
+        def sety(self, y):
+            self.goto(self.xcor(), y)
+
+        def forward(self, distance):
+            super().forward(distance)
+            self._record_point()
+
+        def backward(self, distance):
+            super().backward(distance)
+            self._record_point()
+
+        # turtle binds its aliases to the base methods; rebind them so they record too.
+        pd = down = pendown
+        pu = up = penup
+        setpos = setposition = goto
+        fd = forward
+        bk = back = backward
+        circle = _circle
+
+    EmbroideryTurtle.__module__ = __name__
+    EmbroideryTurtle.__qualname__ = "EmbroideryTurtle"
+    return EmbroideryTurtle
+
+
+def __getattr__(name: str):
+    # EmbroideryTurtle subclasses turtle.Turtle, so it is defined on first
+    # access: importing this module for RecordingTurtle never loads Tk.
+    if name == "EmbroideryTurtle":
+        cls = globals()[name] = _screen_turtle_class()
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def new_turtle(headless: bool = False):
+    """A :class:`RecordingTurtle` when ``headless``, else an :class:`EmbroideryTurtle`."""
+
+    if headless:
+        return RecordingTurtle()
+    return __getattr__("EmbroideryTurtle")()
 
 
 class TurtleEmbroidery:
@@ -106,17 +314,21 @@ def export_pattern(
 
 
 def export_to_embroidery(
-    t: EmbroideryTurtle,
+    t: "RecordingTurtle",
     scale_mm: float = 1.0,
     max_stitch_mm: float = 3.0,
     pes_filename: str = "design.pes",
     png_filename: str = "design.png",
     show_preview: bool = True,
 ):
-    """Convert turtle units → mm using ``scale_mm`` and export."""
+    """Convert turtle units → mm using ``scale_mm`` and export.
+
+    ``t`` is an :class:`EmbroideryTurtle` or a :class:`RecordingTurtle`.
+    """
 
     builder = PyEmbroideryBuilder(scale_mm=scale_mm, max_stitch_mm=max_stitch_mm)
     builder.points = t.stitch_points
+    builder.breaks = t.breaks
 
     try:
         pattern = builder.build_pattern()
@@ -137,43 +349,3 @@ def export_to_embroidery(
             Image.open(png_filename).show()
         except Exception:
             pass
-
-
-def export_to_embroidery(
-    t: EmbroideryTurtle,
-    scale_mm: float = 1.0,
-    max_stitch_mm: float = 3.0,
-    pes_filename: str = "design.pes",
-    png_filename: str = "design.png",
-    show_preview: bool = True,
-):
-    """Convert turtle units → mm using ``scale_mm`` and export."""
-
-    points = t.stitch_points
-
-    if len(points) < 2:
-        print("Not enough points to make stitches.")
-        return
-
-    centered_points = center_points(points)
-
-    max_step_units = max_stitch_mm / scale_mm
-    dense_points = densify_points(centered_points, max_step_units=max_step_units)
-
-    stitch_list: list[Tuple[int, int]] = []
-    for x, y in dense_points:
-        ex = int(x * scale_mm)
-        ey = int(-y * scale_mm)  # invert y
-        stitch_list.append((ex, ey))
-    stitches = center_stitches(stitch_list)
-
-    pattern = EmbPattern()
-    pattern.add_block(list(stitches))
-
-    pattern = TurtleEmbroidery.finish(pattern)
-    export_pattern(
-        pattern,
-        pes_filename=pes_filename,
-        png_filename=png_filename,
-        show_preview=show_preview,
-    )
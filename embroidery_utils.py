@@ -1,9 +1,19 @@
-"""Shared embroidery helpers that avoid GUI dependencies."""
+"""Shared embroidery helpers that avoid GUI dependencies.
+
+pyembroidery is imported inside the functions that build patterns: its
+package import loads every reader and writer, which a worker should only
+pay for on its first export, not at startup.
+"""
 
 import math
-from typing import List, Tuple
+from typing import TYPE_CHECKING, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embroidery_points import PointBuffer, point_array
 
-from pyembroidery import END, JUMP, EmbPattern
+if TYPE_CHECKING:
+    from pyembroidery import EmbPattern
 
 
 def densify_points(points: List[Tuple[float, float]], max_step_units: float):
@@ -35,6 +45,292 @@ def densify_points(points: List[Tuple[float, float]], max_step_units: float):
     return dense
 
 
+def split_blocks(points: Sequence, breaks: Iterable[int]) -> List[Sequence]:
+    """Split ``points`` into pen-down runs at the ``breaks`` start indices."""
+
+    bounds = [0, *sorted(breaks), len(points)]
+    return [points[a:b] for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _segment_lengths(delta: np.ndarray, max_step_units: float) -> np.ndarray:
+    """Lengths of ``(n, 2)`` segment vectors, as :func:`math.hypot` gives them.
+
+    ``np.hypot`` can differ from ``math.hypot`` in the last bit, which is
+    enough to tip ``ceil(dist / max_step_units)`` for a segment that is a
+    whole number of steps long. Only those segments are recomputed.
+    """
+
+    dist = np.hypot(delta[:, 0], delta[:, 1])
+    ratio = dist / max_step_units
+    near = np.flatnonzero(np.abs(ratio - np.rint(ratio)) <= 1e-9 * np.maximum(ratio, 1.0))
+    if len(near):
+        dist[near] = list(map(math.hypot, delta[near, 0].tolist(), delta[near, 1].tolist()))
+    return dist
+
+
+def densify_indexed(pts: np.ndarray, max_step_units: float, breaks: Sequence[int] = ()):
+    """Densify ``pts`` and also return where each input point landed.
+
+    ``pts`` must be an ``(n, 2)`` float array; see :func:`densify_array`.
+    """
+
+    if len(pts) < 2:
+        return pts.copy(), np.arange(len(pts))
+
+    start = pts[:-1]
+    end = pts[1:]
+    delta = end - start
+    dist = _segment_lengths(delta, max_step_units)
+
+    long_segments = dist > max_step_units
+    if len(breaks):
+        # Travel into a new block is a single jump, never interpolated.
+        long_segments[np.asarray(breaks, dtype=np.intp) - 1] = False
+    steps = np.ones(len(dist), dtype=np.int64)
+    steps[long_segments] = np.ceil(dist[long_segments] / max_step_units).astype(np.int64)
+
+    offsets = np.cumsum(steps) - steps
+    segment = np.repeat(np.arange(len(steps)), steps)
+    s = np.arange(int(offsets[-1] + steps[-1])) - offsets[segment] + 1
+    t = s / steps[segment]
+
+    dense = np.empty((len(t) + 1, 2), dtype=np.float64)
+    dense[0] = pts[0]
+    dense[1:] = start[segment] + delta[segment] * t[:, None]
+
+    # Short segments keep their exact endpoint, as the reference loop does.
+    short = np.flatnonzero(~long_segments)
+    dense[offsets[short] + 1] = end[short]
+    return dense, np.concatenate(([0], offsets + steps))
+
+
+def densify_array(points, max_step_units: float, breaks: Sequence[int] = ()) -> np.ndarray:
+    """Vectorized :func:`densify_points` returning an ``(n, 2)`` float array.
+
+    Step counts are expanded with ``cumsum``/``repeat`` so the whole path is
+    interpolated in one batch. The arithmetic mirrors the reference loop
+    exactly, so both produce identical coordinates. Segments leading into
+    a ``breaks`` index (a new pen-down block) are left as single moves.
+    """
+
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return densify_indexed(pts, max_step_units, breaks)[0]
+
+
+def densified_count(points, max_step_units: float, breaks: Sequence[int] = ()) -> int:
+    """Number of points :func:`densify_array` would produce, without building them."""
+
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(pts) < 2:
+        return len(pts)
+    delta = np.diff(pts, axis=0)
+    dist = _segment_lengths(delta, max_step_units)
+    steps = np.where(dist > max_step_units, np.ceil(dist / max_step_units), 1.0)
+    if len(breaks):
+        steps[np.asarray(breaks, dtype=np.intp) - 1] = 1.0
+    return int(steps.sum()) + 1
+
+
+def _collinear_keep(pts: np.ndarray, eps: float = 1e-9) -> np.ndarray:
+    """Mask dropping interior points that sit on a straight, same-direction run."""
+
+    keep = np.ones(len(pts), dtype=bool)
+    if len(pts) < 3:
+        return keep
+    a = pts[1:-1] - pts[:-2]
+    b = pts[2:] - pts[1:-1]
+    cross = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    dot = (a * b).sum(axis=1)
+    scale = np.hypot(a[:, 0], a[:, 1]) * np.hypot(b[:, 0], b[:, 1])
+    keep[1:-1] = ~((np.abs(cross) <= eps * scale) & (dot > 0))
+    return keep
+
+
+def _min_length_keep(pts: np.ndarray, min_length: float) -> np.ndarray:
+    """Greedy mask keeping points at least ``min_length`` from the last kept one."""
+
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[0] = keep[-1] = True
+    coords = pts.tolist()
+    lx, ly = coords[0]
+    for i in range(1, len(coords) - 1):
+        x, y = coords[i]
+        if math.hypot(x - lx, y - ly) >= min_length:
+            keep[i] = True
+            lx, ly = x, y
+    return keep
+
+
+def _douglas_peucker_keep(pts: np.ndarray, tolerance: float) -> np.ndarray:
+    """Iterative Douglas-Peucker using point-to-segment distances."""
+
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a = pts[first]
+        seg = pts[last] - a
+        inner = pts[first + 1 : last] - a
+        length_sq = float(seg @ seg)
+        if length_sq > 0.0:
+            t = np.clip(inner @ seg / length_sq, 0.0, 1.0)
+            offset = inner - t[:, None] * seg
+        else:
+            offset = inner
+        dist = np.hypot(offset[:, 0], offset[:, 1])
+        index = int(np.argmax(dist))
+        if dist[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return keep
+
+
+def simplify_points(
+    points: Sequence[Tuple[float, float]],
+    breaks: Sequence[int] = (),
+    min_length: float = 0.0,
+    tolerance: float = 0.0,
+    merge_collinear: bool = False,
+) -> Tuple[PointBuffer, List[int]]:
+    """Drop redundant points before densification, block by block.
+
+    ``merge_collinear`` removes points on straight same-direction runs,
+    ``min_length`` removes points closer than that to the previous kept
+    point, and ``tolerance`` runs Douglas-Peucker with that maximum
+    deviation. Distances are in the units of ``points``; the first and
+    last point of every pen-down block are always kept.
+    """
+
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    bounds = [0, *breaks, len(pts)]
+    keep = np.ones(len(pts), dtype=bool)
+
+    for start, end in zip(bounds, bounds[1:]):
+        if end - start < 3:
+            continue
+        index = np.arange(start, end)
+        if merge_collinear:
+            index = index[_collinear_keep(pts[index])]
+        if min_length > 0 and len(index) > 2:
+            index = index[_min_length_keep(pts[index], min_length)]
+        if tolerance > 0 and len(index) > 2:
+            index = index[_douglas_peucker_keep(pts[index], tolerance)]
+        keep[start:end] = False
+        keep[index] = True
+
+    kept = np.flatnonzero(keep)
+    new_breaks = np.searchsorted(kept, np.asarray(breaks, dtype=np.intp)).tolist()
+    return PointBuffer.from_array(pts[kept]), new_breaks
+
+
+def bbox_center(pts: np.ndarray) -> Tuple[float, float]:
+    """Center of the bounding box of an ``(n, 2)`` array; the origin when empty."""
+
+    if not len(pts):
+        return (0.0, 0.0)
+    mins = pts.min(axis=0)
+    maxs = pts.max(axis=0)
+    return ((float(mins[0]) + float(maxs[0])) / 2.0, (float(mins[1]) + float(maxs[1])) / 2.0)
+
+
+def points_to_stitch_array(
+    points: Sequence[Tuple[float, float]],
+    scale_mm: float,
+    max_stitch_mm: float,
+    breaks: Sequence[int] = (),
+    densified: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Tuple[np.ndarray, Tuple[float, float], np.ndarray, List[int]]:
+    """Center, densify, scale, flip Y, round and re-center in one pass.
+
+    Returns ``(centered_points, center_offset, stitches, jumps)`` where
+    ``centered_points`` is a float array in turtle units, ``stitches`` is
+    an ``(n, 2)`` int32 array for :func:`add_stitch_blocks` and ``jumps`` are the stitch indices that start each block after the first.
+    ``densified`` may carry :func:`densify_indexed` of the uncentered
+    points, computed beforehand (e.g. incrementally by an edit session);
+    it is shifted by the center here. Shifting after densifying is not
+    bit-identical to densifying centered points: a segment within rounding
+    of a whole number of steps can get one step more or fewer.
+    """
+
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(pts):
+        return pts.copy(), (0.0, 0.0), np.empty((0, 2), dtype=np.int32), []
+
+    cx, cy = bbox_center(pts)
+    centered = pts - (cx, cy)
+
+    if densified is not None:
+        dense, landed = densified
+        dense = dense - (cx, cy)
+    else:
+        dense, landed = densify_indexed(centered, max_stitch_mm / scale_mm, breaks)
+    jumps = landed[np.asarray(breaks, dtype=np.intp)].tolist() if len(breaks) else []
+
+    scaled = np.empty_like(dense)
+    scaled[:, 0] = np.rint(dense[:, 0] * scale_mm)
+    scaled[:, 1] = np.rint(-dense[:, 1] * scale_mm)  # invert y
+
+    smin = scaled.min(axis=0)
+    smax = scaled.max(axis=0)
+    scaled -= (smin + smax) / 2.0
+    stitches = np.rint(scaled).astype(np.int32)
+    return centered, (cx, cy), stitches, jumps
+
+
+def add_stitch_blocks(
+    pattern: "EmbPattern",
+    stitches: Sequence[Tuple[int, int]],
+    jumps: Sequence[int] = (),
+    trim_distance: Optional[float] = None,
+    colors: Sequence[Optional[str]] = (),
+) -> "EmbPattern":
+    """Add ``stitches`` as one block, jumping (and trimming) between runs.
+
+    Each index in ``jumps`` starts a new pen-down run: the machine jumps
+    there instead of sewing the travel, and trims first when the jump is
+    longer than ``trim_distance`` (never, when it is None). ``colors``
+    optionally gives each run's thread (``#rrggbb``, None for black); runs
+    are then added as one pyembroidery block per thread change, which the
+    writers turn into colour changes. This is where stitch arrays become
+    the Python lists pyembroidery expects.
+    """
+
+    from pyembroidery import JUMP, STITCH, TRIM, EmbThread
+
+    def thread(color: Optional[str]) -> "EmbThread":
+        embthread = EmbThread()
+        embthread.set_hex_color(color or "#000000")
+        return embthread
+
+    stitches = point_array(stitches, dtype=np.int64).tolist()
+    if not jumps and not colors:
+        pattern.add_block(stitches)
+        return pattern
+
+    block = []
+    previous = 0
+    for run, start in enumerate([*jumps, len(stitches)]):
+        if previous:
+            x0, y0 = stitches[previous - 1]
+            x1, y1 = stitches[previous]
+            if colors and colors[run] != colors[run - 1]:
+                pattern.add_block(block, thread(colors[run - 1]))  # trims and changes thread
+                block = []
+            elif trim_distance is not None and math.hypot(x1 - x0, y1 - y0) > trim_distance:
+                block.append((x0, y0, TRIM))
+            block.append((x1, y1, JUMP))
+        block.extend((x, y, STITCH) for x, y in stitches[previous:start])
+        previous = start
+
+    pattern.add_block(block, thread(colors[-1]) if colors else None)
+    return pattern
+
+
 def _calc_center(points: List[Tuple[float, float]]) -> Tuple[float, float]:
     if not points:
         return (0.0, 0.0)
@@ -80,9 +376,11 @@ def center_stitches(stitches: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
     return [(int(round(x - cx)), int(round(y - cy))) for x, y in stitches]
 
 
-def remove_trailing_jumps(pattern: EmbPattern) -> EmbPattern:
+def remove_trailing_jumps(pattern: "EmbPattern") -> "EmbPattern":
     """Strip jump commands from the tail of the pattern."""
 
+    from pyembroidery import JUMP
+
     while getattr(pattern, "stitches", []):
         command = pattern.stitches[-1][0]
         if command == JUMP:
@@ -93,9 +391,11 @@ def remove_trailing_jumps(pattern: EmbPattern) -> EmbPattern:
     return pattern
 
 
-def finish_pattern(pattern: EmbPattern) -> EmbPattern:
+def finish_pattern(pattern: "EmbPattern") -> "EmbPattern":
     """Finalize a pattern by centering, trimming, and appending END."""
 
+    from pyembroidery import END
+
     pattern.move_center_to_origin()
     remove_trailing_jumps(pattern)
 
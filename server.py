@@ -1,36 +1,134 @@
 # server.py
 
+import asyncio
+import io
+import json
+import os
+import re
+import zipfile
+from contextlib import asynccontextmanager
+from functools import partial
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field, validator
 
-from api_backend import generate_from_commands, script_to_commands
+from api_backend import (
+    OUTPUT_KINDS,
+    PipelineOptions,
+    check_outputs,
+    ensure_outputs,
+    export_key,
+    generate_result,
+    iter_commands,
+    points_to_bytes,
+    points_to_result,
+    result_to_outputs,
+    script_to_commands,
+)
+from embroidery_cache import ResultCache
+from embroidery_estimate import INLINE, REJECT, AdmissionPolicy, estimate_cost
+from embroidery_fill import DEFAULT_FILL_SPACING_MM
+from embroidery_http import (
+    CachedStaticFiles,
+    CompressionMiddleware,
+    cached_file,
+    etag_matches,
+    not_modified,
+    parse_if_none_match,
+    request_tag,
+)
+from embroidery_jobs import DONE, JobQueue, QueueFull, WorkerLost
+from embroidery_metrics import MetricsRegistry, StageTimings, timed
+from embroidery_preview import MAX_PREVIEW_SIZE, render_preview
+from embroidery_sessions import EditSession, SessionStore, SessionUpdate
+from embroidery_stream import StitchStream
+from test_class_pyembr import EXPORT_FORMATS, export_format
 
 
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / "static"
 IMAGES_DIR = BASE_DIR / "images"
 
+# Without an explicit ``outputs`` list only the PES is encoded up front;
+# the PNG is rendered lazily when its URL is fetched.
+DEFAULT_OUTPUTS = ("pes", "points")
+
+# Finished exports keyed by program + scale. Set EMBROIDERY_CACHE_DIR to
+# add a disk tier shared across restarts/workers.
+RESULT_CACHE = ResultCache(
+    max_entries=int(os.environ.get("EMBROIDERY_CACHE_ENTRIES", "128")),
+    disk_dir=os.environ.get("EMBROIDERY_CACHE_DIR") or None,
+    max_disk_bytes=int(os.environ.get("EMBROIDERY_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
+
+# Background exports run in a process pool sized to the cores.
+JOBS = JobQueue(
+    max_workers=int(os.environ.get("EMBROIDERY_JOB_WORKERS", "0")) or None,
+    max_pending=int(os.environ.get("EMBROIDERY_JOB_QUEUE", "32")),
+    timeout_s=float(os.environ.get("EMBROIDERY_JOB_TIMEOUT", "120")),
+)
+
+# Designs are estimated before they run: certain budget overruns are
+# rejected (413), designs under EMBROIDERY_INLINE_STITCHES stitches run
+# in the request thread and larger ones go to the job process pool.
+ADMISSION = AdmissionPolicy(inline_stitches=int(os.environ.get("EMBROIDERY_INLINE_STITCHES", "100000")))
+
+# Largest number of designs accepted by one /export_batch request.
+BATCH_MAX_ITEMS = int(os.environ.get("EMBROIDERY_BATCH_MAX_ITEMS", "200"))
+
+# Live editing sessions (parsed statements + turtle checkpoints per script).
+SESSIONS = SessionStore(
+    max_sessions=int(os.environ.get("EMBROIDERY_SESSIONS", "64")),
+    ttl_s=float(os.environ.get("EMBROIDERY_SESSION_TTL", "1800")),
+)
+
+# Stage histograms and request outcomes, exposed at /metrics.
+METRICS = MetricsRegistry()
+
+# Responses of at least this many bytes are brotli/gzip-compressed.
+COMPRESS_MIN_BYTES = int(os.environ.get("EMBROIDERY_COMPRESS_MIN_BYTES", "1024"))
+# Export bodies are revalidated every time (their download URLs expire
+# with the result cache); artifacts under a design id never change.
+EXPORT_CACHE_CONTROL = "no-cache"
+ARTIFACT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_CACHE_CONTROL = f"public, max-age={int(os.environ.get('EMBROIDERY_STATIC_MAX_AGE', '3600'))}"
+
 
 class CommandModel(BaseModel):
     op: str
     value: Optional[float] = Field(default=0.0)
     x: Optional[float] = None
     y: Optional[float] = None
+    color: Optional[str] = Field(default=None, description="thread for op=color: a name or '#rrggbb'")
 
     @validator("op")
     def normalize_op(cls, v: str) -> str:
         return v.lower()
 
 
-class ExportRequest(BaseModel):
-    commands: List[CommandModel]
+class ExportSettings(BaseModel):
+    """Scale, output and pipeline settings shared by every export request."""
+
     scale_mm: float = Field(default=1500 / 150, description="mm per turtle unit")
     max_stitch_mm: float = Field(default=3.0, description="max stitch length in mm")
+    inline: bool = Field(default=False, description="return base64 PES/PNG and points in the body (legacy shape)")
+    outputs: Optional[List[str]] = Field(default=None, description="any of points and the formats listed by /formats (pes, png, dst, jef, ...)")
+    optimize_travel: bool = Field(default=False, description="reorder pen-down blocks to shorten jumps")
+    allow_reverse: bool = Field(default=True, description="let the travel optimizer sew blocks backwards")
+    travel_budget_s: float = Field(default=0.5, ge=0.0, le=10.0, description="time budget for travel optimization")
+    min_stitch_mm: float = Field(default=0.0, ge=0.0, description="drop points closer than this to the previous one")
+    simplify_mm: float = Field(default=0.0, ge=0.0, description="Douglas-Peucker tolerance in mm")
+    merge_collinear: bool = Field(default=False, description="merge points on straight runs")
+    fill_spacing_mm: float = Field(default=DEFAULT_FILL_SPACING_MM, gt=0.0, description="row spacing of tatami fills and satin columns")
+    fill_angle: float = Field(default=0.0, description="default fill row angle in degrees; fill_angle() overrides it")
+    max_density: float = Field(default=0.0, ge=0.0, description="thin stitches in cells denser than this many per mm² (0 keeps all)")
+    group_colors: bool = Field(default=False, description="sew all blocks of a thread together to cut colour changes")
+    timings: bool = Field(default=False, description="include per-stage timings and counters in the body")
 
     @validator("scale_mm", "max_stitch_mm")
     def must_be_positive(cls, v: float) -> float:
@@ -38,41 +136,646 @@ class ExportRequest(BaseModel):
             raise ValueError("must be positive")
         return v
 
+    @validator("outputs")
+    def known_outputs(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        return None if v is None else list(check_outputs(v))
+
+    def selected_outputs(self) -> tuple:
+        if self.outputs is not None:
+            return tuple(self.outputs)
+        return OUTPUT_KINDS if self.inline else DEFAULT_OUTPUTS
+
+    def pipeline_options(self) -> PipelineOptions:
+        return PipelineOptions(
+            optimize_travel=self.optimize_travel,
+            allow_reverse=self.allow_reverse,
+            travel_budget_s=self.travel_budget_s,
+            min_stitch_mm=self.min_stitch_mm,
+            simplify_mm=self.simplify_mm,
+            merge_collinear=self.merge_collinear,
+            fill_spacing_mm=self.fill_spacing_mm,
+            fill_angle=self.fill_angle,
+            max_density=self.max_density,
+            group_colors=self.group_colors,
+        )
+
+
+class ExportRequest(ExportSettings):
+    commands: List[CommandModel]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    JOBS.shutdown()
+
+
+app = FastAPI(title="Embroidery Turtle", version="0.1.0", lifespan=lifespan)
+
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+DESIGN_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _outcome(status_code: int) -> str:
+    if status_code in (413, 429):
+        return "rejected"
+    if status_code >= 500:
+        return "server_error"
+    if status_code >= 400:
+        return "client_error"
+    return "ok"
+
+
+def _route_of(request: Request) -> str:
+    # The matched route template keeps design/job ids out of the labels.
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    try:
+        response = await call_next(request)
+    except Exception:
+        METRICS.count_request(_route_of(request), "server_error")
+        raise
+    METRICS.count_request(_route_of(request), _outcome(response.status_code))
+    return response
+
+
+def _record_timings(response: Response, timings: StageTimings) -> None:
+    METRICS.observe(timings)
+    if timings.stages:
+        response.headers["Server-Timing"] = timings.server_timing()
+
+
+def _export_response(
+    result: dict,
+    inline: bool,
+    outputs=DEFAULT_OUTPUTS,
+    timings: Optional[StageTimings] = None,
+) -> dict:
+    """Legacy inline body, or metadata plus download URLs for the artifacts."""
+
+    if inline:
+        return result_to_outputs(result, outputs, timings)
+
+    design_id = result["id"]
+    return {
+        "id": design_id,
+        "pes_url": f"/export/{design_id}.pes",
+        "png_url": f"/export/{design_id}.png",
+        "points_url": f"/export/{design_id}.points",
+        "preview_url": f"/export/{design_id}/preview.png",
+        "stitch_count": result["stitch_count"],
+        "point_count": len(result["centered_points"]),
+        "breaks": result.get("breaks", []),
+        "jump_count": result.get("jump_count", 0),
+        "travel": result.get("travel"),
+        "simplification": result.get("simplification"),
+        "density": result.get("density"),
+        "threads": result.get("threads", []),
+        "color_changes": result.get("color_changes"),
+        "center_offset": result["center_offset"],
+        **{f"{kind}_url": f"/export/{design_id}.{kind}" for kind in outputs if kind in EXPORT_FORMATS},
+    }
+
+
+def _cached_result(design_id: str) -> dict:
+    result = RESULT_CACHE.get(design_id) if DESIGN_ID_RE.match(design_id) else None
+    if result is None:
+        raise HTTPException(status_code=404, detail="unknown or expired design id; export it again")
+    return result
+
+
+def _cached_artifact(design_id: str, kind: str, timings: Optional[StageTimings] = None) -> bytes:
+    result = _cached_result(design_id)
+    if ensure_outputs(result, (kind,), timings):
+        RESULT_CACHE.put(design_id, result)
+    return result[kind]
+
+
+def _design_etag(tag: str, design_id: str) -> str:
+    return f'"{tag}-{design_id}"'
+
+
+def _export_tag(request: Request, settings: ExportSettings):
+    """``(tag, 304 response or None)`` for a POST export.
+
+    The tag digests the request body, so a matching ``If-None-Match`` is
+    answered before parsing or running anything. URL-style bodies are only
+    reused while their design is still cached, so the links keep working.
+    Requests asking for timings always run.
+    """
+
+    if settings.timings:
+        return None, None
+    tag = request_tag(app.version, request.url.path, settings.dict())
+    for etag in parse_if_none_match(request.headers.get("if-none-match")):
+        prefix, _, design_id = etag.partition("-")
+        if prefix == tag and DESIGN_ID_RE.match(design_id) and (settings.inline or design_id in RESULT_CACHE):
+            return tag, not_modified(_design_etag(tag, design_id), EXPORT_CACHE_CONTROL)
+    return tag, None
+
+
+def _tag_export(response: Response, tag: Optional[str], design_id: str) -> None:
+    if tag is not None:
+        response.headers["ETag"] = _design_etag(tag, design_id)
+        response.headers["Cache-Control"] = EXPORT_CACHE_CONTROL
+
+
+def _artifact_response(request: Request, etag: str, make_response) -> Response:
+    """Artifacts are addressed by design id: a known ETag is answered with 304."""
 
-app = FastAPI(title="Embroidery Turtle", version="0.1.0")
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, ARTIFACT_CACHE_CONTROL)
+    response = make_response()
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = ARTIFACT_CACHE_CONTROL
+    return response
+
+
+def _plan(commands: list, settings: ExportSettings, timings: Optional[StageTimings] = None):
+    """Normalize and estimate ``commands``: ``(program, key, estimate, route)``.
+
+    Raises 413 with the estimate when the design is certain to exceed a budget.
+    """
+
+    with timed(timings, "normalize"):
+        program, key = export_key(
+            commands, settings.scale_mm, settings.max_stitch_mm, options=settings.pipeline_options()
+        )
+    with timed(timings, "estimate"):
+        estimate = estimate_cost(
+            program,
+            settings.scale_mm,
+            settings.max_stitch_mm,
+            fill=settings.pipeline_options().fill_settings(settings.scale_mm, settings.max_stitch_mm),
+        )
+    route, reason = ADMISSION.route(estimate)
+    if route == REJECT:
+        raise HTTPException(status_code=413, detail={"message": reason, "estimate": estimate.as_dict()})
+    return program, key, {**estimate.as_dict(), "route": route}, route
+
+
+async def _routed_result(
+    key: str,
+    program: list,
+    settings: ExportSettings,
+    route: str,
+    timings: Optional[StageTimings] = None,
+) -> dict:
+    """The export for ``program``: cached, computed in a worker thread (``inline``) or in the process pool."""
+
+    outputs = settings.selected_outputs()
+    if route == INLINE:
+        return await run_in_threadpool(
+            partial(
+                generate_result,
+                cache=RESULT_CACHE,
+                outputs=outputs,
+                options=settings.pipeline_options(),
+                timings=timings,
+            ),
+            program,
+            settings.scale_mm,
+            settings.max_stitch_mm,
+        )
+
+    result = RESULT_CACHE.get(key)
+    if result is not None:
+        if await run_in_threadpool(ensure_outputs, result, outputs, timings):
+            RESULT_CACHE.put(key, result)
+        return result
+    with timed(timings, "pool"):
+        result = await JOBS.run(
+            partial(generate_result, outputs=outputs, options=settings.pipeline_options()),
+            program,
+            settings.scale_mm,
+            settings.max_stitch_mm,
+        )
+    result["id"] = key
+    RESULT_CACHE.put(key, result)
+    return result
+
+
+async def _admitted_export(commands: list, settings: ExportSettings, timings: StageTimings):
+    """``(result, estimate)`` for an export request, routed by its estimated cost."""
+
+    try:
+        program, key, estimate, route = await run_in_threadpool(_plan, commands, settings, timings)
+        result = await _routed_result(key, program, settings, route, timings)
+    except HTTPException:
+        raise
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except QueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
+    except WorkerLost as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except TimeoutError as exc:
+        raise HTTPException(status_code=504, detail=str(exc))
+    except Exception as exc:  # pragma: no cover - guard rail
+        raise HTTPException(status_code=500, detail=str(exc))
+    return result, estimate
 
 
 @app.get("/")
-def serve_index():
+def serve_index(request: Request):
     index_path = STATIC_DIR / "index.html"
     if index_path.exists():
-        return FileResponse(index_path)
+        return cached_file(index_path, request.headers, "no-cache")
     return {"message": "Embroidery Turtle API. POST /export with commands."}
 
 
 @app.post("/export")
-def export_design(req: ExportRequest):
+async def export_design(req: ExportRequest, request: Request, response: Response):
     if not req.commands:
         raise HTTPException(status_code=400, detail="commands cannot be empty")
+    tag, unchanged = _export_tag(request, req)
+    if unchanged is not None:
+        return unchanged
+
+    timings = StageTimings()
+    result, estimate = await _admitted_export([cmd.dict() for cmd in req.commands], req, timings)
+    body = await run_in_threadpool(
+        partial(_export_response, result, inline=req.inline, outputs=req.selected_outputs(), timings=timings)
+    )
+    body["estimate"] = estimate
+    _record_timings(response, timings)
+    _tag_export(response, tag, result["id"])
+    if req.timings:
+        body["timings"] = timings.as_dict()
+    return body
+
+
+@app.get("/export/{design_id}/preview.png")
+def download_preview(
+    design_id: str,
+    request: Request,
+    size: int = Query(default=256, ge=8, le=MAX_PREVIEW_SIZE),
+    line_width: int = Query(default=1, ge=1, le=8),
+):
+    """Thumbnail rasterized from the stitch path, much cheaper than the full PNG."""
+
+    result = _cached_result(design_id)
+
+    def render() -> Response:
+        timings = StageTimings()
+        with timings.stage("preview"):
+            png = render_preview(
+                result["centered_points"], size=size, line_width=line_width, breaks=result.get("breaks", ())
+            )
+        response = Response(content=png, media_type="image/png")
+        _record_timings(response, timings)
+        return response
+
+    return _artifact_response(request, f'"{design_id}-preview-{size}-{line_width}"', render)
+
+
+@app.get("/export/{design_id}.points")
+def download_points(design_id: str, request: Request):
+    """Centered turtle-unit points as interleaved little-endian float32 x, y."""
+
+    points = _cached_result(design_id)["centered_points"]
+    return _artifact_response(
+        request,
+        f'"{design_id}-points"',
+        lambda: Response(
+            content=points_to_bytes(points),
+            media_type="application/octet-stream",
+            headers={"X-Point-Count": str(len(points))},
+        ),
+    )
+
+
+# Declared after the .points route, which it would otherwise shadow.
+@app.get("/export/{design_id}.{fmt}")
+def download_artifact(design_id: str, fmt: str, request: Request):
+    """The design in any format from /formats, encoded on first request and cached."""
 
     try:
-        outputs = generate_from_commands(
-            [cmd.dict() for cmd in req.commands],
-            scale_mm=req.scale_mm,
-            max_stitch_mm=req.max_stitch_mm,
+        spec = export_format(fmt)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    _cached_result(design_id)
+
+    def encode() -> Response:
+        timings = StageTimings()
+        headers = {}
+        if not spec.media_type.startswith("image/"):
+            headers["Content-Disposition"] = f'attachment; filename="design.{spec.name}"'
+        response = Response(
+            content=_cached_artifact(design_id, spec.name, timings), media_type=spec.media_type, headers=headers
         )
+        _record_timings(response, timings)
+        return response
+
+    return _artifact_response(request, f'"{design_id}-{spec.name}"', encode)
+
+
+@app.get("/formats")
+def list_formats():
+    """Export formats accepted in ``outputs`` and as download extensions."""
+
+    return [
+        {"name": spec.name, "media_type": spec.media_type, "description": spec.description}
+        for spec in EXPORT_FORMATS.values()
+    ]
+
+
+class ScriptRequest(ExportSettings):
+    script: str
+    include_commands: bool = Field(default=False, description="also return the fully expanded command list")
+
+
+def _parse_script(script: str, timings: StageTimings) -> list:
+    with timings.stage("parse"):
+        return script_to_commands(script)
+
+
+@app.post("/export_script")
+async def export_script(req: ScriptRequest, request: Request, response: Response):
+    """Export a script; small designs run inline, large ones in the process pool."""
+
+    tag, unchanged = _export_tag(request, req)
+    if unchanged is not None:
+        return unchanged
+    timings = StageTimings()
+    try:
+        program = await run_in_threadpool(_parse_script, req.script, timings)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
-    except Exception as exc:  # pragma: no cover - guard rail
-        raise HTTPException(status_code=500, detail=str(exc))
+    result, estimate = await _admitted_export(program, req, timings)
 
-    return outputs
+    def build_body() -> dict:
+        body = {
+            "program": program,
+            **_export_response(result, inline=req.inline, outputs=req.selected_outputs(), timings=timings),
+            "estimate": estimate,
+        }
+        if req.include_commands:
+            body["commands"] = list(iter_commands(program))
+        return body
 
+    body = await run_in_threadpool(build_body)
+    _record_timings(response, timings)
+    _tag_export(response, tag, result["id"])
+    if req.timings:
+        body["timings"] = timings.as_dict()
+    return body
 
-class ScriptRequest(BaseModel):
-    script: str
-    scale_mm: float = Field(default=1500 / 150)
-    max_stitch_mm: float = Field(default=3.0)
+
+def _job_response(job) -> dict:
+    response = {**job.describe(), "status_url": f"/jobs/{job.id}"}
+    if job.status == DONE:
+        response.update(_export_response(job.result, inline=False))
+    return response
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(req: ScriptRequest, response: Response):
+    """Queue a script export; poll ``GET /jobs/{id}`` for the result.
+
+    Designs estimated small enough for the inline route are exported right
+    away and returned as an already finished job.
+    """
+
+    try:
+        program, key, estimate, route = await run_in_threadpool(
+            lambda: _plan(script_to_commands(req.script), req)
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    cached = RESULT_CACHE.get(key)
+    if cached is None and route == INLINE:
+        try:
+            cached = await _routed_result(key, program, req, route)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    if cached is not None:
+        response.status_code = 200
+        return {**_job_response(JOBS.completed(cached)), "estimate": estimate}
+
+    def store(result: dict) -> None:
+        result["id"] = key
+        RESULT_CACHE.put(key, result)
+
+    try:
+        job = JOBS.submit(
+            partial(generate_result, outputs=req.selected_outputs(), options=req.pipeline_options()),
+            program,
+            req.scale_mm,
+            req.max_stitch_mm,
+            on_success=store,
+        )
+    except QueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc))
+    except WorkerLost as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    return {**_job_response(job), "estimate": estimate}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, wait: float = Query(default=0.0, ge=0.0, le=60.0)):
+    """Job state; with ``wait`` > 0, hold the request until it finishes or the wait ends."""
+
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job id")
+    if wait:
+        await job.wait(wait)
+    return _job_response(job)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = JOBS.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job id")
+    return _job_response(job)
+
+
+# Batch item names become ZIP entry names, so they must be plain file stems.
+BATCH_NAME_RE = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9._-]{0,63}$")
+
+
+class BatchItem(BaseModel):
+    name: Optional[str] = Field(default=None, description="file name inside the ZIP (default design_001, ...)")
+    script: Optional[str] = None
+    commands: Optional[List[CommandModel]] = None
+
+    @validator("name")
+    def plain_name(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None and not BATCH_NAME_RE.match(v):
+            raise ValueError("name must be 1-64 letters, digits, '.', '_' or '-' and not start with '.'")
+        return v
+
+    @validator("commands", always=True)
+    def script_or_commands(cls, v, values):
+        if (v is None) == (values.get("script") is None):
+            raise ValueError("give exactly one of script or commands")
+        return v
+
+
+class BatchRequest(ExportSettings):
+    items: List[BatchItem] = Field(min_length=1)
+    format: str = Field(default="ndjson", description="ndjson (streamed, one line per item) or zip")
+
+    @validator("items")
+    def not_too_many(cls, v: List[BatchItem]) -> List[BatchItem]:
+        if len(v) > BATCH_MAX_ITEMS:
+            raise ValueError(f"at most {BATCH_MAX_ITEMS} items per batch")
+        return v
+
+    @validator("format")
+    def known_format(cls, v: str) -> str:
+        if v not in ("ndjson", "zip"):
+            raise ValueError("format must be ndjson or zip")
+        return v
+
+    def selected_outputs(self) -> tuple:
+        if self.format == "zip" and self.outputs is None:
+            return ("pes", "png")
+        return super().selected_outputs()
+
+
+def _prepare_batch(req: BatchRequest):
+    """Parse and estimate every item and group identical designs under one cache key."""
+
+    entries: List[dict] = []
+    programs: Dict[str, tuple] = {}  # key -> (program, route)
+    for index, item in enumerate(req.items):
+        entry = {"index": index, "name": item.name or f"design_{index + 1:03d}"}
+        try:
+            if item.script is not None:
+                commands = script_to_commands(item.script)
+            else:
+                commands = [cmd.dict() for cmd in item.commands]
+            program, entry["key"], entry["estimate"], entry["route"] = _plan(commands, req)
+        except ValueError as exc:
+            entry["error"] = str(exc)
+        except HTTPException as exc:
+            entry["error"] = exc.detail["message"]
+            entry["estimate"] = exc.detail["estimate"]
+        else:
+            programs.setdefault(entry["key"], (program, entry["route"]))
+        entries.append(entry)
+    return entries, programs
+
+
+async def _batch_result(key: str, program: list, req: BatchRequest, route: str, slots: asyncio.Semaphore):
+    """``(key, result or exception)`` for one unique design, served from the cache when possible."""
+
+    try:
+        async with slots:
+            return key, await _routed_result(key, program, req, route)
+    except Exception as exc:
+        return key, exc
+
+
+async def _iter_batch(req: BatchRequest, entries: List[dict], programs: Dict[str, tuple]):
+    """Yield ``(entry, result or exception)`` pairs as unique designs finish."""
+
+    by_key: Dict[str, List[dict]] = {}
+    for entry in entries:
+        if "error" in entry:
+            yield entry, ValueError(entry["error"])
+        else:
+            by_key.setdefault(entry["key"], []).append(entry)
+
+    # A batch keeps at most one design per worker in flight, so it shares
+    # the pending-job bound with other requests instead of filling it.
+    slots = asyncio.Semaphore(max(1, min(JOBS.max_workers, JOBS.max_pending)))
+    tasks = [
+        asyncio.ensure_future(_batch_result(key, program, req, route, slots))
+        for key, (program, route) in programs.items()
+    ]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            key, outcome = await finished
+            for entry in by_key[key]:
+                yield entry, outcome
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _batch_line(req: BatchRequest, entry: dict, outcome, first_index: Dict[str, int]) -> dict:
+    line = {"index": entry["index"], "name": entry["name"]}
+    if "estimate" in entry:
+        line["estimate"] = entry["estimate"]
+    if isinstance(outcome, Exception):
+        line["error"] = str(outcome)
+        return line
+    first = first_index.setdefault(entry["key"], entry["index"])
+    if first != entry["index"]:
+        line["duplicate_of"] = first
+    line.update(_export_response(outcome, inline=req.inline, outputs=req.selected_outputs()))
+    return line
+
+
+def _zip_batch(lines: List[dict], results: Dict[int, dict], outputs) -> bytes:
+    buffer = io.BytesIO()
+    used = set()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for line in sorted(lines, key=lambda item: item["index"]):
+            result = results.get(line["index"])
+            if result is None:
+                continue
+            stem = line["name"] if line["name"] not in used else f"{line['name']}_{line['index'] + 1}"
+            used.add(stem)
+            for kind in outputs:
+                if kind in EXPORT_FORMATS and kind in result:
+                    archive.writestr(f"{stem}.{kind}", result[kind])
+            if "points" in outputs:
+                archive.writestr(f"{stem}.points", points_to_bytes(result["centered_points"]))
+        archive.writestr("manifest.json", json.dumps(sorted(lines, key=lambda item: item["index"]), indent=2))
+    return buffer.getvalue()
+
+
+@app.post("/export_batch")
+async def export_batch(req: BatchRequest):
+    """Export many designs at once: identical ones run once, the rest in parallel workers.
+
+    ``format=ndjson`` streams one JSON line per item as it finishes, then a
+    summary line; ``format=zip`` returns every artifact plus ``manifest.json``.
+    """
+
+    entries, programs = await run_in_threadpool(_prepare_batch, req)
+    summary = {"done": True, "items": len(entries), "unique": len(programs)}
+    first_index: Dict[str, int] = {}
+
+    if req.format == "zip":
+        lines: List[dict] = []
+        results: Dict[int, dict] = {}
+        async for entry, outcome in _iter_batch(req, entries, programs):
+            lines.append(_batch_line(req, entry, outcome, first_index))
+            if not isinstance(outcome, Exception):
+                results[entry["index"]] = outcome
+        content = await run_in_threadpool(_zip_batch, lines, results, req.selected_outputs())
+        return Response(
+            content=content,
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="designs.zip"'},
+        )
+
+    async def stream():
+        errors = 0
+        async for entry, outcome in _iter_batch(req, entries, programs):
+            errors += isinstance(outcome, Exception)
+            yield json.dumps(_batch_line(req, entry, outcome, first_index)) + "\n"
+        yield json.dumps({**summary, "errors": errors}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+class SessionCreate(BaseModel):
+    script: str = ""
+    scale_mm: float = Field(default=1500 / 150, description="mm per turtle unit")
+    max_stitch_mm: float = Field(default=3.0, description="max stitch length in mm")
 
     @validator("scale_mm", "max_stitch_mm")
     def must_be_positive(cls, v: float) -> float:
@@ -81,28 +784,190 @@ class ScriptRequest(BaseModel):
         return v
 
 
-@app.post("/export_script")
-def export_script(req: ScriptRequest):
-    try:
-        commands = script_to_commands(req.script)
-        outputs = generate_from_commands(
-            commands,
-            scale_mm=req.scale_mm,
-            max_stitch_mm=req.max_stitch_mm,
-        )
-    except ValueError as exc:
-        raise HTTPException(status_code=400, detail=str(exc))
-    except Exception as exc:  # pragma: no cover
-        raise HTTPException(status_code=500, detail=str(exc))
+class SessionEdit(BaseModel):
+    script: str
+
 
+def _session_response(session: EditSession, update: SessionUpdate) -> dict:
+    """The update as a delta: clients keep ``points[:points_from]`` and append ``points``."""
+
+    points = session.points.array
     return {
-        "commands": commands,
-        **outputs,
+        "session_id": session.id,
+        "changed_from": update.changed_from,
+        "statements": update.statements,
+        "points_from": update.points_from,
+        "points": points[update.points_from :].tolist(),
+        "point_count": len(points),
+        "breaks": list(session.breaks),
+        "stitch_points": update.stitch_points,
+        "center_offset": {"x": session.center[0], "y": session.center[1]},
     }
 
 
+def _export_points(program, points, breaks, colors, scale_mm: float, max_stitch_mm: float, densified=None):
+    """Cached export of an already interpreted program: ``(normalized program, result)``."""
+
+    program, key = export_key(program, scale_mm, max_stitch_mm)
+    result = RESULT_CACHE.get(key)
+    if result is None:
+        result = points_to_result(
+            points,
+            scale_mm=scale_mm,
+            max_stitch_mm=max_stitch_mm,
+            outputs=DEFAULT_OUTPUTS,
+            breaks=list(breaks),
+            colors=list(colors),
+            densified=densified,
+        )
+        result["id"] = key
+        RESULT_CACHE.put(key, result)
+    return program, result
+
+
+def _session(session_id: str) -> EditSession:
+    session = SESSIONS.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="unknown or expired session; create a new one")
+    return session
+
+
+@app.post("/sessions", status_code=201)
+def create_session(req: SessionCreate):
+    """Start a live editing session; later edits go to ``PUT /sessions/{id}``."""
+
+    session = SESSIONS.create(req.scale_mm, req.max_stitch_mm)
+    with session.lock:
+        try:
+            update = session.update(req.script)
+        except ValueError as exc:
+            SESSIONS.delete(session.id)
+            raise HTTPException(status_code=400, detail=str(exc))
+        return _session_response(session, update)
+
+
+@app.put("/sessions/{session_id}")
+def edit_session(session_id: str, req: SessionEdit):
+    """Re-run the script from its first changed top-level statement."""
+
+    session = _session(session_id)
+    with session.lock:
+        try:
+            update = session.update(req.script)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return _session_response(session, update)
+
+
+@app.post("/sessions/{session_id}/export")
+def export_session(session_id: str):
+    """Full export of the session's current script, reusing its interpreted points and densified path."""
+
+    session = _session(session_id)
+    with session.lock:
+        try:
+            program, result = _export_points(
+                session.program,
+                session.points.copy(),
+                session.breaks,
+                session.turtle.block_colors,
+                session.scale_mm,
+                session.max_stitch_mm,
+                session.densified,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+    return {"program": program, **_export_response(result, inline=False)}
+
+
+@app.delete("/sessions/{session_id}", status_code=204)
+def delete_session(session_id: str):
+    if not SESSIONS.delete(session_id):
+        raise HTTPException(status_code=404, detail="unknown or expired session")
+    return Response(status_code=204)
+
+
+class StreamRequest(SessionCreate):
+    window: int = Field(default=4, ge=1, le=64, description="stitch chunks in flight before the server waits for an ack")
+
+
+@app.websocket("/ws/export")
+async def stream_export(websocket: WebSocket):
+    """Stream densified stitches while the design is generated, then the export.
+
+    The client sends one ``StreamRequest`` JSON message and receives
+    ``{"type": "stitches", "seq", "start", "points", "jumps"}`` chunks in turtle
+    units, acknowledging each with ``{"type": "ack", "seq"}``. At most
+    ``window`` chunks are unacknowledged, so a slow client throttles
+    generation. The last message is ``{"type": "done", ...}`` with the usual
+    export fields (download URLs), or ``{"type": "error", "detail"}``.
+    """
+
+    await websocket.accept()
+    try:
+        try:
+            req = StreamRequest(**await websocket.receive_json())
+            program = await run_in_threadpool(script_to_commands, req.script)
+            try:
+                estimate = (await run_in_threadpool(_plan, program, ExportSettings(scale_mm=req.scale_mm, max_stitch_mm=req.max_stitch_mm)))[2]
+            except HTTPException as exc:
+                raise ValueError(exc.detail["message"])
+            stream = StitchStream(program, req.scale_mm, req.max_stitch_mm)
+            chunks = iter(stream)
+            seq = acked = 0
+            while True:
+                chunk = await run_in_threadpool(next, chunks, None)
+                if chunk is None:
+                    break
+                while seq - acked >= req.window:
+                    message = await websocket.receive_json()
+                    if message.get("type") == "cancel":
+                        await websocket.close()
+                        return
+                    if message.get("type") == "ack":
+                        acked = max(acked, int(message.get("seq", 0)))
+                seq += 1
+                await websocket.send_json(
+                    {
+                        "type": "stitches",
+                        "seq": seq,
+                        "start": chunk.start,
+                        "points": np.round(chunk.points, 3).tolist(),
+                        "jumps": chunk.jumps,
+                    }
+                )
+            turtle = stream.turtle
+            program, result = await run_in_threadpool(
+                _export_points, program, turtle.points, turtle.breaks, turtle.block_colors, req.scale_mm, req.max_stitch_mm
+            )
+        except (ValueError, TypeError) as exc:  # bad request, script or budget
+            await websocket.send_json({"type": "error", "detail": str(exc)})
+            await websocket.close(code=1008)
+            return
+        await websocket.send_json(
+            {"type": "done", "stitches": stream.stitches, "estimate": estimate, **_export_response(result, inline=False)}
+        )
+        await websocket.close()
+    except WebSocketDisconnect:
+        return
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return RESULT_CACHE.snapshot()
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text format: stage histograms, request outcomes, counters."""
+
+    gauges = {f"result_cache_{name}": value for name, value in RESULT_CACHE.snapshot().items()}
+    gauges["jobs_pending"] = JOBS.pending
+    return Response(content=METRICS.render(gauges), media_type="text/plain; version=0.0.4")
+
+
 if STATIC_DIR.exists():
-    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+    app.mount("/static", CachedStaticFiles(directory=STATIC_DIR, cache_control=STATIC_CACHE_CONTROL), name="static")
 
 if IMAGES_DIR.exists():
-    app.mount("/images", StaticFiles(directory=IMAGES_DIR), name="images")
+    app.mount("/images", CachedStaticFiles(directory=IMAGES_DIR, cache_control=STATIC_CACHE_CONTROL), name="images")
@@ -0,0 +1,84 @@
+"""Interpreter budgets and block bookkeeping of VirtualEmbroidery."""
+
+import itertools
+
+import pytest
+
+from api_backend import iter_commands, program_ops, script_to_commands, trace
+from embroidery_fill import FillSettings
+from embroidery_utils import densified_count, points_to_stitch_array
+
+FILL = FillSettings.from_mm(0.1, 3.0)
+
+
+def _trace(script: str, **kwargs):
+    return trace(script_to_commands(script), fill=FILL, **kwargs)
+
+
+def test_loops_stay_repeat_nodes():
+    program = script_to_commands("for _ in range(1000000000):\n    forward(1)\n    left(1)")
+    assert program == [
+        {"op": "repeat", "count": 10**9, "body": [{"op": "forward", "value": 1.0}, {"op": "left", "value": 1.0}]}
+    ]
+    assert program_ops(program) == 2 * 10**9
+    assert [cmd["op"] for cmd in itertools.islice(iter_commands(program), 3)] == ["forward", "left", "forward"]
+
+
+def test_ops_budget_rejects_huge_loops_before_running():
+    with pytest.raises(ValueError, match="commands"):
+        _trace("for _ in range(1000000000):\n    left(1)")
+
+
+@pytest.mark.parametrize("count", ["1e999", "2.5"])
+def test_range_needs_a_whole_number(count):
+    with pytest.raises(ValueError, match="whole number"):
+        script_to_commands(f"for _ in range({count}):\n    forward(1)")
+
+
+def test_long_segment_exceeds_stitch_budget():
+    with pytest.raises(ValueError, match="stitches"):
+        _trace("pendown()\nforward(1e9)")
+
+
+def test_stitch_count_matches_densification():
+    turtle = _trace(
+        "pendown()\nfor _ in range(20):\n    forward(137)\n    left(61)\n"
+        "penup()\nforward(40)\npendown()\nsatin(20)\nforward(300)\nsatin(0)\n"
+        "begin_fill()\nfor _ in range(5):\n    forward(200)\n    left(72)\nend_fill()"
+    )
+    assert turtle.stitches == densified_count(turtle.points, FILL.stitch, turtle.breaks)
+
+
+def test_color_before_first_move_retags_the_block():
+    turtle = _trace("pendown()\ncolor('red')\nforward(5)\ncolor('blue')\nforward(5)")
+    assert turtle.block_colors == ["#ff0000", "#0000ff"]
+    assert turtle.breaks == [2]
+
+
+def test_restore_undoes_a_retag():
+    turtle = _trace("pendown()")
+    state = turtle.snapshot()
+    turtle.set_color("#ff0000")
+    turtle.restore(state)
+    assert turtle.block_colors == [None]
+
+
+ROSETTE = "pendown()\nfor i in range(36):\n    for j in range(4):\n        forward(30)\n        right(90)\n    right(10)"
+
+
+@pytest.mark.parametrize(
+    "script",
+    [
+        ROSETTE,
+        "pendown()\nfor _ in range(200):\n    forward(3)\n    left(7)\n    backward(6)\n    right(2)",
+        "left(45)\nfor _ in range(50):\n    forward(15)\n    for _ in range(3):\n        left(120)\n        forward(9)",
+    ],
+)
+def test_closed_form_loops_match_stepping(script):
+    fast, stepped = (_trace(script, fast_loops=fast) for fast in (True, False))
+    assert fast.points.tolist() == stepped.points.tolist()
+    assert (fast.x, fast.y, fast.heading) == (stepped.x, stepped.y, stepped.heading)
+    counts = [
+        len(points_to_stitch_array(turtle.points, 10.0, 3.0, turtle.breaks)[2]) for turtle in (fast, stepped)
+    ]
+    assert counts[0] == counts[1]
@@ -0,0 +1,45 @@
+"""Smoke tests of the benchmark harness on its smallest workload."""
+
+import json
+
+import pytest
+
+import bench_pipeline
+from bench_pipeline import WORKLOADS, compare, run_http, run_workload, to_baseline
+
+
+@pytest.fixture(scope="module")
+def octagon():
+    return run_workload(WORKLOADS["octagon"], repeat=1)
+
+
+def test_workload_reports_every_stage(octagon):
+    assert list(octagon.stages) == ["parse", "interpret", "densify", "build", "encode_pes"]
+    assert octagon.points == 9 and octagon.stitches > octagon.points
+    assert octagon.stitches_per_s > 0
+    assert all(stage.seconds >= 0 and stage.peak_mb >= 0 for stage in octagon.stages.values())
+
+
+def test_baseline_comparison_flags_slowdowns(octagon):
+    lines = []
+    baseline = json.loads(json.dumps(to_baseline([octagon], {})))
+    assert compare([octagon], {}, baseline, 1e9, lines.append) == 0
+
+    for stage in baseline["workloads"]["octagon"]["stages"].values():
+        stage["seconds"] /= 1e6
+    assert compare([octagon], {}, baseline, 1.25, lines.append) == len(octagon.stages)
+    assert lines[-1].endswith("REGRESSION")
+
+
+def test_http_latency_percentiles():
+    stats = run_http([WORKLOADS["octagon"]], requests=3)
+    assert stats and all(s["p50_ms"] <= s["p90_ms"] <= s["p99_ms"] for s in stats.values())
+
+
+def test_cli_saves_and_compares_a_baseline(tmp_path, capsys):
+    path = str(tmp_path / "baseline.json")
+    assert bench_pipeline.main(["-w", "octagon", "--repeat", "1", "--save-baseline", path]) == 0
+    with open(path) as handle:
+        assert "octagon" in json.load(handle)["workloads"]
+    assert bench_pipeline.main(["-w", "octagon", "--repeat", "1", "--baseline", path, "--threshold", "1e9"]) == 0
+    assert "vs baseline" in capsys.readouterr().out
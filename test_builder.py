@@ -0,0 +1,109 @@
+"""Stitch blocks and export paths of PyEmbroideryBuilder."""
+
+import io
+import tempfile
+
+import pytest
+from pyembroidery import JUMP, STITCH, TRIM
+
+from api_backend import script_to_commands, trace
+from test_class_pyembr import PyEmbroideryBuilder
+
+SQUARE = [(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 10.0), (0.0, 0.0)]
+
+
+def _builder(**kwargs) -> PyEmbroideryBuilder:
+    return PyEmbroideryBuilder(1.0, 3.0, points=SQUARE, colors=["#000000"], **kwargs)
+
+
+def test_export_bytes_stays_in_memory(monkeypatch):
+    def no_disk(*args, **kwargs):
+        raise AssertionError("export touched the filesystem")
+
+    monkeypatch.setattr(tempfile, "TemporaryDirectory", no_disk)
+    monkeypatch.setattr(tempfile, "NamedTemporaryFile", no_disk)
+    pes, png = _builder().export_bytes()
+    assert pes.startswith(b"#PES")
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+
+
+def test_streams_and_files_carry_the_same_bytes(tmp_path):
+    builder = _builder()
+    pes, png = builder.export_bytes()
+
+    pes_stream, png_stream = builder.export_streams()
+    assert (pes_stream.read(), png_stream.read()) == (pes, png)
+
+    pes_out, png_out = io.BytesIO(), io.BytesIO()
+    builder.write_to(pes_stream=pes_out, png_stream=png_out)
+    assert (pes_out.getvalue(), png_out.getvalue()) == (pes, png)
+
+    builder.export_files(str(tmp_path / "design.pes"), str(tmp_path / "design.png"))
+    assert (tmp_path / "design.pes").read_bytes() == pes
+    assert (tmp_path / "design.png").read_bytes() == png
+
+
+def test_write_to_accepts_a_single_stream():
+    builder = _builder()
+    out = io.BytesIO()
+    builder.write_to(png_stream=out)
+    assert out.getvalue() == builder.export_bytes()[1]
+
+
+def test_export_needs_two_points():
+    with pytest.raises(ValueError, match="two points"):
+        PyEmbroideryBuilder(1.0, 3.0, points=[(0.0, 0.0)]).export_bytes()
+
+
+def _islands(**kwargs) -> PyEmbroideryBuilder:
+    turtle = trace(script_to_commands("pendown()\nforward(10)\npenup()\nforward(50)\npendown()\nforward(10)"))
+    assert turtle.breaks == [2]
+    return PyEmbroideryBuilder(1.0, 3.0, points=turtle.points.array.tolist(), breaks=turtle.breaks, **kwargs)
+
+
+def test_pen_up_travel_is_one_jump():
+    builder = _islands(trim_mm=None)
+    pattern = builder.build_pattern()
+    assert builder.jumps == [5]
+    assert pattern.count_stitch_commands(JUMP) == 1
+    assert pattern.count_stitch_commands(TRIM) == 0
+    assert pattern.count_stitch_commands(STITCH) == 10
+
+    sewn_across = PyEmbroideryBuilder(1.0, 3.0, points=builder.points).build_pattern()
+    assert sewn_across.count_stitch_commands(STITCH) > 20
+
+
+@pytest.mark.parametrize("trim_mm, trims", [(10.0, 1), (50.0, 0)])
+def test_long_jumps_are_trimmed(trim_mm, trims):
+    assert _islands(trim_mm=trim_mm).build_pattern().count_stitch_commands(TRIM) == trims
+
+
+def test_each_format_is_encoded_once_per_pattern(monkeypatch):
+    import pyembroidery
+
+    calls = []
+    write_dst = pyembroidery.write_dst
+
+    def counting(pattern, stream):
+        calls.append(pattern)
+        write_dst(pattern, stream)
+
+    monkeypatch.setattr(pyembroidery, "write_dst", counting)
+    builder = _builder()
+    encoded = builder.encode_all(["dst", "jef"])
+    assert set(encoded) == {"dst", "jef"}
+    assert builder.encode("DST") is encoded["dst"]
+    assert len(calls) == 1
+
+    builder.build_pattern()
+    builder.encode("dst")
+    assert len(calls) == 2 and calls[1] is builder.pattern
+
+
+def test_save_picks_the_format_from_the_extension(tmp_path):
+    builder = _builder()
+    builder.save(str(tmp_path / "design.jef"), str(tmp_path / "design.svg"))
+    assert (tmp_path / "design.jef").read_bytes() == builder.encode("jef")
+    assert (tmp_path / "design.svg").read_bytes().startswith(b"<svg")
+    with pytest.raises(ValueError, match="unsupported format"):
+        builder.encode("gif")
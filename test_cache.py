@@ -0,0 +1,45 @@
+"""Result cache: content keys, LRU tiers and the disk size budget."""
+
+import time
+
+from embroidery_cache import ResultCache, cache_key
+from embroidery_points import PointBuffer
+
+
+def _result(size: int) -> dict:
+    return {"pes": b"x" * size, "centered_points": PointBuffer.coerce([(0.0, 0.0), (1.0, 2.0)]), "stitch_count": 2}
+
+
+def test_key_ignores_dict_order():
+    program = [{"op": "forward", "value": 1.0}]
+    assert cache_key(program, 1.0, 3.0, {"a": 1, "b": 2}) == cache_key(program, 1.0, 3.0, {"b": 2, "a": 1})
+
+
+def test_disk_entries_survive_a_restart(tmp_path):
+    ResultCache(disk_dir=tmp_path).put("k", _result(10))
+    result = ResultCache(disk_dir=tmp_path).get("k")
+    assert result["pes"] == b"x" * 10
+    assert result["centered_points"].tolist() == [(0.0, 0.0), (1.0, 2.0)]
+
+
+def test_disk_tier_stays_within_budget(tmp_path):
+    cache = ResultCache(max_entries=1, disk_dir=tmp_path, max_disk_bytes=5_000)
+    for i in range(20):
+        cache.put(f"k{i}", _result(1_000))
+    assert cache.snapshot()["disk_bytes"] <= 5_000
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) == cache.snapshot()["disk_bytes"]
+    assert cache.get("k19") is not None and cache.get("k0") is None
+
+    # A restart indexes the same entries, least recently used first.
+    reopened = ResultCache(disk_dir=tmp_path, max_disk_bytes=5_000)
+    assert reopened.snapshot()["disk_bytes"] == cache.snapshot()["disk_bytes"]
+
+
+def test_puts_do_not_rescan_the_disk(tmp_path):
+    cache = ResultCache(max_entries=1, disk_dir=tmp_path, max_disk_bytes=200_000)
+    for i in range(500):
+        cache.put(f"warm{i}", _result(100))
+    start = time.perf_counter()
+    for i in range(100):
+        cache.put(f"k{i}", _result(100))
+    assert time.perf_counter() - start < 1.0
@@ -3,41 +3,179 @@
 The class here mirrors the ad-hoc logic that previously lived across
 ``api_backend`` and ``embroidery_turtle`` but consolidates it so centering
 rules stay consistent everywhere.
+
+Output formats come from :data:`EXPORT_FORMATS`. Each artifact is encoded
+on first request and memoized on the builder, so asking for several formats
+builds the pattern once and encodes each format at most once.
 """
 
+import io
 import os
-import tempfile
 from dataclasses import dataclass, field
-from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
 
+from embroidery_density import DEFAULT_CELL_MM, HOTSPOT_PER_MM2, DensityReport, analyze_density, thin_stitches
+from embroidery_metrics import StageTimings, timed
+from embroidery_points import PointBuffer
 from embroidery_utils import (
+    add_stitch_blocks,
     center_points_with_offset,
     center_stitches,
+    densified_count,
     densify_points,
     finish_pattern,
+    points_to_stitch_array,
+    simplify_points,
+    split_blocks,
 )
-from pyembroidery import EmbPattern, write_pes, write_png
+
+if TYPE_CHECKING:
+    # Imported lazily at runtime; see embroidery_utils.
+    from pyembroidery import EmbPattern
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    name: str  # also the file extension
+    writer: str  # pyembroidery ``write_*`` function, looked up on first use
+    media_type: str
+    description: str
+
+
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    f.name: f
+    for f in (
+        ExportFormat("pes", "write_pes", "application/octet-stream", "Brother / Baby Lock"),
+        ExportFormat("png", "write_png", "image/png", "stitch preview image"),
+        ExportFormat("dst", "write_dst", "application/octet-stream", "Tajima"),
+        ExportFormat("jef", "write_jef", "application/octet-stream", "Janome"),
+        ExportFormat("exp", "write_exp", "application/octet-stream", "Melco"),
+        ExportFormat("vp3", "write_vp3", "application/octet-stream", "Pfaff / Husqvarna Viking"),
+        ExportFormat("pec", "write_pec", "application/octet-stream", "Brother (older machines)"),
+        ExportFormat("u01", "write_u01", "application/octet-stream", "Barudan"),
+        ExportFormat("xxx", "write_xxx", "application/octet-stream", "Singer"),
+        ExportFormat("svg", "write_svg", "image/svg+xml", "vector preview"),
+    )
+}
+
+
+def export_format(name: str) -> ExportFormat:
+    try:
+        return EXPORT_FORMATS[name.lower()]
+    except KeyError:
+        raise ValueError(f"unsupported format: {name}") from None
 
 
 @dataclass
 class PyEmbroideryBuilder:
     scale_mm: float
     max_stitch_mm: float
-    points: List[Tuple[float, float]] = field(default_factory=list)
-    centered_points: List[Tuple[float, float]] = field(default_factory=list)
+    # Any point sequence; centered points and stitches are kept as compact
+    # float64 / int32 buffers and only become tuples inside pyembroidery.
+    points: Sequence[Tuple[float, float]] = field(default_factory=list)
+    centered_points: PointBuffer = field(default_factory=PointBuffer)
     center_offset: Tuple[float, float] = (0.0, 0.0)
-    stitches: List[Tuple[int, int]] = field(default_factory=list)
-    pattern: Optional[EmbPattern] = None
-
-    def _build_stitches(self) -> List[Tuple[int, int]]:
+    stitches: PointBuffer = field(default_factory=lambda: PointBuffer(dtype=np.int32))
+    pattern: Optional["EmbPattern"] = None
+    vectorized: bool = True
+    # Indices into ``points`` where a new pen-down block starts; the travel
+    # into each block becomes a JUMP (preceded by a TRIM when longer than
+    # ``trim_mm``) instead of sewn stitches.
+    breaks: List[int] = field(default_factory=list)
+    trim_mm: Optional[float] = 10.0
+    jumps: List[int] = field(default_factory=list)
+    centered_breaks: List[int] = field(default_factory=list)  # breaks into ``centered_points``
+    # Thread per block (``len(breaks) + 1`` entries, see embroidery_threads);
+    # empty for a single-colour design.
+    colors: List[Optional[str]] = field(default_factory=list)
+    # Simplification before densification (all in mm; 0/False disables).
+    min_stitch_mm: float = 0.0
+    simplify_mm: float = 0.0
+    merge_collinear: bool = False
+    points_removed: int = 0
+    stitches_removed: int = 0
+    # Density report of the last build; cells denser than ``max_density``
+    # stitches/mm² are thinned when it is set (0 keeps every stitch).
+    density_cell_mm: float = DEFAULT_CELL_MM
+    max_density: float = 0.0
+    density: Optional[DensityReport] = None
+    # ``(dense, landed)`` of the uncentered ``points`` computed elsewhere (an
+    # edit session); used unless simplification rewrites the points first.
+    densified: Optional[Tuple[np.ndarray, np.ndarray]] = field(default=None, repr=False)
+    # Encoded artifacts by format name, valid for the current ``pattern``.
+    encoded: Dict[str, bytes] = field(default_factory=dict, repr=False)
+
+    def _build_stitches(self) -> PointBuffer:
         if len(self.points) < 2:
             raise ValueError("At least two points are required to make stitches")
 
-        self.centered_points, self.center_offset = center_points_with_offset(self.points)
+        points, breaks = self._simplify()
+        self.centered_breaks = list(breaks)
+        if self.vectorized:
+            return self._build_stitches_vectorized(points, breaks)
+        return self._build_stitches_reference(points, breaks)
+
+    def _simplify(self) -> Tuple[Sequence[Tuple[float, float]], List[int]]:
+        self.points_removed = self.stitches_removed = 0
+        if not (self.min_stitch_mm > 0 or self.simplify_mm > 0 or self.merge_collinear):
+            return self.points, self.breaks
+
+        points, breaks = simplify_points(
+            self.points,
+            self.breaks,
+            min_length=self.min_stitch_mm / self.scale_mm,
+            tolerance=self.simplify_mm / self.scale_mm,
+            merge_collinear=self.merge_collinear,
+        )
+        max_step_units = self.max_stitch_mm / self.scale_mm
+        self.points_removed = len(self.points) - len(points)
+        self.stitches_removed = densified_count(self.points, max_step_units, self.breaks) - densified_count(
+            points, max_step_units, breaks
+        )
+        return points, breaks
+
+    def _build_stitches_vectorized(self, points, breaks) -> PointBuffer:
+        centered, self.center_offset, stitches, self.jumps = points_to_stitch_array(
+            points,
+            scale_mm=self.scale_mm,
+            max_stitch_mm=self.max_stitch_mm,
+            breaks=breaks,
+            densified=self.densified if points is self.points else None,
+        )
+        self.centered_points = PointBuffer.from_array(centered)
+        self.stitches = PointBuffer.from_array(stitches)
+        return self.stitches
+
+    def _check_density(self, stitches: PointBuffer) -> PointBuffer:
+        threshold = self.max_density or HOTSPOT_PER_MM2
+        self.density = analyze_density(stitches.array, self.density_cell_mm, threshold)
+        if not (self.max_density > 0 and self.density.dense_cells):
+            return stitches
+
+        thinned, self.jumps, removed = thin_stitches(
+            stitches.array, self.jumps, self.density_cell_mm, self.max_density, self.max_stitch_mm
+        )
+        before = self.density.max_per_mm2
+        self.stitches = PointBuffer.from_array(thinned)
+        self.density = analyze_density(thinned, self.density_cell_mm, threshold)
+        self.density.stitches_thinned = removed
+        self.density.max_per_mm2_before = before
+        return self.stitches
+
+    def _build_stitches_reference(self, points, breaks) -> PointBuffer:
+        """Pure-Python pipeline kept as the reference for the array path."""
+
+        centered_points, self.center_offset = center_points_with_offset(list(points))
 
         max_step_units = self.max_stitch_mm / self.scale_mm
-        dense_points = densify_points(self.centered_points, max_step_units=max_step_units)
+        dense_points: List[Tuple[float, float]] = []
+        self.jumps = []
+        for block in split_blocks(centered_points, breaks):
+            if dense_points:
+                self.jumps.append(len(dense_points))
+            dense_points.extend(densify_points(block, max_step_units=max_step_units))
 
         stitches: List[Tuple[int, int]] = []
         for x, y in dense_points:
@@ -45,38 +183,70 @@ class PyEmbroideryBuilder:
             ey = int(round(-y * self.scale_mm))  # invert y
             stitches.append((ex, ey))
 
-        centered = center_stitches(stitches)
-        self.stitches = centered
-        return centered
-
-    def build_pattern(self) -> EmbPattern:
-        centered_stitches = self._build_stitches()
-        pattern = EmbPattern()
-        pattern.add_block(centered_stitches)
-        self.pattern = finish_pattern(pattern)
+        self.centered_points = PointBuffer.coerce(centered_points)
+        self.stitches = PointBuffer.coerce(center_stitches(stitches), dtype=np.int32)
+        return self.stitches
+
+    def build_pattern(self, timings: Optional[StageTimings] = None) -> "EmbPattern":
+        from pyembroidery import EmbPattern
+
+        with timed(timings, "densify"):
+            centered_stitches = self._build_stitches()
+        with timed(timings, "density"):
+            centered_stitches = self._check_density(centered_stitches)
+        with timed(timings, "pattern"):
+            pattern = EmbPattern()
+            add_stitch_blocks(pattern, centered_stitches, self.jumps, trim_distance=self.trim_mm, colors=self.colors)
+            self.pattern = finish_pattern(pattern)
+        self.encoded.clear()
         return self.pattern
 
-    def ensure_pattern(self) -> EmbPattern:
+    def ensure_pattern(self) -> "EmbPattern":
         if self.pattern is None:
             return self.build_pattern()
         return self.pattern
 
+    def encode(self, name: str) -> bytes:
+        """Bytes of the pattern in format ``name``, encoded once per pattern."""
+
+        name = name.lower()
+        data = self.encoded.get(name)
+        if data is None:
+            import pyembroidery
+
+            spec = export_format(name)
+            pattern = self.ensure_pattern()
+            stream = io.BytesIO()
+            getattr(pyembroidery, spec.writer)(pattern, stream)
+            data = self.encoded[name] = stream.getvalue()
+        return data
+
+    def encode_all(self, names: Iterable[str]) -> Dict[str, bytes]:
+        return {name: self.encode(name) for name in names}
+
+    def save(self, *filenames: str) -> None:
+        """Write one file per name, picking the format from its extension."""
+
+        for filename in filenames:
+            data = self.encode(os.path.splitext(filename)[1].lstrip("."))
+            with open(filename, "wb") as handle:
+                handle.write(data)
+
     def export_files(self, pes_filename: str, png_filename: str) -> None:
-        pattern = self.ensure_pattern()
-        write_pes(pattern, pes_filename)
-        write_png(pattern, png_filename)
+        self.save(pes_filename, png_filename)
 
-    def export_bytes(self) -> Tuple[bytes, bytes]:
-        pattern = self.ensure_pattern()
+    def write_to(self, pes_stream: Optional[BinaryIO] = None, png_stream: Optional[BinaryIO] = None) -> None:
+        """Write PES and/or PNG into already-open binary streams."""
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            pes_path = os.path.join(tmpdir, "design.pes")
-            png_path = os.path.join(tmpdir, "design.png")
+        if pes_stream is not None:
+            pes_stream.write(self.encode("pes"))
+        if png_stream is not None:
+            png_stream.write(self.encode("png"))
 
-            write_pes(pattern, pes_path)
-            write_png(pattern, png_path)
+    def export_streams(self) -> Tuple[io.BytesIO, io.BytesIO]:
+        """Return in-memory PES/PNG buffers rewound for reading."""
 
-            pes_bytes = Path(pes_path).read_bytes()
-            png_bytes = Path(png_path).read_bytes()
+        return io.BytesIO(self.encode("pes")), io.BytesIO(self.encode("png"))
 
-        return pes_bytes, png_bytes
+    def export_bytes(self) -> Tuple[bytes, bytes]:
+        return self.encode("pes"), self.encode("png")
@@ -0,0 +1,64 @@
+"""Stitch density analysis and thinning."""
+
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from embroidery_density import analyze_density, thin_stitches
+from test_class_pyembr import PyEmbroideryBuilder
+
+
+def _cell_counts(pts: np.ndarray, cell_mm: float) -> Counter:
+    return Counter(map(tuple, np.floor(pts / cell_mm).astype(int).tolist()))
+
+
+@pytest.mark.parametrize("spread", [10.0, 1e7])  # a dense grid, then hashed cells
+def test_counts_match_a_plain_count(spread):
+    rng = np.random.default_rng(7)
+    centres = rng.uniform(-spread, spread, size=(50, 2))
+    pts = np.repeat(centres, rng.integers(1, 40, size=50), axis=0)
+    pts += rng.normal(scale=1.5, size=pts.shape)
+    report = analyze_density(pts, cell_mm=2.0, threshold_per_mm2=1.0)
+
+    counts = _cell_counts(pts, 2.0)
+    assert report.cells == len(counts)
+    assert report.max_per_mm2 == round(max(counts.values()) / 4.0, 3)
+    assert report.mean_per_mm2 == round(len(pts) / (len(counts) * 4.0), 3)
+    assert report.dense_cells == sum(count > 4 for count in counts.values())
+
+
+def test_hotspots_are_the_densest_cells():
+    pts = np.array([(0.5, 0.5)] * 30 + [(10.5, 10.5)] * 50 + [(20.5, 0.5)] * 2, dtype=float)
+    report = analyze_density(pts, cell_mm=1.0, threshold_per_mm2=10.0, max_hotspots=5)
+    assert [(h.x_mm, h.y_mm, h.stitches) for h in report.hotspots] == [(10.5, 10.5, 50), (0.5, 0.5, 30)]
+    assert report.as_dict()["dense_cells"] == 2
+    assert analyze_density([]).cells == 0
+
+
+def test_thinning_keeps_ends_and_stitch_length():
+    # Back and forth over the same 2 mm, twice, as two blocks.
+    line = [(x % 20 if (x // 20) % 2 == 0 else 20 - x % 20, 0) for x in range(200)]
+    pts = np.array(line + [(x + 50, y) for x, y in line], dtype=float) / 10.0
+    jumps = [200]
+    thinned, new_jumps, removed = thin_stitches(pts, jumps, cell_mm=1.0, max_per_mm2=20.0, max_stitch=0.3)
+
+    assert removed == len(pts) - len(thinned) > 100
+    assert new_jumps[0] < 200 and (thinned[new_jumps[0]] == pts[200]).all()
+    assert (thinned[[0, -1]] == pts[[0, -1]]).all()
+    assert (thinned[new_jumps[0] - 1] == pts[199]).all()
+    blocks = np.split(thinned, new_jumps)
+    assert max(np.hypot(*np.diff(block, axis=0).T).max() for block in blocks) <= 0.3 + 1e-12
+    assert analyze_density(thinned, 1.0).max_per_mm2 < analyze_density(pts, 1.0).max_per_mm2
+
+
+def test_builder_thins_dense_designs():
+    rosette = []
+    for turn in range(36):
+        heading = math.radians(turn * 10)
+        rosette += [(t * math.cos(heading), t * math.sin(heading)) for t in (0.0, 5.0, 0.0)]
+    builder = PyEmbroideryBuilder(1.0, 0.5, points=rosette, max_density=8.0)
+    builder.build_pattern()
+    assert builder.density.stitches_thinned > 0
+    assert builder.density.max_per_mm2 < builder.density.max_per_mm2_before
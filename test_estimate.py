@@ -0,0 +1,15 @@
+"""The static cost estimate bounds real exports without overcharging travel."""
+
+from api_backend import generate_result, normalize_program, script_to_commands
+from embroidery_estimate import INLINE, AdmissionPolicy, estimate_cost
+
+PEN_UP_HEAVY = "for i in range(3000):\n    pendown()\n    forward(1)\n    penup()\n    forward(149)\n    left(179)"
+
+
+def test_pen_up_travel_is_charged_as_jumps():
+    program = normalize_program(script_to_commands(PEN_UP_HEAVY))
+    estimate = estimate_cost(program, 10.0, 3.0)
+    stitches = generate_result(program, 10.0, 3.0, outputs=["points"])["stitch_count"]
+
+    assert stitches <= estimate.stitches < 2 * stitches
+    assert AdmissionPolicy().route(estimate) == (INLINE, None)
@@ -0,0 +1,68 @@
+"""Scanline fills and satin columns."""
+
+import numpy as np
+import pytest
+
+from api_backend import script_to_commands, trace
+from embroidery_fill import FillSettings, row_count, satin_column, scanline_spans, tatami_fill
+
+SQUARE = [(0, 0), (10, 0), (10, 10), (0, 10)]
+# A U open at the top: arms 0..3 and 7..10 wide, joined below y = 3.
+U_SHAPE = [(0, 0), (10, 0), (10, 10), (7, 10), (7, 3), (3, 3), (3, 10), (0, 10)]
+
+
+def test_square_rows_span_the_width():
+    rows, spans = scanline_spans(SQUARE, spacing=1.0)
+    np.testing.assert_allclose(rows, np.arange(0.5, 10, 1.0))
+    assert len(rows) == row_count(SQUARE, 1.0) == 10
+    np.testing.assert_allclose(spans, np.column_stack((np.arange(10), np.zeros(10), np.full(10, 10.0))))
+
+
+def test_concave_rows_split_into_two_spans():
+    rows, spans = scanline_spans(U_SHAPE, spacing=1.0)
+    per_row = np.bincount(spans[:, 0].astype(int), minlength=len(rows))
+    assert per_row.tolist() == [1, 1, 1] + [2] * 7
+    np.testing.assert_allclose(spans[-2:, 1:], [[0, 3], [7, 10]])
+
+
+def _area(spans: np.ndarray, spacing: float) -> float:
+    return float((spans[:, 2] - spans[:, 1]).sum() * spacing)
+
+
+def test_rotated_rows_cover_the_same_area():
+    _, flat = scanline_spans(SQUARE, spacing=0.1)
+    _, turned = scanline_spans(SQUARE, spacing=0.1, angle=45)
+    assert _area(flat, 0.1) == pytest.approx(100, rel=0.01)
+    assert _area(turned, 0.1) == pytest.approx(100, rel=0.02)
+
+
+def test_tatami_stitches_stay_short_and_inside():
+    blocks = tatami_fill(U_SHAPE, spacing=0.5, stitch=1.5)
+    assert len(blocks) == 2  # the base sews on into the left arm
+    for block in blocks:
+        steps = np.hypot(*np.diff(block, axis=0).T)
+        assert steps.max() <= 1.5
+        assert block.min() >= 0 and block.max() <= 10
+        inside_gap = (block[:, 0] > 3) & (block[:, 0] < 7) & (block[:, 1] > 3)
+        assert not inside_gap.any()
+
+
+def test_satin_zig_zags_across_the_segment():
+    points, side = satin_column((0, 0), (10, 0), width=2.0, spacing=1.0)
+    assert len(points) == 10
+    np.testing.assert_allclose(points[:, 0], np.arange(1, 11))
+    np.testing.assert_allclose(points[:, 1], [1, -1] * 5)
+    assert side == 1
+    assert satin_column((0, 0), (0, 0), 2.0, 1.0, side=-1)[1] == -1
+
+
+def test_dsl_fills_and_satins_become_blocks():
+    fill = FillSettings(spacing=0.5, stitch=1.5)
+    script = "pendown()\nforward(5)\nbegin_fill()\nfor _ in range(4):\n    forward(10)\n    left(90)\nend_fill()\nforward(3)"
+    filled = trace(script_to_commands(script), fill=fill)
+    # The outline, then the fill as its own block, then a new block after it.
+    assert len(filled.breaks) == 2
+    assert filled.breaks[1] - filled.breaks[0] > 40
+
+    satin = trace(script_to_commands("pendown()\nsatin(2)\nforward(10)"), fill=fill)
+    assert np.abs(satin.points.array[1:, 1]).max() == pytest.approx(1.0)
@@ -0,0 +1,68 @@
+"""ETags, conditional requests and response compression."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from embroidery_http import choose_encoding, etag_matches, parse_if_none_match, request_tag
+
+client = TestClient(server.app)
+BODY = {"script": "pendown()\nfor _ in range(400):\n    forward(3)\n    left(91)", "inline": True}
+
+
+def test_request_tags_ignore_key_order():
+    assert request_tag("v1", {"a": 1, "b": 2}) == request_tag("v1", {"b": 2, "a": 1})
+    assert request_tag("v1", {"a": 1}) != request_tag("v2", {"a": 1})
+
+
+def test_if_none_match_parsing():
+    assert parse_if_none_match('W/"a", "b" ,c') == ["a", "b", "c"]
+    assert etag_matches('W/"x-1"', '"x-1"')
+    assert etag_matches("*", '"anything"')
+    assert not etag_matches(None, '"x-1"')
+
+
+@pytest.mark.parametrize(
+    "header, brotli, expected",
+    [("gzip, br", True, "br"), ("gzip, br", False, "gzip"), ("br;q=0, gzip", True, "gzip"), ("identity", True, None), ("*", False, "gzip")],
+)
+def test_encoding_negotiation(header, brotli, expected):
+    assert choose_encoding(header, brotli) == expected
+
+
+def test_unchanged_export_is_304_without_running(monkeypatch):
+    first = client.post("/export_script", json=BODY)
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    async def fail(*args, **kwargs):
+        raise AssertionError("the pipeline ran for a cached export")
+
+    monkeypatch.setattr(server, "_admitted_export", fail)
+    again = client.post("/export_script", json=BODY, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.headers["etag"].removeprefix("W/") == etag.removeprefix("W/")
+
+
+def test_changed_settings_get_a_new_tag():
+    first = client.post("/export_script", json=BODY)
+    other = client.post("/export_script", json={**BODY, "max_stitch_mm": 2.0}, headers={"If-None-Match": first.headers["etag"]})
+    assert other.status_code == 200
+    assert other.headers["etag"] != first.headers["etag"]
+
+
+def test_artifacts_revalidate_by_design_id():
+    body = client.post("/export_script", json={"script": BODY["script"]}).json()
+    pes = client.get(body["pes_url"])
+    assert "immutable" in pes.headers["cache-control"]
+    assert client.get(body["pes_url"], headers={"If-None-Match": pes.headers["etag"]}).status_code == 304
+
+
+def test_large_bodies_are_compressed():
+    response = client.post("/export_script", json=BODY, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].startswith("W/")
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json()["stitch_count"] > 0
+
+    png = client.get(f"/export/{response.json()['id']}.png", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in png.headers
@@ -0,0 +1,98 @@
+"""JobQueue lifecycle: results, failures, the pending bound, timeouts and cancellation."""
+
+import asyncio
+import math
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from embroidery_jobs import CANCELLED, DONE, FAILED, TIMEOUT, JobQueue, QueueFull
+
+
+def _run(queue: JobQueue, scenario):
+    async def main():
+        try:
+            return await scenario(queue)
+        finally:
+            queue.shutdown()
+
+    return asyncio.run(main())
+
+
+def test_run_returns_the_worker_result():
+    async def scenario(queue):
+        return await queue.run(pow, 2, 10)
+
+    assert _run(JobQueue(max_workers=1), scenario) == 1024
+
+
+def test_jobs_finish_done_or_failed():
+    stored = []
+
+    async def scenario(queue):
+        ok = queue.submit(pow, 3, 4, on_success=stored.append)
+        bad = queue.submit(math.sqrt, -1.0)
+        await ok.wait(30)
+        await bad.wait(30)
+        return ok, bad
+
+    ok, bad = _run(JobQueue(max_workers=1), scenario)
+    assert (ok.status, ok.result, stored) == (DONE, 81, [81])
+    assert bad.status == FAILED and "math domain error" in bad.error
+    assert ok.finished is not None
+
+
+def test_full_queue_rejects_new_jobs():
+    async def scenario(queue):
+        running = queue.submit(time.sleep, 2)
+        with pytest.raises(QueueFull):
+            queue.submit(time.sleep, 0)
+        queue.cancel(running.id)
+        return running
+
+    running = _run(JobQueue(max_workers=1, max_pending=1), scenario)
+    assert running.status == CANCELLED
+
+
+def test_queued_job_can_be_cancelled():
+    async def scenario(queue):
+        first = queue.submit(time.sleep, 1)
+        second = queue.submit(pow, 2, 2)
+        queue.cancel(second.id)
+        await first.wait(30)
+        return first, second
+
+    first, second = _run(JobQueue(max_workers=1), scenario)
+    assert first.status == DONE
+    assert second.status == CANCELLED and second.result is None
+
+
+def test_slow_jobs_time_out():
+    async def scenario(queue):
+        job = queue.submit(time.sleep, 5)
+        await job.wait(30)
+        with pytest.raises(TimeoutError):
+            await queue.run(time.sleep, 5)
+        return job
+
+    job = _run(JobQueue(max_workers=2, timeout_s=0.5), scenario)
+    assert job.status == TIMEOUT
+
+
+def test_finished_jobs_are_pruned():
+    queue = JobQueue(max_finished=2)
+    jobs = [queue.completed(n) for n in range(4)]
+    assert list(queue.jobs) == [job.id for job in jobs[2:]]
+
+
+def test_small_designs_finish_on_submit():
+    client = TestClient(server.app)
+    response = client.post("/jobs", json={"script": "pendown()\nforward(10)"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == DONE
+    assert client.get(body["status_url"]).json()["pes_url"] == body["pes_url"]
+    assert client.get("/jobs/unknown").status_code == 404
+    assert client.delete("/jobs/unknown").status_code == 404
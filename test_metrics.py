@@ -0,0 +1,56 @@
+"""Stage timings, the metrics registry and their HTTP exposure."""
+
+from fastapi.testclient import TestClient
+
+import server
+from embroidery_metrics import MetricsRegistry, StageTimings, count, timed
+
+
+def test_stages_accumulate_in_order():
+    timings = StageTimings()
+    for name in ("parse", "densify", "parse"):
+        with timings.stage(name):
+            pass
+    timings.count("points", 3)
+    timings.count("points")
+    assert list(timings.stages) == ["parse", "densify"]
+    assert timings.counters == {"points": 4}
+    assert timings.server_timing().startswith("parse;dur=")
+    assert set(timings.as_dict()) == {"stages_ms", "counters"}
+
+
+def test_helpers_are_no_ops_without_timings():
+    with timed(None, "parse"):
+        count(None, "points", 5)
+
+
+def test_registry_renders_cumulative_buckets():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 5.0):
+        timings = StageTimings()
+        timings.stages["densify"] = seconds
+        timings.count("stitches", 10)
+        registry.observe(timings)
+    registry.count_request("/export", "ok")
+    registry.count_request("/export", "ok")
+
+    text = registry.render({"cache_entries": 2})
+    assert 'embroidery_stage_duration_seconds_bucket{stage="densify",le="0.1"} 1' in text
+    assert 'embroidery_stage_duration_seconds_bucket{stage="densify",le="1.0"} 2' in text
+    assert 'embroidery_stage_duration_seconds_bucket{stage="densify",le="+Inf"} 3' in text
+    assert 'embroidery_stage_duration_seconds_count{stage="densify"} 3' in text
+    assert 'embroidery_requests_total{route="/export",outcome="ok"} 2' in text
+    assert "embroidery_stitches_total 30" in text
+    assert "embroidery_cache_entries 2" in text
+
+
+def test_exports_report_timings_and_feed_metrics():
+    client = TestClient(server.app)
+    response = client.post("/export_script", json={"script": "pendown()\nforward(17)", "timings": True})
+    assert response.status_code == 200
+    assert "interpret;dur=" in response.headers["server-timing"]
+    assert response.json()["timings"]["counters"]["stitches"] > 0
+
+    metrics = client.get("/metrics").text
+    assert 'embroidery_requests_total{route="/export_script",outcome="ok"}' in metrics
+    assert 'embroidery_stage_duration_seconds_count{stage="interpret"}' in metrics
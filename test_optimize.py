@@ -0,0 +1,38 @@
+"""Travel optimization keeps every block and respects its time budget."""
+
+import time
+
+import numpy as np
+
+from embroidery_optimize import optimize_blocks, travel_distance
+
+
+def _blocks(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 1000, (2 * n, 2)), list(range(2, 2 * n, 2))
+
+
+def _segments(points):
+    """Each two-point block as a direction-free tuple, sorted."""
+
+    pairs = np.sort(np.asarray(points).reshape(-1, 2, 2), axis=1).reshape(-1, 4)
+    return sorted(map(tuple, pairs.tolist()))
+
+
+def test_reorders_whole_blocks_and_shortens_travel():
+    points, breaks = _blocks(300)
+    new_points, new_breaks, report = optimize_blocks(points, breaks, time_budget_s=5.0)
+
+    assert _segments(new_points) == _segments(points)
+    assert new_breaks == breaks
+    assert report.after == travel_distance(new_points, new_breaks) < report.before
+    assert not report.timed_out
+
+
+def test_large_designs_stay_within_the_budget():
+    points, breaks = _blocks(100_000)
+    for allow_reverse in (True, False):
+        start = time.perf_counter()
+        _, _, report = optimize_blocks(points, breaks, allow_reverse=allow_reverse, time_budget_s=0.2)
+        assert time.perf_counter() - start < 3 * 0.2 + 0.5
+        assert report.timed_out
@@ -0,0 +1,62 @@
+"""PointBuffer storage semantics."""
+
+import pickle
+
+import numpy as np
+
+from embroidery_points import _STAGE_SIZE, PointBuffer, point_array
+
+
+def test_appends_and_extends_keep_order_across_flushes():
+    buffer = PointBuffer(capacity=1)
+    expected = []
+    for i in range(_STAGE_SIZE + 10):
+        buffer.append(i, -i)
+        expected.append((i, -i))
+    buffer.extend([(0.5, 1.5), (2.5, 3.5)])
+    expected += [(0.5, 1.5), (2.5, 3.5)]
+    buffer.append(7, 8)
+    expected.append((7, 8))
+
+    assert len(buffer) == len(expected)
+    assert buffer.last() == (7, 8)
+    assert buffer.tolist() == expected
+    assert buffer[-1] == (7.0, 8.0)
+    assert buffer == expected
+
+
+def test_truncate_drops_staged_points_too():
+    buffer = PointBuffer.from_array([(0, 0), (1, 1)])
+    buffer.append(2, 2)
+    buffer.truncate(1)
+    assert buffer.tolist() == [(0, 0)]
+    buffer.append(3, 3)
+    assert buffer.tolist() == [(0, 0), (3, 3)]
+    buffer.truncate(10)
+    assert len(buffer) == 2
+
+
+def test_views_share_memory_until_growth():
+    array = np.arange(8, dtype=np.float64).reshape(4, 2)
+    buffer = PointBuffer.from_array(array)
+    assert np.shares_memory(buffer.array, array)
+    assert np.shares_memory(point_array(buffer), array)
+    assert not np.shares_memory(buffer.copy().array, array)
+    assert buffer[1:3] == [(2, 3), (4, 5)]
+
+
+def test_int32_stitches_are_compact():
+    stitches = PointBuffer.coerce([(1, 2), (3, 4)], dtype=np.int32)
+    assert stitches.dtype == np.int32
+    assert stitches.nbytes == 16
+    assert PointBuffer.coerce(stitches, dtype=np.int32) is stitches
+    assert PointBuffer.frombytes(stitches.tobytes(), dtype=np.int32) == stitches
+
+
+def test_pickle_round_trip_keeps_staged_points():
+    buffer = PointBuffer()
+    buffer.extend([(1, 2)])
+    buffer.append(3, 4)
+    restored = pickle.loads(pickle.dumps(buffer))
+    assert restored == buffer and restored.dtype == buffer.dtype
+    assert point_array(None).shape == (0, 2)
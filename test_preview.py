@@ -0,0 +1,61 @@
+"""Output selection and the thumbnail renderer."""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from api_backend import check_outputs, ensure_outputs, generate_result, result_to_outputs, script_to_commands
+from embroidery_preview import rasterize_polyline, render_preview
+
+PROGRAM = script_to_commands("pendown()\nforward(10)\nleft(90)\nforward(10)")
+
+
+def test_only_selected_outputs_are_encoded():
+    result = generate_result(PROGRAM, 1.0, 3.0, outputs=["PES", "points"])
+    assert "pes" in result and "png" not in result
+
+    shaped = result_to_outputs(result, ("pes",))
+    assert "pes_base64" in shaped and "centered_points" not in shaped
+
+    assert ensure_outputs(result, ("png",))
+    assert result["png"].startswith(b"\x89PNG")
+    assert not ensure_outputs(result, ("pes", "png"))
+
+
+def test_unknown_outputs_are_rejected():
+    assert check_outputs(["png", "PNG", "dst"]) == ("png", "dst")
+    with pytest.raises(ValueError, match="gif"):
+        check_outputs(["gif"])
+
+
+def test_rasterized_path_fits_the_box():
+    mask = rasterize_polyline([(0, 0), (10, 0), (10, 10)], size=32, padding=2)
+    assert mask.shape == (32, 32)
+    rows, cols = np.nonzero(mask)
+    assert (cols.min(), cols.max()) == (2, 29)
+    assert (rows.min(), rows.max()) == (2, 29)
+    assert mask[29, 2:30].all()  # the first leg runs along the bottom (Y up)
+    assert mask[2:30, 29].all()
+
+
+def test_breaks_are_not_drawn():
+    points = [(0, 0), (0, 10), (10, 0), (10, 10)]
+    joined = rasterize_polyline(points, size=16)
+    split = rasterize_polyline(points, size=16, breaks=[2])
+    assert split.sum() < joined.sum()
+    assert not split[8, 8]
+
+
+def test_line_width_thickens_the_path():
+    thin = rasterize_polyline([(0, 0), (10, 10)], size=64)
+    thick = rasterize_polyline([(0, 0), (10, 10)], size=64, line_width=3)
+    assert (thick | thin).sum() == thick.sum() > 2 * thin.sum()
+
+
+def test_preview_is_a_png_of_the_requested_size():
+    image = Image.open(io.BytesIO(render_preview([(0, 0), (5, 5)], size=48)))
+    assert image.size == (48, 48) and image.mode == "RGBA"
+    with pytest.raises(ValueError, match="size"):
+        render_preview([(0, 0), (5, 5)], size=4)
@@ -0,0 +1,81 @@
+"""HTTP-level checks of the export endpoints."""
+
+import base64
+import io
+import zipfile
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+client = TestClient(server.app)
+SCRIPT = "pendown()\nforward(10)"
+
+
+@pytest.mark.parametrize("name", ["../../evil", "a/b", ".hidden", "", "x" * 65])
+def test_batch_rejects_unsafe_names(name):
+    response = client.post("/export_batch", json={"items": [{"name": name, "script": SCRIPT}], "format": "zip"})
+    assert response.status_code == 422
+
+
+def test_batch_zip_uses_plain_names():
+    response = client.post("/export_batch", json={"items": [{"name": "star.v1", "script": SCRIPT}], "format": "zip"})
+    assert response.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+    assert sorted(names) == ["manifest.json", "star.v1.pes", "star.v1.png"]
+
+
+def test_export_rejects_designs_over_the_stitch_budget():
+    response = client.post("/export_script", json={"script": "pendown()\nforward(1e9)"})
+    assert response.status_code == 413
+    assert "stitches" in response.json()["detail"]["message"]
+
+
+def _export(**settings) -> dict:
+    response = client.post("/export_script", json={"script": SCRIPT, **settings})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_export_returns_urls_not_payloads():
+    body = _export()
+    assert "pes" not in body and "centered_points" not in body
+    assert body["pes_url"] == f"/export/{body['id']}.pes"
+
+    pes = client.get(body["pes_url"])
+    assert pes.status_code == 200
+    assert pes.headers["content-type"] == "application/octet-stream"
+    assert pes.content.startswith(b"#PES")
+
+    png = client.get(body["png_url"])
+    assert png.headers["content-type"] == "image/png"
+    assert png.content.startswith(b"\x89PNG")
+
+
+def test_points_download_matches_inline_points():
+    inline = _export(inline=True)
+    assert base64.b64decode(inline["pes_base64"]).startswith(b"#PES")
+
+    points = client.get(_export()["points_url"])
+    assert points.headers["x-point-count"] == str(len(inline["centered_points"]))
+    decoded = np.frombuffer(points.content, dtype="<f4").reshape(-1, 2)
+    np.testing.assert_allclose(decoded, inline["centered_points"], rtol=1e-6)
+
+
+@pytest.mark.parametrize("path", ["/export/nope.pes", f"/export/{'0' * 64}.points", f"/export/{'0' * 64}.gif"])
+def test_unknown_downloads_are_404(path):
+    assert client.get(path).status_code == 404
+
+
+def test_formats_are_listed_and_downloadable():
+    formats = {spec["name"]: spec for spec in client.get("/formats").json()}
+    assert {"pes", "png", "dst", "jef", "exp", "vp3", "svg"} <= set(formats)
+
+    body = _export(outputs=["dst", "points"])
+    assert body["dst_url"] == f"/export/{body['id']}.dst"
+    dst = client.get(f"/export/{body['id']}.jef")
+    assert dst.status_code == 200
+    assert dst.headers["content-type"] == formats["jef"]["media_type"]
+    assert 'filename="design.jef"' in dst.headers["content-disposition"]
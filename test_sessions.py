@@ -0,0 +1,51 @@
+"""Edit sessions export the stitches of a fresh export.
+
+A session densifies in turtle coordinates and an export densifies the
+centered points, so a segment within rounding of a whole number of stitch
+lengths can get a stitch more or fewer, and a stitch can round one unit
+the other way; everything else matches.
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from api_backend import script_to_commands, trace
+from embroidery_fill import FillSettings
+from embroidery_sessions import EditSession
+from embroidery_utils import points_to_stitch_array
+
+
+def _statement(rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.5:
+        return f"forward({rng.choice([rng.randint(1, 60), round(rng.uniform(0, 60), 2)])})"
+    if roll < 0.8:
+        return f"left({rng.randint(0, 180)})"
+    if roll < 0.9:
+        return f"goto({rng.randint(0, 90)}, {rng.randint(0, 90)})"
+    return rng.choice(["penup()", "pendown()"])
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_appends_match_fresh_export(seed):
+    rng = random.Random(seed)
+    scale_mm = rng.choice([10.0, 2.5, 1.0, 0.1])
+    max_stitch_mm = rng.choice([3.0, 1.0, 0.5, 7.3])
+    session = EditSession(scale_mm, max_stitch_mm)
+    lines = ["pendown()"]
+    for _ in range(6):
+        lines.extend(_statement(rng) for _ in range(rng.randint(1, 4)))
+        script = "\n".join(lines)
+        session.update(script)
+
+        fresh = trace(script_to_commands(script), fill=FillSettings.from_mm(scale_mm, max_stitch_mm))
+        _, center, stitches, jumps = points_to_stitch_array(fresh.points, scale_mm, max_stitch_mm, fresh.breaks)
+        _, s_center, s_stitches, s_jumps = points_to_stitch_array(
+            session.points.copy(), scale_mm, max_stitch_mm, session.breaks, densified=session.densified
+        )
+        assert center == s_center and len(jumps) == len(s_jumps)
+        assert abs(len(stitches) - len(s_stitches)) <= 2
+        if len(stitches) == len(s_stitches):
+            assert np.abs(stitches - s_stitches).max() <= 1
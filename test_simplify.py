@@ -0,0 +1,59 @@
+"""Point simplification before densification."""
+
+import math
+
+import numpy as np
+
+from embroidery_utils import simplify_points
+from test_class_pyembr import PyEmbroideryBuilder
+
+
+def _circle(n: int, radius: float = 10.0):
+    return [(radius * math.cos(2 * math.pi * i / n), radius * math.sin(2 * math.pi * i / n)) for i in range(n + 1)]
+
+
+def test_collinear_runs_merge_to_their_ends():
+    points = [(0, 0), (1, 0), (2, 0), (3, 0), (3, 1), (3, 2)]
+    simplified, _ = simplify_points(points, merge_collinear=True)
+    assert simplified.array.tolist() == [[0, 0], [3, 0], [3, 2]]
+
+
+def test_back_and_forth_is_not_collinear():
+    points = [(0, 0), (2, 0), (1, 0), (3, 0)]
+    simplified, _ = simplify_points(points, merge_collinear=True)
+    assert len(simplified) == 4
+
+
+def test_min_length_drops_micro_steps():
+    points = [(0, 0), (0.1, 0), (0.2, 0.1), (1, 0), (1.05, 0.5), (2, 2)]
+    simplified, _ = simplify_points(points, min_length=0.5)
+    steps = np.hypot(*np.diff(simplified.array[:-1], axis=0).T)
+    assert (steps >= 0.5).all()
+    assert simplified.array.tolist()[::len(simplified) - 1] == [[0, 0], [2, 2]]
+
+
+def test_tolerance_bounds_the_deviation():
+    points = _circle(3600)
+    simplified, _ = simplify_points(points, tolerance=0.05)
+    assert 20 < len(simplified) < 400
+    # Dropped points sit on arcs whose chords are the kept segments; the
+    # widest arc's sagitta is the largest deviation.
+    angles = np.unwrap(np.arctan2(simplified.array[:, 1], simplified.array[:, 0]))
+    widest = np.diff(angles).max()
+    assert 10.0 * (1 - np.cos(widest / 2)) <= 0.05 + 1e-9
+
+
+def test_block_ends_and_breaks_survive():
+    points = [(0, 0), (1, 0), (2, 0), (2, 5), (3, 5), (4, 5), (5, 5)]
+    simplified, breaks = simplify_points(points, breaks=[3], merge_collinear=True)
+    assert simplified.array.tolist() == [[0, 0], [2, 0], [2, 5], [5, 5]]
+    assert breaks == [2]
+
+
+def test_builder_reports_what_was_removed():
+    builder = PyEmbroideryBuilder(1.0, 0.5, points=_circle(3600), simplify_mm=0.05)
+    builder.build_pattern()
+    plain = PyEmbroideryBuilder(1.0, 0.5, points=_circle(3600))
+    plain.build_pattern()
+    assert builder.points_removed > 3000
+    assert builder.stitches_removed == len(plain.stitches) - len(builder.stitches) > 0
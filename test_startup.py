@@ -0,0 +1,20 @@
+"""Importing the server must not load what only an export needs."""
+
+import os
+import subprocess
+import sys
+
+HEAVY = ("pyembroidery", "PIL", "tkinter", "turtle", "multiprocessing")
+
+PROBE = "import server, sys; print(*sorted({name.split('.')[0] for name in sys.modules} & set(sys.argv[1:])))"
+
+
+def test_server_import_stays_light():
+    probe = subprocess.run(
+        [sys.executable, "-c", PROBE, *HEAVY],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    assert probe.stdout.split() == []
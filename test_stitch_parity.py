@@ -0,0 +1,87 @@
+"""Parity of the vectorized stitch pipeline with the pure-Python reference."""
+
+import io
+import math
+import random
+
+import pytest
+
+from test_class_pyembr import PyEmbroideryBuilder
+
+
+def _random_design(rng: random.Random):
+    n = rng.randint(2, 200)
+    points = [(rng.uniform(-20, 20), rng.uniform(-20, 20)) for _ in range(n)]
+    if rng.random() < 0.3:
+        points = [(float(round(x)), float(round(y))) for x, y in points]
+    breaks = sorted(rng.sample(range(1, n), rng.randint(0, min(5, n - 1))))
+    return points, breaks
+
+
+def _builders(seed: int):
+    rng = random.Random(seed)
+    points, breaks = _random_design(rng)
+    scale_mm = rng.choice([10.0, 2.5, 1.0])
+    max_stitch_mm = rng.choice([3.0, 1.0, 0.5, 7.3])
+    # A fixed thread per block; pyembroidery picks a random one otherwise.
+    colors = ["#000000"] * (len(breaks) + 1)
+    return [
+        PyEmbroideryBuilder(
+            scale_mm, max_stitch_mm, points=points, breaks=breaks, colors=colors, vectorized=vectorized
+        )
+        for vectorized in (True, False)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_stitches_and_jumps_match_reference(seed):
+    fast, reference = _builders(seed)
+    fast.build_pattern()
+    reference.build_pattern()
+
+    assert fast.stitches.tolist() == reference.stitches.tolist()
+    assert fast.jumps == reference.jumps
+    assert fast.centered_points.tolist() == reference.centered_points.tolist()
+    assert fast.center_offset == reference.center_offset
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_pes_bytes_match_reference(seed):
+    from pyembroidery import write_pes
+
+    encoded = []
+    for builder in _builders(seed):
+        stream = io.BytesIO()
+        write_pes(builder.build_pattern(), stream)
+        encoded.append(stream.getvalue())
+    assert encoded[0] == encoded[1]
+
+
+def _polygon_path(rng: random.Random):
+    """Turtle-drawn polygons with integer side lengths, so many segments are
+    whole multiples of the stitch length once rotated."""
+
+    x = y = heading = 0.0
+    points = [(x, y)]
+    for _ in range(rng.randint(1, 12)):
+        sides = rng.randint(3, 8)
+        side = rng.choice([3, 6, 15, 30, 45])
+        for _ in range(sides):
+            radians = math.radians(heading)
+            x, y = x + math.cos(radians) * side, y + math.sin(radians) * side
+            points.append((x, y))
+            heading -= 360 / sides
+        heading -= rng.choice([5, 10, 30])
+    return points
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_whole_step_segments_match_reference(seed):
+    points = _polygon_path(random.Random(seed))
+    fast, reference = (
+        PyEmbroideryBuilder(10.0, 3.0, points=points, colors=["#000000"], vectorized=vectorized)
+        for vectorized in (True, False)
+    )
+    fast.build_pattern()
+    reference.build_pattern()
+    assert fast.stitches.tolist() == reference.stitches.tolist()
@@ -0,0 +1,53 @@
+"""Chunked stitch streaming and the /ws/export protocol."""
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import server
+from api_backend import script_to_commands
+from embroidery_stream import StitchStream
+from embroidery_utils import densify_indexed
+
+ISLANDS = "for _ in range(30):\n    pendown()\n    for _ in range(40):\n        forward(2)\n        left(9)\n    penup()\n    forward(25)\n"
+
+
+def test_chunks_join_into_the_whole_path():
+    stream = StitchStream(script_to_commands(ISLANDS), scale_mm=1.0, max_stitch_mm=0.7, chunk_points=50)
+    chunks = list(stream)
+    assert len(chunks) > 10
+
+    turtle = stream.turtle
+    dense, landed = densify_indexed(turtle.points.array, 0.7, turtle.breaks)
+    assert [chunk.start for chunk in chunks] == np.cumsum([0] + [len(c.points) for c in chunks[:-1]]).tolist()
+    np.testing.assert_array_equal(np.concatenate([chunk.points for chunk in chunks]), dense)
+    assert [jump for chunk in chunks for jump in chunk.jumps] == [int(landed[b]) for b in turtle.breaks]
+    assert stream.stitches == len(dense)
+
+
+def _receive_all(websocket):
+    chunks = []
+    while True:
+        message = websocket.receive_json()
+        if message["type"] != "stitches":
+            return chunks, message
+        chunks.append(message)
+        assert message["seq"] == len(chunks)
+        websocket.send_json({"type": "ack", "seq": message["seq"]})
+
+
+def test_websocket_streams_then_finishes():
+    client = TestClient(server.app)
+    with client.websocket_connect("/ws/export") as websocket:
+        websocket.send_json({"script": ISLANDS, "scale_mm": 1.0, "max_stitch_mm": 0.7, "window": 2})
+        chunks, done = _receive_all(websocket)
+    assert chunks and done["type"] == "done"
+    assert sum(len(chunk["points"]) for chunk in chunks) == done["stitches"]
+    assert done["pes_url"].endswith(".pes")
+
+
+def test_websocket_reports_bad_scripts():
+    client = TestClient(server.app)
+    with client.websocket_connect("/ws/export") as websocket:
+        websocket.send_json({"script": "import os"})
+        message = websocket.receive_json()
+    assert message["type"] == "error"
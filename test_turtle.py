@@ -0,0 +1,80 @@
+"""Headless recording turtle."""
+
+import math
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from api_backend import script_to_commands, trace
+from embroidery_turtle import RecordingTurtle, export_to_embroidery, new_turtle
+
+
+def _draw(t) -> None:
+    t.penup()
+    t.goto(5, 5)
+    t.pendown()
+    for _ in range(8):
+        t.forward(20)
+        t.right(45)
+    t.penup()
+    t.forward(30)
+    t.pendown()
+    t.left(90)
+    t.backward(7)
+
+
+def test_records_like_the_virtual_turtle():
+    t = RecordingTurtle()
+    _draw(t)
+    script = (
+        "penup()\ngoto(5, 5)\npendown()\nfor _ in range(8):\n    forward(20)\n    right(45)\n"
+        "penup()\nforward(30)\npendown()\nleft(90)\nbackward(7)"
+    )
+    virtual = trace(script_to_commands(script))
+    np.testing.assert_allclose(t.stitch_points.array, virtual.points.array, atol=1e-9)
+    assert t.breaks == virtual.breaks == [9]
+    assert t.heading() == pytest.approx(90.0)
+
+
+def test_circle_chords_land_on_the_circle():
+    t = RecordingTurtle()
+    t.pendown()
+    t.circle(10)
+    points = t.stitch_points.array
+    np.testing.assert_allclose(np.hypot(points[:, 0], points[:, 1] - 10), 10.0)
+    assert t.position() == pytest.approx((0.0, 0.0), abs=1e-9)
+    assert math.cos(math.radians(t.heading())) == pytest.approx(1.0)
+
+
+def test_appearance_calls_are_accepted():
+    t = new_turtle(headless=True)
+    t.speed(0)
+    t.pencolor("red")
+    t.hideturtle()
+    t.pd()
+    t.setpos((1, 2))
+    t.home()
+    assert t.stitch_points.tolist() == [(0.0, 0.0), (1.0, 2.0), (0.0, 0.0)]
+    assert math.isclose(t.xcor(), 0.0) and t.isdown()
+
+
+def test_exports_without_a_screen(tmp_path):
+    t = RecordingTurtle()
+    _draw(t)
+    pes, png = tmp_path / "design.pes", tmp_path / "design.png"
+    export_to_embroidery(t, pes_filename=str(pes), png_filename=str(png), show_preview=False)
+    assert pes.read_bytes().startswith(b"#PES") and png.stat().st_size
+
+
+def test_import_does_not_load_tk():
+    probe = subprocess.run(
+        [sys.executable, "-c", "import embroidery_turtle, sys; print('turtle' in sys.modules, 'tkinter' in sys.modules)"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    assert probe.stdout.split() == ["False", "False"]